@@ -1,6 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import Callable, Dict, Generic, List
-from problem import HeuristicFunction, Problem, S, A, Solution
+from typing import Callable, Dict, Generic, List, Optional, Tuple
+from problem import BidirectionalProblem, HeuristicFunction, Problem, S, A, Solution
+from search_utils import IndexedPriorityQueue
+
+INF = float("inf")
 
 # This is an abstract class for all goal based agents
 class GoalBasedAgent(ABC, Generic[S, A]):
@@ -66,4 +69,118 @@ class InformedSearchAgent(GoalBasedAgent[S, A]):
             for action in solution:
                 self.policy[current] = action
                 current = problem.get_successor(current, action)
-        return self.policy.get(state)
\ No newline at end of file
+        return self.policy.get(state)
+
+# This agent applies D* Lite which is an incremental version of A* for problems whose edges may change between the calls
+# It searches backwards from the goal, so g[s] is the cost from s to the goal and rhs[s] is its one-step lookahead value:
+#   rhs[s] = min(cost(s, a) + g[successor(s, a)]) over the actions a of s (and rhs[goal] = 0)
+# A state is consistent if g[s] == rhs[s] and only the inconsistent states are in the priority queue
+# The g and rhs values are kept between the calls, so when some edges change, only the states whose rhs is affected are updated
+# and the search repairs the part of the search tree that depends on them instead of searching from scratch
+# The problem must be bidirectional (it has a goal state and predecessors) and the edge changes are read from its change log
+# (a list of (state, next state) in "problem.changes", e.g. "GraphRoutingProblem.set_cost", "add_edge" and "remove_edge")
+# The heuristic estimates the cost between two states; it must be consistent with the costs after every change
+class DStarLiteAgent(GoalBasedAgent[S, A]):
+    def __init__(self, heuristic: Callable[[BidirectionalProblem[S, A], S, S], float] = lambda *_: 0) -> None:
+        super().__init__()
+        self.heuristic = heuristic
+        self.problem: Optional[BidirectionalProblem[S, A]] = None
+
+    # Forget the search and start a new one for the given problem
+    def reset(self, problem: BidirectionalProblem[S, A], state: S) -> None:
+        self.problem = problem
+        self.goal = problem.get_goal_state()
+        # The number of changes in the problem change log that were already applied
+        self.change_count = len(getattr(problem, "changes", ()))
+        self.g: Dict[S, float] = {}
+        self.rhs: Dict[S, float] = {self.goal: 0}
+        # When the edges change after the agent moved, the heuristic values decrease by at most the heuristic between
+        # the state where the keys were computed and the current state, so instead of updating all the keys in the queue,
+        # this value is added to the keys of the new entries (the keys only need this correction when the search is repaired)
+        self.key_modifier = 0
+        self.last_state = state
+        # The state that the last returned action leads to (None before the first search)
+        self.next_state: Optional[S] = None
+        self.queue = IndexedPriorityQueue()
+        self.queue.push(self.goal, self._key(self.goal))
+
+    def act(self, problem: BidirectionalProblem[S, A], state: S) -> A:
+        if problem is not self.problem or problem.get_goal_state() != self.goal:
+            self.reset(problem, state)
+        # Like the other agents, there is nothing to do at the goal
+        if problem.is_goal(state):
+            return None
+        # The search is only repaired if some edges changed since the last call (or if the agent is not where its last action leads),
+        # otherwise the states along the least cost path are consistent and the agent keeps following it
+        changes = getattr(problem, "changes", ())
+        if len(changes) > self.change_count or state != self.next_state:
+            if state != self.last_state:
+                self.key_modifier += self.heuristic(problem, self.last_state, state)
+                self.last_state = state
+            # Update the states whose outgoing edges changed since the last call
+            for changed_state, _ in changes[self.change_count:]:
+                self._update_state(changed_state)
+            self.change_count = len(changes)
+            self._compute_shortest_path(state)
+        if self.g.get(state, INF) == INF:
+            # the goal can not be reached from this state
+            self.next_state = None
+            return None
+        # Follow the action that leads to the least cost to the goal
+        # Self loops are skipped, and ties (which happen when edges cost zero) are resolved by the least cost of the successor,
+        # so the agent moves closer to the goal instead of staying in place or bouncing between states at the same cost
+        g = self.g
+        successors = ((action, problem.get_successor(state, action)) for action in problem.get_actions(state))
+        action, self.next_state = min(
+            ((action, successor) for action, successor in successors if successor != state),
+            key=lambda item: (problem.get_cost(state, item[0]) + g.get(item[1], INF), g.get(item[1], INF)),
+        )
+        return action
+
+    # The key of a state is (the least total cost through it, its least cost to the goal), and the keys are compared lexicographically
+    def _key(self, state: S) -> Tuple[float, float]:
+        cost = min(self.g.get(state, INF), self.rhs.get(state, INF))
+        return (cost + self.heuristic(self.problem, self.last_state, state) + self.key_modifier, cost)
+
+    # Recompute the rhs value of the state and put it in the queue if it is inconsistent
+    def _update_state(self, state: S) -> None:
+        problem = self.problem
+        if state != self.goal:
+            self.rhs[state] = min(
+                (problem.get_cost(state, action) + self.g.get(problem.get_successor(state, action), INF) for action in problem.get_actions(state)),
+                default=INF,
+            )
+        self._update_queue(state)
+
+    # Put the state in the queue (with its current key) if it is inconsistent, otherwise remove it from the queue
+    def _update_queue(self, state: S) -> None:
+        if state in self.queue:
+            self.queue.remove(state)
+        if self.g.get(state, INF) != self.rhs.get(state, INF):
+            self.queue.push(state, self._key(state))
+
+    # Expand the inconsistent states until the start state is consistent and no state in the queue can improve its cost
+    def _compute_shortest_path(self, start: S) -> None:
+        queue, g, rhs = self.queue, self.g, self.rhs
+        while queue and (queue.peek()[1] < self._key(start) or rhs.get(start, INF) != g.get(start, INF)):
+            state, old_key, _ = queue.peek()
+            new_key = self._key(state)
+            if old_key < new_key:
+                # the key is outdated since the agent moved, so it is reinserted with the new key
+                queue.push(state, new_key)
+            elif g.get(state, INF) > rhs.get(state, INF):
+                # the state became cheaper, so its predecessors may become cheaper too
+                # (their rhs can only decrease, so it is enough to compare it with the path through this state)
+                queue.pop()
+                g[state] = rhs[state]
+                for previous, action in self.problem.get_predecessors(state):
+                    cost = self.problem.get_cost(previous, action) + g[state]
+                    if cost < rhs.get(previous, INF):
+                        rhs[previous] = cost
+                        self._update_queue(previous)
+            else:
+                # the state became more expensive, so it and its predecessors are recomputed
+                g[state] = INF
+                for previous, _ in self.problem.get_predecessors(state):
+                    self._update_state(previous)
+                self._update_state(state)
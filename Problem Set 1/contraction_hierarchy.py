@@ -0,0 +1,254 @@
+from typing import Dict, List, Optional, Tuple
+import heapq, json, os
+
+from graph import GraphNode, GraphRoutingProblem, graph_fingerprint, graph_nodes
+from problem import Solution
+
+# This file implements contraction hierarchies for the graph routing problem
+# In the preprocessing step, the nodes are contracted one by one (from the least important to the most important)
+# When a node is contracted, a shortcut edge is added between each pair of its remaining neighbors (u -> v -> x)
+# unless a path from u to x that avoids v (a witness) is at least as short
+# A query then runs a bidirectional Dijkstra where both searches only follow edges towards more important nodes,
+# so each of them settles a small part of the graph
+# The shortcuts remember the contracted node in the middle so the path can be unpacked into the original edges
+
+INF = float("inf")
+
+# An edge is stored as (weight, middle) where middle is the index of the contracted node for a shortcut or -1 for an original edge
+NO_MIDDLE = -1
+Edge = Tuple[float, int]
+
+class ContractionHierarchy:
+    # nodes: the graph nodes, where each node is identified by its index in this list
+    # ranks: the contraction order of every node (a higher rank means a more important node)
+    # edges: a map from (source index, target index) to the edge (weight, middle) of the original graph and the shortcuts
+    # fingerprint: the "graph_fingerprint" of the graph the hierarchy was built for
+    def __init__(self, nodes: List[GraphNode], ranks: List[int], edges: Dict[Tuple[int, int], Edge], fingerprint: str = "") -> None:
+        self.nodes = nodes
+        self.ranks = ranks
+        self.edges = edges
+        self.fingerprint = fingerprint
+        self.index: Dict[GraphNode, int] = {node: index for index, node in enumerate(nodes)}
+        # upward[u] contains the edges (x, weight) from u to a more important node x
+        # downward[x] contains the edges (u, weight) to x from a more important node u (used by the backward search)
+        self.upward: List[List[Tuple[int, float]]] = [[] for _ in nodes]
+        self.downward: List[List[Tuple[int, float]]] = [[] for _ in nodes]
+        for (source, target), (weight, _) in edges.items():
+            if ranks[target] > ranks[source]:
+                self.upward[source].append((target, weight))
+            else:
+                self.downward[target].append((source, weight))
+
+    # Returns the shortest path from the start to the goal (excluding the start) or None if there is no path
+    def route(self, start: GraphNode, goal: GraphNode) -> Solution:
+        source, target = self.index.get(start), self.index.get(goal)
+        if source is None or target is None:
+            return None
+        if source == target:
+            return []
+        # distances[0] and parents[0] belong to the forward search, distances[1] and parents[1] belong to the backward search
+        distances: Tuple[Dict[int, float], Dict[int, float]] = ({source: 0}, {target: 0})
+        parents: Tuple[Dict[int, int], Dict[int, int]] = ({}, {})
+        settled: Tuple[set, set] = (set(), set())
+        frontiers = ([(0, source)], [(0, target)])
+        graphs = (self.upward, self.downward)
+        best_cost, meeting_node = INF, None
+        while frontiers[0] or frontiers[1]:
+            # Each search stops once its least distance is not less than the best path found so far
+            for direction in (0, 1):
+                frontier = frontiers[direction]
+                while frontier and frontier[0][1] in settled[direction]:
+                    heapq.heappop(frontier)
+                if frontier and frontier[0][0] >= best_cost:
+                    frontier.clear()
+            # Alternate between the two searches, expanding the one with the least distance
+            candidates = [direction for direction in (0, 1) if frontiers[direction]]
+            if not candidates:
+                break
+            direction = min(candidates, key=lambda direction: frontiers[direction][0][0])
+            distance, node = heapq.heappop(frontiers[direction])
+            settled[direction].add(node)
+            other_distance = distances[1 - direction].get(node)
+            if other_distance is not None and distance + other_distance < best_cost:
+                best_cost, meeting_node = distance + other_distance, node
+            for neighbor, weight in graphs[direction][node]:
+                new_distance = distance + weight
+                if new_distance < distances[direction].get(neighbor, INF):
+                    distances[direction][neighbor] = new_distance
+                    parents[direction][neighbor] = node
+                    heapq.heappush(frontiers[direction], (new_distance, neighbor))
+        if meeting_node is None:
+            return None
+        # Collect the node indices of the path in the hierarchy then unpack its shortcuts
+        forward = [meeting_node]
+        while forward[-1] != source:
+            forward.append(parents[0][forward[-1]])
+        forward.reverse()
+        backward = [meeting_node]
+        while backward[-1] != target:
+            backward.append(parents[1][backward[-1]])
+        hierarchy_path = forward + backward[1:]
+        path = []
+        for source_node, target_node in zip(hierarchy_path[:-1], hierarchy_path[1:]):
+            path.extend(self.unpack(source_node, target_node))
+        return [self.nodes[index] for index in path]
+
+    # Returns the indices of the nodes (excluding the source) on the original edges which the edge (source, target) represents
+    def unpack(self, source: int, target: int) -> List[int]:
+        path = []
+        stack = [(source, target)]
+        while stack:
+            source, target = stack.pop()
+            _, middle = self.edges[(source, target)]
+            if middle == NO_MIDDLE:
+                path.append(target)
+            else:
+                # push the second half first so the first half is unpacked first
+                stack.append((middle, target))
+                stack.append((source, middle))
+        return path
+
+    # Write the hierarchy to a json file (the nodes are stored by name)
+    def save(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump({
+                "nodes": [node.name for node in self.nodes],
+                "ranks": self.ranks,
+                "edges": [[source, target, weight, middle] for (source, target), (weight, middle) in self.edges.items()],
+                "fingerprint": self.fingerprint,
+            }, f)
+
+    # Read a hierarchy from a json file written by "save", the node names are matched with the nodes of the given problem
+    # If the hierarchy was not built for the graph of the problem (different nodes, edges or costs), a ValueError is raised
+    @staticmethod
+    def load(path: str, problem: GraphRoutingProblem) -> 'ContractionHierarchy':
+        with open(path, 'r') as f:
+            data = json.load(f)
+        nodes = graph_nodes(problem)
+        fingerprint = graph_fingerprint(problem)
+        if data["nodes"] != [node.name for node in nodes] or data.get("fingerprint") != fingerprint:
+            raise ValueError(f"The contraction hierarchy in {path} was not built for this graph")
+        edges = {(source, target): (weight, middle) for source, target, weight, middle in data["edges"]}
+        return ContractionHierarchy(nodes, data["ranks"], edges, fingerprint)
+
+    # Build the hierarchy for the graph of the given problem
+    # The next node to contract is the one with the least edge difference (added shortcuts - removed edges)
+    # plus the number of its already contracted neighbors (to contract the graph uniformly)
+    # The witness searches are limited to "max_settled" nodes; a limited search may add unnecessary shortcuts but never misses one
+    @staticmethod
+    def build(problem: GraphRoutingProblem, max_settled: int = 500) -> 'ContractionHierarchy':
+        nodes = graph_nodes(problem)
+        index = {node: i for i, node in enumerate(nodes)}
+        edges: Dict[Tuple[int, int], Edge] = {}
+        # outgoing[u][x] and incoming[x][u] are the weights of the edge u -> x among the remaining (not contracted) nodes
+        outgoing: List[Dict[int, float]] = [{} for _ in nodes]
+        incoming: List[Dict[int, float]] = [{} for _ in nodes]
+        for node, adjacent in problem.adjacency.items():
+            for next_node in adjacent:
+                source, target = index[node], index[next_node]
+                if source == target:
+                    continue
+                weight = problem.get_cost(node, next_node)
+                if weight < edges.get((source, target), (INF,))[0]:
+                    edges[(source, target)] = (weight, NO_MIDDLE)
+                    outgoing[source][target] = weight
+                    incoming[target][source] = weight
+
+        contracted_neighbors = [0] * len(nodes)
+        estimate_settled = max(1, max_settled // 10)
+
+        # Returns the shortcuts (u, x, weight) needed to contract the node
+        def find_shortcuts(node: int, max_settled: int) -> List[Tuple[int, int, float]]:
+            shortcuts = []
+            for source, in_weight in incoming[node].items():
+                targets = {target: in_weight + out_weight for target, out_weight in outgoing[node].items() if target != source}
+                if not targets:
+                    continue
+                witness = _witness_distances(outgoing, source, node, targets, max_settled)
+                for target, weight in targets.items():
+                    if witness.get(target, INF) > weight:
+                        shortcuts.append((source, target, weight))
+            return shortcuts
+
+        # The priority only estimates the number of shortcuts, so it uses shorter witness searches
+        def priority(node: int) -> int:
+            return len(find_shortcuts(node, estimate_settled)) - len(incoming[node]) - len(outgoing[node]) + contracted_neighbors[node]
+
+        queue = [(priority(node), node) for node in range(len(nodes))]
+        heapq.heapify(queue)
+        ranks = [0] * len(nodes)
+        rank = 0
+        while queue:
+            _, node = heapq.heappop(queue)
+            # Lazy update: recompute the priority and postpone the node if it is no longer the least one
+            current = priority(node)
+            if queue and current > queue[0][0]:
+                heapq.heappush(queue, (current, node))
+                continue
+            for source, target, weight in find_shortcuts(node, max_settled):
+                if weight < outgoing[source].get(target, INF):
+                    outgoing[source][target] = weight
+                    incoming[target][source] = weight
+                    edges[(source, target)] = (weight, node)
+            # Remove the node from the remaining graph
+            for source in incoming[node]:
+                del outgoing[source][node]
+                contracted_neighbors[source] += 1
+            for target in outgoing[node]:
+                del incoming[target][node]
+                contracted_neighbors[target] += 1
+            incoming[node], outgoing[node] = {}, {}
+            ranks[node] = rank
+            rank += 1
+        return ContractionHierarchy(nodes, ranks, edges, graph_fingerprint(problem))
+
+# Returns the distances from the source to the nodes reached by a Dijkstra search which ignores the given node
+# The targets map each target to the weight of its possible shortcut, so the search stops once every target is settled,
+# the distance exceeds the largest weight or "max_settled" nodes are settled
+def _witness_distances(outgoing: List[Dict[int, float]], source: int, ignored: int, targets: Dict[int, float], max_settled: int) -> Dict[int, float]:
+    limit = max(targets.values())
+    remaining = len(targets)
+    distances = {source: 0}
+    settled = set()
+    frontier = [(0, source)]
+    while frontier and len(settled) < max_settled:
+        distance, node = heapq.heappop(frontier)
+        if node in settled:
+            continue
+        if distance > limit:
+            break
+        settled.add(node)
+        if node in targets:
+            remaining -= 1
+            if remaining == 0:
+                break
+        for neighbor, weight in outgoing[node].items():
+            if neighbor == ignored:
+                continue
+            new_distance = distance + weight
+            if new_distance < distances.get(neighbor, INF):
+                distances[neighbor] = new_distance
+                heapq.heappush(frontier, (new_distance, neighbor))
+    return distances
+
+# Returns the contraction hierarchy of the problem, it is stored in the problem cache so it is built only once
+# If a path is given, the hierarchy is loaded from it if it exists and it was built for the graph of the problem,
+# otherwise it is built and saved to it
+def get_contraction_hierarchy(problem: GraphRoutingProblem, path: Optional[str] = None) -> ContractionHierarchy:
+    hierarchy = problem.cache().get("contraction_hierarchy")
+    if hierarchy is None:
+        if path is not None and os.path.exists(path):
+            try:
+                hierarchy = ContractionHierarchy.load(path, problem)
+            except ValueError:
+                hierarchy = None
+        if hierarchy is None:
+            hierarchy = ContractionHierarchy.build(problem)
+            if path is not None:
+                hierarchy.save(path)
+        problem.cache()["contraction_hierarchy"] = hierarchy
+    return hierarchy
+
+# A search function which answers the problem using its contraction hierarchy (from the problem cache)
+def ContractionHierarchySearch(problem: GraphRoutingProblem, initial_state: GraphNode) -> Solution:
+    return get_contraction_hierarchy(problem).route(initial_state, problem.goal)
@@ -0,0 +1,160 @@
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+import argparse, json, math, mmap, os, sys
+
+from graph import GraphNode, GraphRoutingProblem, read_graph
+from mathutils import euclidean_distance
+from problem import Problem, Solution
+
+# This file implements a compact graph representation for graph routing on large graphs
+# The graph is stored in the compressed sparse row (CSR) format where every node is identified by an integer id:
+#   the edges leaving node i are the edge indices offsets[i] to offsets[i+1]-1
+#   targets[e] is the node at the end of edge e and weights[e] is its precomputed cost
+#   positions[2*i] and positions[2*i+1] are the (x, y) position of node i and names[i] is its name
+# The arrays are typed arrays from the standard library ("array.array"), so every entry takes 4 or 8 bytes instead of a python object
+# They can be saved as binary files in a directory and loaded with memory mapping,
+# so a graph with millions of edges is neither parsed nor fully copied into memory
+
+# The type code and the file name of each array (the type codes are the ones used by "array.array" and "memoryview.cast")
+ARRAYS = {"offsets": 'q', "targets": 'i', "weights": 'd', "positions": 'd'}
+
+class CSRGraph:
+    def __init__(self, offsets: Sequence[int], targets: Sequence[int], weights: Sequence[float], positions: Sequence[float], names: List[str]) -> None:
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.positions = positions
+        self.names = names
+        self.ids: Dict[str, int] = {name: index for index, name in enumerate(names)}
+
+    @property
+    def node_count(self) -> int:
+        return len(self.names)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.targets)
+
+    # Build the CSR arrays from an adjacency dictionary (the order of every adjacency list is preserved)
+    # The cost of each edge is given by the cost function, which is the distance between the nodes by default
+    @staticmethod
+    def from_adjacency(
+        adjacency: Dict[GraphNode, List[GraphNode]],
+        cost: Optional[Callable[[GraphNode, GraphNode], float]] = None,
+    ) -> 'CSRGraph':
+        if cost is None:
+            cost = lambda node, next_node: euclidean_distance(node.position, next_node.position)
+        nodes: Dict[GraphNode, int] = {}
+        for node, adjacent in adjacency.items():
+            nodes.setdefault(node, len(nodes))
+            for next_node in adjacent:
+                nodes.setdefault(next_node, len(nodes))
+        offsets, targets, weights, positions = (array(code) for code in ARRAYS.values())
+        offsets.append(0)
+        for node in nodes:
+            adjacent = adjacency.get(node, [])
+            targets.extend(nodes[next_node] for next_node in adjacent)
+            weights.extend(cost(node, next_node) for next_node in adjacent)
+            offsets.append(len(targets))
+            positions.extend((node.position.x, node.position.y))
+        return CSRGraph(offsets, targets, weights, positions, [node.name for node in nodes])
+
+    # Read a graph from a json graph file (the same format that "GraphRoutingProblem.from_file" reads)
+    @staticmethod
+    def from_json(path: str) -> 'CSRGraph':
+        with open(path, 'r') as f:
+            problem_def: Dict[str, Dict] = json.load(f)
+        _, adjacency = read_graph(problem_def.get("graph", {}))
+        return CSRGraph.from_adjacency(adjacency)
+
+    # Write the graph to a directory as one binary file per array (and the node names as a json file)
+    # The arrays are written in the byte order of this machine, which is recorded so that "load" can refuse a different one
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        for name, code in ARRAYS.items():
+            values = getattr(self, name)
+            with open(os.path.join(directory, name + ".bin"), 'wb') as f:
+                (values if isinstance(values, array) else array(code, values)).tofile(f)
+        with open(os.path.join(directory, "graph.json"), 'w') as f:
+            json.dump({"byteorder": sys.byteorder, "names": self.names}, f)
+
+    # Read a graph from a directory written by "save"
+    # If use_mmap is True, the arrays are memory mapped (read-only) instead of being read into memory
+    @staticmethod
+    def load(directory: str, use_mmap: bool = True) -> 'CSRGraph':
+        with open(os.path.join(directory, "graph.json"), 'r') as f:
+            graph_def = json.load(f)
+        if graph_def.get("byteorder") != sys.byteorder:
+            raise ValueError(f"The graph in {directory} was saved with the {graph_def.get('byteorder')} byte order")
+        arrays = [_read_array(os.path.join(directory, name + ".bin"), code, use_mmap) for name, code in ARRAYS.items()]
+        return CSRGraph(*arrays, graph_def["names"])
+
+# Read an array of the given type code from a binary file
+# With use_mmap, the file is mapped into memory and viewed as an array without copying (an empty file can not be mapped)
+def _read_array(path: str, code: str, use_mmap: bool) -> Sequence:
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if use_mmap and size > 0:
+            return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)).cast(code)
+        values = array(code)
+        values.fromfile(f, size // values.itemsize)
+        return values
+
+# This is the graph routing problem over a CSR graph
+# The state is a node id and the action is the index of the edge to follow, so the cost is a single array lookup
+class CSRGraphProblem(Problem[int, int]):
+    def __init__(self, graph: CSRGraph, start: int, goal: int) -> None:
+        super().__init__()
+        self.graph = graph
+        self.start = start
+        self.goal = goal
+
+    def get_initial_state(self) -> int:
+        return self.start
+
+    def is_goal(self, state: int) -> bool:
+        return state == self.goal
+
+    def get_actions(self, state: int) -> Iterable[int]:
+        offsets = self.graph.offsets
+        return range(offsets[state], offsets[state + 1])
+
+    def get_successor(self, state: int, action: int) -> int:
+        return self.graph.targets[action]
+
+    def get_cost(self, state: int, action: int) -> float:
+        return self.graph.weights[action]
+
+    # Convert a solution (a list of edge indices) to the names of the visited nodes (excluding the start)
+    def path_to_names(self, solution: Solution) -> Optional[List[str]]:
+        if solution is None:
+            return None
+        return [self.graph.names[self.graph.targets[action]] for action in solution]
+
+    # Create a problem over a CSR graph where the start and the goal are given by name
+    @staticmethod
+    def from_graph(graph: CSRGraph, start: str, goal: str) -> 'CSRGraphProblem':
+        return CSRGraphProblem(graph, graph.ids[start], graph.ids[goal])
+
+    # Convert a graph routing problem to a CSR graph routing problem (the edges keep the costs given by the problem)
+    @staticmethod
+    def from_problem(problem: GraphRoutingProblem) -> 'CSRGraphProblem':
+        graph = CSRGraph.from_adjacency(problem.adjacency, problem.get_cost)
+        return CSRGraphProblem.from_graph(graph, problem.start.name, problem.goal.name)
+
+# The straight-line distance heuristic (the same as "graphrouting_heuristic") for the CSR graph routing problem
+def csr_graph_heuristic(problem: CSRGraphProblem, state: int) -> float:
+    positions = problem.graph.positions
+    dx = positions[2 * state] - positions[2 * problem.goal]
+    dy = positions[2 * state + 1] - positions[2 * problem.goal + 1]
+    return math.sqrt(dx * dx + dy * dy)
+
+if __name__ == "__main__":
+    # Convert a json graph file into the binary CSR format
+    parser = argparse.ArgumentParser(description="Convert a json graph file into a directory of binary CSR arrays")
+    parser.add_argument("graph", help="path to the json graph file")
+    parser.add_argument("output", help="path to the output directory")
+    args = parser.parse_args()
+    graph = CSRGraph.from_json(args.graph)
+    graph.save(args.output)
+    print(f"Saved {graph.node_count} nodes and {graph.edge_count} edges to {args.output}")
@@ -0,0 +1,121 @@
+from typing import Iterable, Iterator, List, Optional
+import heapq, os, struct, tempfile
+
+from problem import Problem, S, A, Solution
+
+# This file implements an external-memory breadth first search for state spaces that do not fit in memory
+# The states are stored on disk (encoded by "problem.encode_state") one layer per file where layer d contains the states at depth d
+# Every layer file is sorted and contains no duplicates, so only the current state, the successors buffer
+# and one read buffer per open file are kept in memory:
+#   1- The states of the current layer are streamed from its file and expanded
+#   2- The successors are buffered in memory, and whenever the buffer is full, it is sorted and written to a run file
+#   3- The run files are merged with the previous layer files (all sorted), so the duplicates are adjacent and removed while merging
+#      (delayed duplicate detection). If the problem is reversible, a successor of layer d can only be in the layers d-1, d or d+1,
+#      so only the last two layers are merged. Otherwise, all the previous layers are merged.
+# When a goal is generated, the path is recovered backwards: for every layer from the last one to the first one,
+# the layer file is scanned for a state which has the current state as a successor
+
+# The default number of successors kept in memory before they are sorted and written to a run file
+BUFFER_SIZE = 1 << 20
+
+# A record is stored on disk as its length (4 bytes) followed by its bytes
+_RECORD_LENGTH = struct.Struct(">I")
+# The buffer size of the layer and run files
+_FILE_BUFFER_SIZE = 1 << 16
+
+# The layer files are written to a temporary directory (inside "directory" if given) which is removed when the search ends
+def ExternalBreadthFirstSearch(
+    problem: Problem[S, A],
+    initial_state: S,
+    directory: Optional[str] = None,
+    buffer_size: int = BUFFER_SIZE,
+) -> Solution:
+    # Like BFS, the goal test is done before inserting a node into the frontier (the next layer)
+    if problem.is_goal(initial_state):
+        return []
+    with tempfile.TemporaryDirectory(prefix="bfs-", dir=directory) as search_directory:
+        layers = [os.path.join(search_directory, "layer-0.bin")]
+        _write_records(layers[0], [problem.encode_state(initial_state)])
+        while True:
+            depth = len(layers) - 1
+            runs: List[str] = []
+            buffer: List[bytes] = []
+            for record in _read_records(layers[depth]):
+                state = problem.decode_state(record)
+                for action in problem.get_actions(state):
+                    next_state = problem.get_successor(state, action)
+                    # a goal can not be in a previous layer (otherwise it would have been found there), so it is not a duplicate
+                    if problem.is_goal(next_state):
+                        path = _recover_path(problem, layers, depth, record)
+                        path.append(action)
+                        return path
+                    buffer.append(problem.encode_state(next_state))
+                    if len(buffer) >= buffer_size:
+                        runs.append(os.path.join(search_directory, f"run-{len(runs)}.bin"))
+                        buffer.sort()
+                        _write_records(runs[-1], buffer)
+                        buffer = []
+            buffer.sort()
+            successors = heapq.merge(buffer, *(_read_records(run) for run in runs))
+            previous_layers = layers[-2:] if problem.reversible else layers
+            next_layer = os.path.join(search_directory, f"layer-{depth + 1}.bin")
+            count = _write_records(next_layer, _remove_duplicates(successors, previous_layers))
+            for run in runs:
+                os.remove(run)
+            # the layer is empty so every reachable state was visited and no goal is found
+            if count == 0:
+                return None
+            layers.append(next_layer)
+
+# Returns the sorted records without the duplicates and without the records that exist in the given (sorted) layer files
+def _remove_duplicates(records: Iterable[bytes], layers: List[str]) -> Iterator[bytes]:
+    # The records of the layers are tagged with 0 and the new records with 1,
+    # so if a record exists in some layer, its first occurrence in the merged stream comes from that layer
+    old_records = [((record, 0) for record in _read_records(layer)) for layer in layers]
+    new_records = ((record, 1) for record in records)
+    last = None
+    for record, tag in heapq.merge(*old_records, new_records):
+        if record == last:
+            continue
+        last = record
+        if tag == 1:
+            yield record
+
+# Returns the actions from the initial state (the only state in the first layer) to the state encoded by the record at the given depth
+def _recover_path(problem: Problem[S, A], layers: List[str], depth: int, record: bytes) -> List[A]:
+    path = []
+    for layer in reversed(layers[:depth]):
+        # find a state in the previous layer that has the current state as a successor
+        parent_record, parent_action = _find_parent(problem, layer, record)
+        path.append(parent_action)
+        record = parent_record
+    path.reverse()
+    return path
+
+# Returns the record of a state in the layer file and the action that leads from it to the state encoded by the given record
+def _find_parent(problem: Problem[S, A], layer: str, record: bytes):
+    for parent_record in _read_records(layer):
+        state = problem.decode_state(parent_record)
+        for action in problem.get_actions(state):
+            if problem.encode_state(problem.get_successor(state, action)) == record:
+                return parent_record, action
+    raise Exception("The layer files are inconsistent: a state has no parent in the previous layer")
+
+# Write the records to a file and return their count
+def _write_records(path: str, records: Iterable[bytes]) -> int:
+    count = 0
+    with open(path, 'wb', buffering=_FILE_BUFFER_SIZE) as f:
+        for record in records:
+            f.write(_RECORD_LENGTH.pack(len(record)))
+            f.write(record)
+            count += 1
+    return count
+
+# Read the records of a file one by one
+def _read_records(path: str) -> Iterator[bytes]:
+    with open(path, 'rb', buffering=_FILE_BUFFER_SIZE) as f:
+        while True:
+            header = f.read(_RECORD_LENGTH.size)
+            if not header:
+                return
+            yield f.read(_RECORD_LENGTH.unpack(header)[0])
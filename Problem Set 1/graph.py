@@ -1,8 +1,8 @@
-from typing import Dict, Iterable, List
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from dataclasses import dataclass
-import json
+import bisect, hashlib, json
 
-from problem import Problem
+from problem import BidirectionalProblem
 from mathutils import Point, euclidean_distance
 from helpers.utils import record_calls
 
@@ -20,18 +20,56 @@ class GraphNode:
         return self.name
 
 # This is the implementation of the graph routing problem
-class GraphRoutingProblem(Problem[GraphNode, GraphNode]):
-    def __init__(self, start: GraphNode, goal: GraphNode, adjacency: Dict[GraphNode, List[GraphNode]]) -> None:
+class GraphRoutingProblem(BidirectionalProblem[GraphNode, GraphNode]):
+    # The edge costs, the change log and the cache can be given to share them with other problems over the same graph
+    # (see "RoutingGraph.problem"), so an edge change made through any of these problems is seen by all of them
+    # The cache of a graph routing problem only holds data computed from the graph, so it does not depend on the start and goal
+    def __init__(
+        self,
+        start: GraphNode,
+        goal: GraphNode,
+        adjacency: Dict[GraphNode, List[GraphNode]],
+        edge_costs: Optional[Dict[Tuple[GraphNode, GraphNode], float]] = None,
+        changes: Optional[List[Tuple[GraphNode, GraphNode]]] = None,
+        cache: Optional[Dict[str, Any]] = None,
+    ) -> None:
         super().__init__()
         self.start = start
         self.goal = goal
         self.adjacency = adjacency
+        # The costs of the edges whose cost was changed by "set_cost" (the other edges cost the distance between their nodes)
+        self.edge_costs: Dict[Tuple[GraphNode, GraphNode], float] = {} if edge_costs is None else edge_costs
+        # The change log contains every edge (node, next node) that was added, removed or whose cost changed in order,
+        # so an incremental search can remember how many changes it has seen and repair its results for the new ones
+        self.changes: List[Tuple[GraphNode, GraphNode]] = [] if changes is None else changes
+        if cache is not None:
+            self._cache = cache
     
+    # The problem is reversible if every edge has an edge in the opposite direction
+    @property
+    def reversible(self) -> bool:
+        return self.get_one_way_edges() == 0
+
+    # Returns the number of edges which have no edge in the opposite direction
+    # The graph is scanned once and the count is stored in the problem cache, then the edge changes update it
+    def get_one_way_edges(self) -> int:
+        one_way_edges = self.cache().get("one_way_edges")
+        if one_way_edges is None:
+            adjacency = self.adjacency
+            one_way_edges = sum(
+                node not in adjacency.get(next_node, ()) for node, adjacent in adjacency.items() for next_node in adjacent
+            )
+            self.cache()["one_way_edges"] = one_way_edges
+        return one_way_edges
+
     def get_initial_state(self) -> GraphNode:
         return self.start
     
     def is_goal(self, state: GraphNode) -> bool:
         return state == self.goal
+
+    def get_goal_state(self) -> GraphNode:
+        return self.goal
     
     # The actions for this problem are the neighboring nodes we can reach from the current node
     # We use @record_calls to track the arguments with which this function is called to retrieve the traversal order
@@ -39,28 +77,134 @@ class GraphRoutingProblem(Problem[GraphNode, GraphNode]):
     def get_actions(self, state: GraphNode) -> Iterable[GraphNode]:
         return self.adjacency.get(state, [])
     
+    # The predecessors of a node are the nodes which have it in their adjacency list (the action is the node itself)
+    # The reverse adjacency is built once and stored in the problem cache
+    def get_predecessors(self, state: GraphNode) -> Iterable[Tuple[GraphNode, GraphNode]]:
+        return [(previous, state) for previous in self.get_reverse_adjacency().get(state, [])]
+
+    # Returns a dictionary which maps each node to the list of nodes that have an edge to it
+    def get_reverse_adjacency(self) -> Dict[GraphNode, List[GraphNode]]:
+        reverse_adjacency = self.cache().get("reverse_adjacency")
+        if reverse_adjacency is None:
+            reverse_adjacency = {node: [] for node in self.adjacency}
+            for node, adjacent in self.adjacency.items():
+                for next_node in adjacent:
+                    reverse_adjacency.setdefault(next_node, []).append(node)
+            self.cache()["reverse_adjacency"] = reverse_adjacency
+        return reverse_adjacency
+
     # The next state and the action are the exact same thing for this problem
     def get_successor(self, state: GraphNode, action: GraphNode) -> GraphNode:
         return action
     
-    # The cost of an action is the distance between the current node and the next node 
+    # The cost of an action is the distance between the current node and the next node (unless it was changed by "set_cost")
     def get_cost(self, state: GraphNode, action: GraphNode) -> float:
+        if self.edge_costs:
+            cost = self.edge_costs.get((state, action))
+            if cost is not None:
+                return cost
         return euclidean_distance(state.position, action.position)
+
+    # Change the cost of an existing edge
+    # The cost can not be less than the distance between the nodes, otherwise the straight-line heuristics
+    # (e.g. "graphrouting_heuristic" and "graphrouting_distance") would not be admissible
+    def set_cost(self, node: GraphNode, next_node: GraphNode, cost: float) -> None:
+        if next_node not in self.adjacency.get(node, []):
+            raise Exception(f"There is no edge from {node} to {next_node}")
+        self._check_cost(node, next_node, cost)
+        self.edge_costs[(node, next_node)] = cost
+        self._edge_changed(node, next_node)
+
+    # Add an edge (the adjacency list stays sorted by name), if no cost is given, the edge costs the distance between its nodes
+    # Like "set_cost", the cost can not be less than the distance between the nodes
+    def add_edge(self, node: GraphNode, next_node: GraphNode, cost: Optional[float] = None) -> None:
+        adjacent = self.adjacency.setdefault(node, [])
+        if next_node in adjacent:
+            raise Exception(f"There is already an edge from {node} to {next_node}")
+        if cost is not None:
+            self._check_cost(node, next_node, cost)
+        one_way_edges = self.get_one_way_edges()
+        self.adjacency.setdefault(next_node, [])
+        adjacent.insert(bisect.bisect([adjacent_node.name for adjacent_node in adjacent], next_node.name), next_node)
+        if cost is not None:
+            self.edge_costs[(node, next_node)] = cost
+        # the new edge pairs with an existing edge in the opposite direction, otherwise it is a one-way edge
+        # (a self loop is its own opposite edge)
+        if node != next_node:
+            one_way_edges += -1 if node in self.adjacency[next_node] else 1
+        self._edge_changed(node, next_node, one_way_edges)
+
+    # Remove an existing edge
+    def remove_edge(self, node: GraphNode, next_node: GraphNode) -> None:
+        if next_node not in self.adjacency.get(node, []):
+            raise Exception(f"There is no edge from {node} to {next_node}")
+        one_way_edges = self.get_one_way_edges()
+        self.adjacency[node].remove(next_node)
+        self.edge_costs.pop((node, next_node), None)
+        # the edge in the opposite direction (if any) becomes a one-way edge, otherwise the removed edge was one
+        if node != next_node:
+            one_way_edges += 1 if node in self.adjacency.get(next_node, ()) else -1
+        self._edge_changed(node, next_node, one_way_edges)
+
+    def _check_cost(self, node: GraphNode, next_node: GraphNode, cost: float) -> None:
+        distance = euclidean_distance(node.position, next_node.position)
+        if cost < distance:
+            raise ValueError(f"The cost {cost} of the edge from {node} to {next_node} is less than the distance {distance} between them")
+
+    # Record the change, store the new number of one-way edges and drop the cached data that was computed from the old graph
+    # (the cache may be shared with other problems over the same graph, so this is the only place where the graph data is invalidated)
+    def _edge_changed(self, node: GraphNode, next_node: GraphNode, one_way_edges: Optional[int] = None) -> None:
+        self.changes.append((node, next_node))
+        cache = self.cache()
+        for key in ("reverse_adjacency", "landmark_tables", "contraction_hierarchy"):
+            cache.pop(key, None)
+        if one_way_edges is not None:
+            cache["one_way_edges"] = one_way_edges
     
     # Read a graph routing problem from file
     @staticmethod
     def from_file(path: str) -> 'GraphRoutingProblem':
         problem_def: Dict[str, Dict] = json.load(open(path, 'r'))
-        graph_def: Dict[str, Dict] = problem_def.get("graph", {})
-        node_dict = {name: GraphNode(name, Point(*item.get("position", [0,0]))) for name, item in graph_def.items()}
-        adjacency: Dict[GraphNode, List[GraphNode]] = {}
-        for name, item in graph_def.items():
-            node = node_dict[name]
-            adjacent = [node_dict[adjacent] for adjacent in sorted(item.get("adjacent", [])) if adjacent in node_dict]
-            adjacency[node] = adjacent
+        node_dict, adjacency = read_graph(problem_def.get("graph", {}))
         start = node_dict[problem_def.get("start", "")]
         goal = node_dict[problem_def.get("goal", "")]
         return GraphRoutingProblem(start, goal, adjacency)
 
+# Create the graph nodes (by name) and the adjacency lists from the "graph" section of a graph file
+# The adjacency list of each node is sorted by name
+def read_graph(graph_def: Dict[str, Dict]) -> Tuple[Dict[str, GraphNode], Dict[GraphNode, List[GraphNode]]]:
+    node_dict = {name: GraphNode(name, Point(*item.get("position", [0,0]))) for name, item in graph_def.items()}
+    adjacency: Dict[GraphNode, List[GraphNode]] = {}
+    for name, item in graph_def.items():
+        node = node_dict[name]
+        adjacent = [node_dict[adjacent] for adjacent in sorted(item.get("adjacent", [])) if adjacent in node_dict]
+        adjacency[node] = adjacent
+    return node_dict, adjacency
+
+# Returns the nodes of the graph (including the nodes that only appear as the end of an edge) sorted by name
+# The precomputed data of a graph (e.g. the landmark tables and the contraction hierarchy) numbers the nodes in this order
+def graph_nodes(problem: GraphRoutingProblem) -> List[GraphNode]:
+    nodes = set(problem.adjacency)
+    for adjacent in problem.adjacency.values():
+        nodes.update(adjacent)
+    return sorted(nodes, key=lambda node: node.name)
+
 def graphrouting_heuristic(problem: GraphRoutingProblem, state: GraphNode) -> float:
-    return euclidean_distance(state.position, problem.goal.position)
\ No newline at end of file
+    return euclidean_distance(state.position, problem.goal.position)
+
+# Returns a digest of the edges of the graph and their costs, so data computed from a graph and saved to a file
+# (e.g. the landmark tables) can be checked against the graph it is loaded for
+def graph_fingerprint(problem: GraphRoutingProblem) -> str:
+    digest = hashlib.sha256()
+    edges = sorted(
+        (node.name, next_node.name, repr(float(problem.get_cost(node, next_node))))
+        for node, adjacent in problem.adjacency.items() for next_node in adjacent
+    )
+    for edge in edges:
+        digest.update("\t".join(edge).encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+# The straight-line distance between any two nodes (used by the incremental search agents which estimate the cost from the start)
+def graphrouting_distance(problem: GraphRoutingProblem, state: GraphNode, other: GraphNode) -> float:
+    return euclidean_distance(state.position, other.position)
\ No newline at end of file
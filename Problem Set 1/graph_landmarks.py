@@ -0,0 +1,171 @@
+from array import array
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import heapq, json, os
+
+from problem import HeuristicFunction
+from graph import GraphNode, GraphRoutingProblem, graph_fingerprint, graph_nodes, graphrouting_heuristic
+
+# This file implements the ALT (A*, Landmarks, Triangle inequality) heuristic for the graph routing problem
+# We pick a few landmark nodes and precompute the exact distances from and to every landmark
+# Then, by the triangle inequality, for any node n, goal t and landmark L:
+#   distance(n, t) >= distance(L, t) - distance(L, n)
+#   distance(n, t) >= distance(n, L) - distance(t, L)
+# The heuristic is the maximum of these lower bounds (and the straight-line distance), so it stays admissible and consistent
+
+INF = float("inf")
+
+# The landmark tables store the distances in compact arrays where the node with index i is nodes[i]
+#   from_landmarks[k][i] is the distance from landmarks[k] to nodes[i]
+#   to_landmarks[k][i] is the distance from nodes[i] to landmarks[k]
+# Unreachable nodes have an infinite distance
+# The fingerprint is the "graph_fingerprint" of the graph the tables were computed for
+@dataclass
+class LandmarkTables:
+    nodes: List[str]
+    landmarks: List[str]
+    from_landmarks: List[array]
+    to_landmarks: List[array]
+    fingerprint: str = ""
+
+    def __post_init__(self) -> None:
+        self.index: Dict[str, int] = {name: index for index, name in enumerate(self.nodes)}
+
+    # Returns the lower bound on the distance from the node to the goal given by the landmarks
+    def lower_bound(self, node: str, goal: str) -> float:
+        n, t = self.index.get(node), self.index.get(goal)
+        if n is None or t is None:
+            return 0
+        bound = 0
+        for from_landmark, to_landmark in zip(self.from_landmarks, self.to_landmarks):
+            # If the landmark cannot reach the node, this bound is not informative
+            landmark_to_goal, landmark_to_node = from_landmark[t], from_landmark[n]
+            if landmark_to_node != INF:
+                bound = max(bound, landmark_to_goal - landmark_to_node)
+            # If the goal cannot reach the landmark, this bound is not informative
+            # Otherwise, if the node cannot reach the landmark then it cannot reach the goal and the bound is infinite
+            node_to_landmark, goal_to_landmark = to_landmark[n], to_landmark[t]
+            if goal_to_landmark != INF:
+                bound = max(bound, node_to_landmark - goal_to_landmark)
+        return bound
+
+    # Write the tables to a json file (infinite distances are written as null)
+    def save(self, path: str) -> None:
+        encode = lambda table: [None if distance == INF else distance for distance in table]
+        with open(path, 'w') as f:
+            json.dump({
+                "nodes": self.nodes,
+                "landmarks": self.landmarks,
+                "from_landmarks": [encode(table) for table in self.from_landmarks],
+                "to_landmarks": [encode(table) for table in self.to_landmarks],
+                "fingerprint": self.fingerprint,
+            }, f)
+
+    # Read the tables from a json file written by "save"
+    @staticmethod
+    def load(path: str) -> 'LandmarkTables':
+        decode = lambda table: array('d', (INF if distance is None else distance for distance in table))
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return LandmarkTables(
+            data["nodes"],
+            data["landmarks"],
+            [decode(table) for table in data["from_landmarks"]],
+            [decode(table) for table in data["to_landmarks"]],
+            data.get("fingerprint", ""),
+        )
+
+    # Check that the tables were computed for the graph of the problem with the given number of landmarks
+    def matches(self, problem: GraphRoutingProblem, count: int) -> bool:
+        return (
+            self.fingerprint == graph_fingerprint(problem)
+            and self.nodes == [node.name for node in graph_nodes(problem)]
+            and len(self.landmarks) == min(count, len(self.nodes))
+        )
+
+# Returns the path where the landmark tables of a graph file are stored (next to the graph file)
+def landmarks_path(graph_path: str) -> str:
+    return os.path.splitext(graph_path)[0] + ".landmarks.json"
+
+# Computes the shortest distance from the source to every reachable node using Dijkstra's algorithm
+# where neighbors(node) returns the pairs (neighbor, edge cost)
+def shortest_distances(
+    neighbors: Callable[[GraphNode], Iterable[Tuple[GraphNode, float]]],
+    source: GraphNode) -> Dict[GraphNode, float]:
+    distances = {source: 0}
+    explored = set()
+    frontier = [(0, 0, source)]
+    counter = 1
+    while frontier:
+        distance, _, node = heapq.heappop(frontier)
+        if node in explored:
+            continue
+        explored.add(node)
+        for neighbor, cost in neighbors(node):
+            new_distance = distance + cost
+            if new_distance < distances.get(neighbor, INF):
+                distances[neighbor] = new_distance
+                heapq.heappush(frontier, (new_distance, counter, neighbor))
+                counter += 1
+    return distances
+
+# Precompute the landmark tables for the graph of the given problem
+# The landmarks are selected greedily such that each new landmark is the node farthest from the already selected ones
+def build_landmark_tables(problem: GraphRoutingProblem, count: int = 4) -> LandmarkTables:
+    reverse_adjacency = problem.get_reverse_adjacency()
+    nodes = graph_nodes(problem)
+    if not nodes:
+        return LandmarkTables([], [], [], [], graph_fingerprint(problem))
+    forward = lambda node: ((next_node, problem.get_cost(node, next_node)) for next_node in problem.adjacency.get(node, []))
+    backward = lambda node: ((previous, problem.get_cost(previous, node)) for previous in reverse_adjacency.get(node, []))
+    to_table = lambda distances: array('d', (distances.get(node, INF) for node in nodes))
+
+    landmarks, from_landmarks, to_landmarks = [], [], []
+    # the distance from each node to its closest selected landmark (or from the first node before selecting any landmark)
+    closest = to_table(shortest_distances(forward, nodes[0]))
+    for _ in range(min(count, len(nodes))):
+        candidates = [index for index in range(len(nodes)) if nodes[index].name not in landmarks]
+        # prefer the reachable nodes that are the farthest from the selected landmarks
+        landmark = max(candidates, key=lambda index: (closest[index] != INF, closest[index]))
+        landmark_node = nodes[landmark]
+        landmarks.append(landmark_node.name)
+        from_landmarks.append(to_table(shortest_distances(forward, landmark_node)))
+        to_landmarks.append(to_table(shortest_distances(backward, landmark_node)))
+        if len(landmarks) == 1:
+            closest = from_landmarks[-1]
+        else:
+            closest = array('d', map(min, closest, from_landmarks[-1]))
+    return LandmarkTables([node.name for node in nodes], landmarks, from_landmarks, to_landmarks, graph_fingerprint(problem))
+
+# Returns the landmark tables of the problem, they are stored in the problem cache (by the number of landmarks)
+# so they are computed only once
+# If a path is given, the tables are loaded from it if it exists and they match the graph and the number of landmarks,
+# otherwise they are computed and saved to it
+def get_landmark_tables(problem: GraphRoutingProblem, count: int = 4, path: Optional[str] = None) -> LandmarkTables:
+    cached: Dict[int, LandmarkTables] = problem.cache().setdefault("landmark_tables", {})
+    tables = cached.get(count)
+    if tables is None:
+        if path is not None and os.path.exists(path):
+            tables = LandmarkTables.load(path)
+            if not tables.matches(problem, count):
+                tables = None
+        if tables is None:
+            tables = build_landmark_tables(problem, count)
+            if path is not None:
+                tables.save(path)
+        cached[count] = tables
+    return tables
+
+# The ALT heuristic with the default number of landmarks (the tables are built once and stored in the problem cache)
+# Since the straight-line distance is also a lower bound, the heuristic is never weaker than "graphrouting_heuristic"
+def landmark_heuristic(problem: GraphRoutingProblem, state: GraphNode) -> float:
+    tables = get_landmark_tables(problem)
+    return max(graphrouting_heuristic(problem, state), tables.lower_bound(state.name, problem.goal.name))
+
+# Create the ALT heuristic with the given number of landmarks, where the tables are loaded from (or saved to) the path if it is given
+# The heuristic always uses the tables of this count, whatever other tables are stored in the problem cache
+def make_landmark_heuristic(count: int = 4, path: Optional[str] = None) -> HeuristicFunction:
+    def heuristic(problem: GraphRoutingProblem, state: GraphNode) -> float:
+        tables = get_landmark_tables(problem, count, path)
+        return max(graphrouting_heuristic(problem, state), tables.lower_bound(state.name, problem.goal.name))
+    return heuristic
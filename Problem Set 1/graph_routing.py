@@ -0,0 +1,186 @@
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+import json
+
+from graph import GraphNode, GraphRoutingProblem, read_graph
+from mathutils import euclidean_distance
+from problem import Solution
+from search_utils import IndexedPriorityQueue, SearchTree
+
+# This file implements routing many (start, goal) queries over one graph
+# The graph is loaded once, and the queries that share the same start node share one shortest path tree
+
+# A query is a pair of (start, goal) nodes where each node can be given by its name
+Query = Tuple[Union[str, GraphNode], Union[str, GraphNode]]
+
+# An edge cost function receives the two nodes of an edge and returns its cost
+EdgeCost = Callable[[GraphNode, GraphNode], float]
+
+# The default edge cost is the distance between the nodes (like "GraphRoutingProblem.get_cost" for an unchanged edge)
+def edge_distance(node: GraphNode, next_node: GraphNode) -> float:
+    return euclidean_distance(node.position, next_node.position)
+
+# The shortest path tree runs Dijkstra's algorithm from a source node and keeps its state between queries
+# The tree is only grown until the requested goal is explored, so later queries continue from where the previous ones stopped
+# The expansion order (including the FIFO tie-breaking) is the same as "UniformCostSearch",
+# so the returned paths are the same paths that "UniformCostSearch" returns
+# The tree is only valid while the graph does not change (the routing graph drops its trees when the graph changes)
+class ShortestPathTree:
+    def __init__(self, adjacency: Dict[GraphNode, List[GraphNode]], source: GraphNode, cost: EdgeCost = edge_distance) -> None:
+        self.adjacency = adjacency
+        self.source = source
+        self.cost = cost
+        self.tree = SearchTree()
+        self.frontier = IndexedPriorityQueue()
+        self.frontier.push(source, 0, SearchTree.ROOT)
+        # A map from each explored node to its node index in the search tree
+        self.explored: Dict[GraphNode, int] = {}
+
+    # Returns the path from the source to the goal (excluding the source) or None if the goal is unreachable
+    def path_to(self, goal: GraphNode) -> Solution:
+        node = self._explore_until(goal)
+        return None if node is None else self.tree.path(node)
+
+    # Returns the path cost from the source to the goal or None if the goal is unreachable
+    def cost_to(self, goal: GraphNode) -> Optional[float]:
+        node = self._explore_until(goal)
+        return None if node is None else self.tree.cost(node)
+
+    def _explore_until(self, goal: GraphNode) -> Optional[int]:
+        if goal in self.explored:
+            return self.explored[goal]
+        frontier, tree, explored, edge_cost = self.frontier, self.tree, self.explored, self.cost
+        while frontier:
+            state, cost, node = frontier.pop()
+            explored[state] = node
+            for next_state in self.adjacency.get(state, []):
+                if next_state in explored:
+                    continue
+                new_cost = cost + edge_cost(state, next_state)
+                if next_state not in frontier or new_cost < frontier.priority(next_state):
+                    frontier.push(next_state, new_cost, tree.add(node, next_state, new_cost))
+            if state == goal:
+                return node
+        return None
+
+# The routing graph holds a graph which is loaded once and answers shortest path queries between any pair of nodes
+# It keeps the shortest path trees of the most recently used sources (up to "max_cached_trees") to reuse them across calls
+# The edge costs, the change log and the problem cache have the same meaning as in "GraphRoutingProblem" and they are shared
+# with the problems created by "problem", so the edges changed through these problems ("set_cost", "add_edge" and "remove_edge")
+# change this graph and invalidate the graph data cached by all of them (e.g. the reverse adjacency and the one-way edge count),
+# and the cached trees are dropped when the change log grows
+class RoutingGraph:
+    def __init__(
+        self,
+        adjacency: Dict[GraphNode, List[GraphNode]],
+        max_cached_trees: int = 64,
+        edge_costs: Optional[Dict[Tuple[GraphNode, GraphNode], float]] = None,
+    ) -> None:
+        self.adjacency = adjacency
+        self.edge_costs: Dict[Tuple[GraphNode, GraphNode], float] = {} if edge_costs is None else edge_costs
+        self.changes: List[Tuple[GraphNode, GraphNode]] = []
+        # The cache shared by the problems over this graph, so the graph data is computed once for all of them
+        self.problem_cache: Dict[str, Any] = {}
+        self.nodes: Dict[str, GraphNode] = {node.name: node for node in adjacency}
+        for adjacent in adjacency.values():
+            for node in adjacent:
+                self.nodes.setdefault(node.name, node)
+        self.max_cached_trees = max_cached_trees
+        self.trees: 'OrderedDict[GraphNode, ShortestPathTree]' = OrderedDict()
+        # The number of changes in the change log when the cached trees were built
+        self.seen_changes = 0
+
+    # Returns the node with the given name (or the node itself if a node is given)
+    def node(self, node: Union[str, GraphNode]) -> GraphNode:
+        return self.nodes[node] if isinstance(node, str) else node
+
+    # Returns the cost of an edge (the distance between its nodes unless its cost was changed)
+    def get_cost(self, node: GraphNode, next_node: GraphNode) -> float:
+        if self.edge_costs:
+            cost = self.edge_costs.get((node, next_node))
+            if cost is not None:
+                return cost
+        return edge_distance(node, next_node)
+
+    # Create a graph routing problem over this graph (the adjacency, the edge costs, the change log and the cache are shared, not copied)
+    def problem(self, start: Union[str, GraphNode], goal: Union[str, GraphNode]) -> GraphRoutingProblem:
+        return GraphRoutingProblem(self.node(start), self.node(goal), self.adjacency, self.edge_costs, self.changes, self.problem_cache)
+
+    # Drop the cached trees if the graph changed since they were built (and register the nodes of the added edges)
+    def _check_changes(self) -> None:
+        if len(self.changes) == self.seen_changes:
+            return
+        for change in self.changes[self.seen_changes:]:
+            for node in change:
+                self.nodes.setdefault(node.name, node)
+        self.seen_changes = len(self.changes)
+        self.trees.clear()
+
+    # Returns the shortest path tree of the given source, creating it if it is not cached
+    def shortest_path_tree(self, source: Union[str, GraphNode]) -> ShortestPathTree:
+        self._check_changes()
+        source = self.node(source)
+        tree = self.trees.get(source)
+        if tree is None:
+            tree = ShortestPathTree(self.adjacency, source, self.get_cost)
+            self.trees[source] = tree
+            if len(self.trees) > self.max_cached_trees:
+                self.trees.popitem(last=False)
+        else:
+            self.trees.move_to_end(source)
+        return tree
+
+    # Returns the shortest path from the start to the goal (excluding the start) or None if there is no path
+    def route(self, start: Union[str, GraphNode], goal: Union[str, GraphNode]) -> Solution:
+        return self.shortest_path_tree(start).path_to(self.node(goal))
+
+    # Answer many queries where the queries are grouped by their start node so each group is answered by one shortest path tree
+    # The results are generated as tuples of (start, goal, solution) as soon as they are ready,
+    # so they are grouped by the start node instead of following the order of the queries
+    # If processes is given, the groups are distributed over a pool with this number of processes
+    def route_many(self, queries: Iterable[Query], processes: Optional[int] = None) -> Iterator[Tuple[GraphNode, GraphNode, Solution]]:
+        self._check_changes()
+        groups: Dict[GraphNode, List[GraphNode]] = {}
+        for start, goal in queries:
+            groups.setdefault(self.node(start), []).append(self.node(goal))
+        if processes is None:
+            for start, goals in groups.items():
+                tree = self.shortest_path_tree(start)
+                for goal in goals:
+                    yield start, goal, tree.path_to(goal)
+            return
+        # Each process receives the graph and its edge costs once (when it starts) and the groups are sent by node names
+        with ProcessPoolExecutor(processes, initializer=_initialize_worker, initargs=(self.adjacency, self.edge_costs)) as executor:
+            futures = [
+                executor.submit(_route_group, start.name, [goal.name for goal in goals])
+                for start, goals in groups.items()
+            ]
+            for future in as_completed(futures):
+                start, results = future.result()
+                start = self.nodes[start]
+                for goal, path in results:
+                    yield start, self.nodes[goal], (None if path is None else [self.nodes[name] for name in path])
+
+    # Read the graph from a graph file (the start and goal in the file are ignored)
+    @staticmethod
+    def from_file(path: str, max_cached_trees: int = 64) -> 'RoutingGraph':
+        with open(path, 'r') as f:
+            problem_def: Dict[str, Dict] = json.load(f)
+        _, adjacency = read_graph(problem_def.get("graph", {}))
+        return RoutingGraph(adjacency, max_cached_trees)
+
+# The routing graph of the current worker process
+_worker_graph: Optional[RoutingGraph] = None
+
+def _initialize_worker(adjacency: Dict[GraphNode, List[GraphNode]], edge_costs: Dict[Tuple[GraphNode, GraphNode], float]) -> None:
+    global _worker_graph
+    _worker_graph = RoutingGraph(adjacency, edge_costs=edge_costs)
+
+def _route_group(start: str, goals: List[str]) -> Tuple[str, List[Tuple[str, Optional[List[str]]]]]:
+    tree = _worker_graph.shortest_path_tree(start)
+    results = []
+    for goal in goals:
+        path = tree.path_to(_worker_graph.node(goal))
+        results.append((goal, None if path is None else [node.name for node in path]))
+    return start, results
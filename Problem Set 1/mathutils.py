@@ -1,6 +1,6 @@
 from dataclasses import dataclass
 from enum import IntEnum
-from typing import Iterator
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 import math
 
 # the class Point will hold a 2D coordinate on a discrete grid
@@ -32,6 +32,10 @@ class Point:
     def __iter__(self) -> Iterator[int]:
         return iter((self.x, self.y))
 
+    # The frozen dataclass cannot be unpickled field by field, so it is unpickled by calling the constructor
+    def __reduce__(self):
+        return (Point, (self.x, self.y))
+
 # This is a helper function to compute the manhattan distance between 2 points
 def manhattan_distance(p1: Point, p2: Point) -> int:
     return abs(p1.x - p2.x) + abs(p1.y - p2.y)
@@ -75,4 +79,23 @@ Direction._Vectors = [
     Point( 0, -1),
     Point(-1,  0),
     Point( 0,  1)
-]
\ No newline at end of file
+]
+
+# The grid topology numbers the walkable cells of a grid (by y then x) and precomputes the neighbors of every cell
+# so that the hot loops can move on the grid by indexing a table instead of creating new points
+#   cells[i] is the point of the cell with the id i and cell_ids[point] is the id of the cell at this point
+#   neighbors[i][direction] is the id of the neighbor of cell i in this direction or -1 if it is not walkable
+# It should be built once per layout and shared by all the states
+class GridTopology:
+    def __init__(self, walkable: Iterable[Point]) -> None:
+        self.cells: Tuple[Point, ...] = tuple(sorted(walkable, key=lambda point: (point.y, point.x)))
+        self.cell_ids: Dict[Point, int] = {cell: index for index, cell in enumerate(self.cells)}
+        self.neighbors: List[Tuple[int, ...]] = [
+            tuple(self.cell_ids.get(cell + direction.to_vector(), -1) for direction in Direction)
+            for cell in self.cells
+        ]
+
+    # Returns the walkable neighbor of the point in the given direction or None if there is none
+    def neighbor(self, point: Point, direction: Direction) -> Optional[Point]:
+        index = self.neighbors[self.cell_ids[point]][direction]
+        return None if index < 0 else self.cells[index]
\ No newline at end of file
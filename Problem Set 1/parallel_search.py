@@ -0,0 +1,423 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import heapq, itertools, multiprocessing, os, pickle, queue, traceback, zlib
+
+from problem import HeuristicFunction, Problem, S, A, Solution
+from search_utils import SearchTree
+
+# This file implements parallel searches which run on multiple processes
+# The first one is Hash Distributed A* (HDA*) which runs A* on multiple processes
+# Every state is owned by one worker process which is selected by the hash of the state
+# The owner keeps the open list and the best path cost of its states, so duplicates are detected locally
+# When a worker generates a state owned by another worker, it sends the node to the owner (the nodes are sent in batches)
+# The first goal found is not necessarily optimal, so it becomes the incumbent solution and the search continues
+# until no worker has a node whose total cost is less than the incumbent cost and no nodes are being sent
+#
+# The termination is detected by the main process using waves of probes:
+# each worker replies with whether it is idle and the number of nodes it sent and received, and the search terminates
+# when two consecutive waves find every worker idle and the same counts where the sent count equals the received count
+#
+# The states and the actions must be picklable since they are sent between the processes
+# Since the hash is used to select the owner, it must be the same in all the processes which is true for forked processes.
+# Spawned processes have their own hash seeds (e.g. the hash of a string differs between them),
+# so spawned workers select the owner by a fixed hash (CRC32) of the encoded state, which needs a problem that can encode its states
+
+INF = float("inf")
+
+# The worker processes are forked where it is possible, so the problem and the heuristic are not pickled
+# Where fork is not available (e.g. on Windows), the workers are spawned and their arguments are pickled,
+# so the problem, the heuristic and the search strategies must be picklable (e.g. module-level functions instead of lambdas)
+START_METHOD = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+
+def get_context() -> Any:
+    return multiprocessing.get_context(START_METHOD)
+
+# Raise a ValueError that explains the start method if the arguments of the workers can not be pickled
+# (otherwise the error would only appear in the worker processes, or as a broken process pool)
+def check_picklable(context: Any, description: str, *arguments: Any) -> None:
+    if context.get_start_method() == "fork":
+        return
+    try:
+        pickle.dumps(arguments)
+    except Exception as error:
+        raise ValueError(
+            f"The {description} must be picklable to start the workers with the '{context.get_start_method()}' start method"
+        ) from error
+
+# The kinds of the messages sent between the processes
+_NODES, _INCUMBENT, _PROBE, _STATUS, _GOAL, _PARENT, _STOP, _ERROR = range(8)
+
+# The number of nodes sent to another worker in one message (the batches are also sent after every round of expansions)
+BATCH_SIZE = 64
+# The number of nodes each worker expands before reading its messages again
+EXPANSIONS_PER_ROUND = 64
+# The number of seconds the main process waits for a message before checking that the workers are still alive
+POLL_INTERVAL = 0.5
+
+# A node is referenced by the index of its owner worker and its index in the owner's node tables
+NodeRef = Tuple[int, int]
+
+def ParallelAStarSearch(problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction, workers: Optional[int] = None) -> Solution:
+    # By default, one worker runs on each CPU core
+    if workers is None:
+        workers = os.cpu_count() or 1
+    context = get_context()
+    forked = context.get_start_method() == "fork"
+    if not forked:
+        try:
+            problem.encode_state(initial_state)
+        except NotImplementedError:
+            raise ValueError(
+                f"{type(problem).__name__} can not encode its states, so its states can not be assigned to spawned workers"
+            ) from None
+        check_picklable(context, "problem and the heuristic", problem, heuristic)
+    owner = _owner_function(problem, workers, forked)
+    inboxes = [context.Queue() for _ in range(workers)]
+    results = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(index, problem, heuristic, inboxes, results, forked), daemon=True)
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        # The main process sends the initial node to its owner, so it is counted as a sent node
+        inboxes[owner(initial_state)].put((_NODES, [(initial_state, 0, None, None)]))
+        sent = 1
+        incumbent, goal = INF, None
+        wave, statuses, previous_counts = 0, {}, None
+
+        def start_wave() -> None:
+            nonlocal wave, statuses
+            wave, statuses = wave + 1, {}
+            for inbox in inboxes:
+                inbox.put((_PROBE, wave))
+
+        start_wave()
+        while True:
+            message = _receive(results, processes)
+            if message[0] == _GOAL:
+                _, cost, node = message
+                if cost < incumbent:
+                    incumbent, goal = cost, node
+                    # Tell the workers to prune the nodes whose total cost is not less than the incumbent cost
+                    for inbox in inboxes:
+                        inbox.put((_INCUMBENT, cost))
+            elif message[0] == _STATUS:
+                _, status_wave, worker, idle, worker_sent, worker_received = message
+                if status_wave != wave:
+                    continue
+                statuses[worker] = (idle, worker_sent, worker_received)
+                if len(statuses) < workers:
+                    continue
+                counts = (
+                    sent + sum(worker_sent for _, worker_sent, _ in statuses.values()),
+                    sum(worker_received for _, _, worker_received in statuses.values()),
+                )
+                quiet = all(idle for idle, _, _ in statuses.values()) and counts[0] == counts[1]
+                if quiet and counts == previous_counts:
+                    break
+                previous_counts = counts if quiet else None
+                start_wave()
+
+        if goal is None:
+            return None
+        # Trace the path back from the goal by asking the owner of every node for its parent
+        path = []
+        node = goal
+        while True:
+            owner, index = node
+            inboxes[owner].put((_PARENT, index))
+            message = _receive(results, processes)
+            while message[0] != _PARENT:
+                message = _receive(results, processes)
+            _, node, action = message
+            if node is None:
+                break
+            path.append(action)
+        path.reverse()
+        return path
+    finally:
+        for inbox in inboxes:
+            inbox.put((_STOP,))
+        for process in processes:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+
+# Returns the next message sent to the main process
+# If a worker failed, its exception is raised again in the main process (with the traceback of the worker as a note)
+# and if a worker died without reporting an error (e.g. it was killed), a RuntimeError is raised instead of waiting forever
+def _receive(results: Any, processes: List[Any]) -> Tuple:
+    while True:
+        try:
+            message = results.get(timeout=POLL_INTERVAL)
+        except queue.Empty:
+            dead = [(index, process.exitcode) for index, process in enumerate(processes) if not process.is_alive()]
+            if not dead:
+                continue
+            # A failed worker sends its error before it exits, so the error may arrive just after its exit is noticed
+            try:
+                message = results.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                index, exitcode = dead[0]
+                raise RuntimeError(f"The search worker {index} exited unexpectedly with the exit code {exitcode}")
+        if message[0] == _ERROR:
+            _, index, error, worker_traceback = message
+            error.add_note(f"Raised in the search worker {index}:\n{worker_traceback}")
+            raise error
+        return message
+
+# Send the exception of a failed worker to the main process
+# If the exception can not be pickled, it is replaced by a RuntimeError with the same message
+def _report_error(index: int, error: Exception, results: Any) -> None:
+    try:
+        pickle.dumps(error)
+    except Exception:
+        error = RuntimeError(repr(error))
+    results.put((_ERROR, index, error, traceback.format_exc()))
+
+# Returns the function that selects the owner worker of a state (see the comment at the top of the file)
+def _owner_function(problem: Problem, workers: int, forked: bool) -> Callable[[Any], int]:
+    if forked:
+        return lambda state: hash(state) % workers
+    return lambda state: zlib.crc32(problem.encode_state(state)) % workers
+
+def _worker(index: int, problem: Problem, heuristic: HeuristicFunction, inboxes: List[Any], results: Any, forked: bool) -> None:
+    try:
+        _search_worker(index, problem, heuristic, inboxes, results, _owner_function(problem, len(inboxes), forked))
+    except Exception as error:
+        _report_error(index, error, results)
+
+def _search_worker(
+    index: int, problem: Problem, heuristic: HeuristicFunction, inboxes: List[Any], results: Any, owner_of: Callable[[Any], int]
+) -> None:
+    workers = len(inboxes)
+    inbox = inboxes[index]
+    # The node tables: the node with the index i has the state states[i], the best known path cost costs[i]
+    # and it was reached from the node parents[i] by the action actions[i]
+    ids: Dict[Any, int] = {}
+    states: List[Any] = []
+    costs: List[float] = []
+    estimates: List[float] = []
+    parents: List[Optional[NodeRef]] = []
+    actions: List[Any] = []
+    # The open list contains (total cost, counter, node index, path cost) where the counter resolves ties in FIFO order
+    # An entry is stale if the node was reached again with a smaller path cost
+    frontier: List[Tuple[float, int, int, float]] = []
+    counter = itertools.count()
+    outboxes: List[List[Tuple]] = [[] for _ in range(workers)]
+    incumbent = INF
+    sent = received = 0
+
+    def insert(state, cost, parent, action) -> None:
+        node = ids.get(state)
+        if node is None:
+            estimate = heuristic(problem, state)
+            # if the heuristic is infinite, the goal can never be reached from the node, so neglect it
+            if estimate == INF:
+                return
+            node = ids[state] = len(states)
+            states.append(state)
+            costs.append(cost)
+            estimates.append(estimate)
+            parents.append(parent)
+            actions.append(action)
+        elif cost < costs[node]:
+            costs[node], parents[node], actions[node] = cost, parent, action
+        else:
+            return
+        total_cost = cost + estimates[node]
+        if total_cost < incumbent:
+            heapq.heappush(frontier, (total_cost, next(counter), node, cost))
+
+    def flush() -> None:
+        nonlocal sent
+        for owner, batch in enumerate(outboxes):
+            if batch:
+                inboxes[owner].put((_NODES, batch))
+                sent += len(batch)
+                outboxes[owner] = []
+
+    while True:
+        # Read all the messages, and wait for a message if there is nothing to expand
+        block = not (frontier and frontier[0][0] < incumbent)
+        while True:
+            try:
+                message = inbox.get() if block else inbox.get_nowait()
+            except queue.Empty:
+                break
+            block = False
+            kind = message[0]
+            if kind == _NODES:
+                received += len(message[1])
+                for node in message[1]:
+                    insert(*node)
+            elif kind == _INCUMBENT:
+                incumbent = min(incumbent, message[1])
+            elif kind == _PROBE:
+                idle = not (frontier and frontier[0][0] < incumbent)
+                results.put((_STATUS, message[1], index, idle, sent, received))
+            elif kind == _PARENT:
+                results.put((_PARENT, parents[message[1]], actions[message[1]]))
+            elif kind == _STOP:
+                return
+
+        for _ in range(EXPANSIONS_PER_ROUND):
+            if not frontier or frontier[0][0] >= incumbent:
+                break
+            _, _, node, cost = heapq.heappop(frontier)
+            if cost > costs[node]:
+                continue
+            state = states[node]
+            if problem.is_goal(state):
+                incumbent = cost
+                results.put((_GOAL, cost, (index, node)))
+                continue
+            for action in problem.get_actions(state):
+                next_state = problem.get_successor(state, action)
+                next_cost = cost + problem.get_cost(state, action)
+                if next_cost >= incumbent:
+                    continue
+                owner = owner_of(next_state)
+                if owner == index:
+                    insert(next_state, next_cost, (index, node), action)
+                else:
+                    outboxes[owner].append((next_state, next_cost, (index, node), action))
+                    if len(outboxes[owner]) >= BATCH_SIZE:
+                        inboxes[owner].put((_NODES, outboxes[owner]))
+                        sent += len(outboxes[owner])
+                        outboxes[owner] = []
+        flush()
+
+# This is a level-parallel breadth first search: every layer of the search is split into shards which are expanded by a pool of
+# worker processes (each worker runs "get_actions" and "get_successor" on its shard and returns the successors)
+# The main process merges the successors in the order of the layer, so it removes the duplicates and does the goal test
+# before inserting a node into the next layer exactly like "BreadthFirstSearch" (and it returns the same solution)
+# If the problem can encode its states (see "encode_state"), the states are sent between the processes as bytes
+# which is much cheaper than pickling them, and the main process compares the encoded states instead of the states
+# (the workers also compute whether each successor is a goal so the main process does not decode them)
+# Small layers are expanded by the main process since sending them to the workers costs more than expanding them
+# The states (if they are not encoded) and the actions must be picklable (and the problem too if the workers are spawned)
+# The pool is a process pool executor, so an exception in a worker is raised again in the main process
+# and a worker that dies makes the search fail (with BrokenProcessPool) instead of waiting forever for its shard
+
+# The least number of states in a shard (smaller layers are not split)
+MIN_SHARD_SIZE = 256
+# The number of shards per worker in every layer (more shards balance the work between the workers better)
+SHARDS_PER_WORKER = 4
+
+def ParallelBreadthFirstSearch(problem: Problem[S, A], initial_state: S, workers: Optional[int] = None) -> Solution:
+    # BFS checks whether a node is goal BEFORE inserting it into the frontier
+    if problem.is_goal(initial_state):
+        return []
+    # By default, one worker runs on each CPU core
+    if workers is None:
+        workers = os.cpu_count() or 1
+    try:
+        start = problem.encode_state(initial_state)
+        encoded = True
+    except NotImplementedError:
+        start, encoded = initial_state, False
+    context = get_context()
+    check_picklable(context, "problem", problem)
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_set_worker_problem, initargs=(problem, encoded)) as pool:
+        # the search tree stores the parent and the action of every generated node
+        tree = SearchTree()
+        # the current layer is a list of (encoded) states and a list of their nodes in the search tree
+        layer, layer_nodes = [start], [SearchTree.ROOT]
+        # the set of the (encoded) states that were inserted into any layer (explored or in the frontier)
+        reached = {start}
+        while layer:
+            shard_size = max(MIN_SHARD_SIZE, -(-len(layer) // (workers * SHARDS_PER_WORKER)))
+            if len(layer) <= shard_size:
+                expansions = [_expand_shard(layer, problem, encoded)]
+            else:
+                shards = [layer[index:index + shard_size] for index in range(0, len(layer), shard_size)]
+                expansions = pool.map(_expand_shard, shards)
+            next_layer, next_layer_nodes = [], []
+            nodes = iter(layer_nodes)
+            # merge the successors in the order of the layer
+            for shard_successors in expansions:
+                for successors, node in zip(shard_successors, nodes):
+                    for action, next_state, is_goal in successors:
+                        # if the node is already explored or in the frontier --> neglect it
+                        if next_state in reached:
+                            continue
+                        next_node = tree.add(node, action)
+                        # check if the state is goal state before adding it to the frontier
+                        if is_goal:
+                            return tree.path(next_node)
+                        reached.add(next_state)
+                        next_layer.append(next_state)
+                        next_layer_nodes.append(next_node)
+            layer, layer_nodes = next_layer, next_layer_nodes
+    # frontier is empty and no goal is found
+    return None
+
+# The problem of the pool worker and whether the states are encoded (set once when the worker starts)
+_worker_problem: Optional[Problem] = None
+_worker_encoded = False
+
+def _set_worker_problem(problem: Problem, encoded: bool) -> None:
+    global _worker_problem, _worker_encoded
+    _worker_problem, _worker_encoded = problem, encoded
+
+# Returns the (action, successor, whether the successor is a goal) tuples of every state in the shard
+def _expand_shard(shard: List[Any], problem: Optional[Problem] = None, encoded: Optional[bool] = None) -> List[List[Tuple[Any, Any, bool]]]:
+    if problem is None:
+        problem, encoded = _worker_problem, _worker_encoded
+    expansions = []
+    for state in shard:
+        if encoded:
+            state = problem.decode_state(state)
+        successors = []
+        for action in problem.get_actions(state):
+            next_state = problem.get_successor(state, action)
+            successors.append((action, problem.encode_state(next_state) if encoded else next_state, problem.is_goal(next_state)))
+        expansions.append(successors)
+    return expansions
+
+if __name__ == "__main__":
+    # Measure the speedup of the level-parallel breadth first search over "BreadthFirstSearch" with different numbers of workers
+    # The input is a sokoban level (.txt in levels/), a parking lot (.txt in parks/) or a graph (.json), and every search is run
+    # several times where the least time is reported (the machine noise only makes a run slower)
+    import argparse, time
+    from search import BreadthFirstSearch
+
+    parser = argparse.ArgumentParser(description="Compare the level-parallel breadth first search with the breadth first search")
+    parser.add_argument("input", help="path to a sokoban level, a parking lot or a graph file")
+    parser.add_argument("-w", "--workers", type=int, nargs="+", default=[1, os.cpu_count() or 1], help="the numbers of workers to measure")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="the number of runs of every search")
+    args = parser.parse_args()
+
+    if args.input.endswith(".json"):
+        from graph import GraphRoutingProblem
+        problem = GraphRoutingProblem.from_file(args.input)
+    elif os.path.basename(os.path.dirname(os.path.abspath(args.input))) == "parks":
+        from parking import ParkingProblem
+        problem = ParkingProblem.from_file(args.input)
+    else:
+        from sokoban import SokobanProblem
+        problem = SokobanProblem.from_file(args.input)
+    initial_state = problem.get_initial_state()
+
+    def measure(search_fn) -> Tuple[float, Solution]:
+        best_time, solution = INF, None
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            solution = search_fn()
+            best_time = min(best_time, time.perf_counter() - start)
+        return best_time, solution
+
+    print(f"{os.cpu_count()} CPU cores, the least time of {args.repeat} runs")
+    bfs_time, expected = measure(lambda: BreadthFirstSearch(problem, initial_state))
+    print(f"BreadthFirstSearch: {bfs_time:.3f} seconds")
+    times = {}
+    for workers in args.workers:
+        times[workers], solution = measure(lambda: ParallelBreadthFirstSearch(problem, initial_state, workers))
+        same = "the same solution" if solution == expected else "A DIFFERENT SOLUTION"
+        print(
+            f"ParallelBreadthFirstSearch with {workers} workers: {times[workers]:.3f} seconds "
+            f"({bfs_time / times[workers]:.2f}x of BFS, {times[args.workers[0]] / times[workers]:.2f}x of {args.workers[0]} workers, {same})"
+        )
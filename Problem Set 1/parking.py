@@ -1,10 +1,14 @@
-from typing import Any, Dict, Set, Tuple, List
+from typing import Any, Dict, Optional, Set, Tuple, List
 from problem import Problem
-from mathutils import Direction, Point
+from mathutils import Direction, GridTopology, Point
 from helpers.utils import NotImplemented
 
 #TODO: (Optional) Instead of Any, you can define a type for the parking state
-ParkingState = Tuple[Point]
+# The parking state packs the positions of all the cars in one integer:
+# the position of car 'i' is its cell id (in the problem topology) stored in the bits [i * cell_bits, (i + 1) * cell_bits)
+# so the state is hashed and compared as an integer and a move only adds the difference of the cell ids at the car bits.
+# Use "unpack_positions" to get the tuple of points.
+ParkingState = int
 
 # An action of the parking problem is a tuple containing an index 'i' and a direction 'd' where car 'i' should move in the direction 'd'.
 ParkingAction = Tuple[int, Direction]
@@ -12,38 +16,43 @@ ParkingAction = Tuple[int, Direction]
 # This is the implementation of the parking problem
 class ParkingProblem(Problem[ParkingState, ParkingAction]):
     passages: Set[Point]    # A set of points which indicate where a car can be (in other words, every position except walls).
-    cars: Tuple[Point]      # A tuple of points where state[i] is the position of car 'i'. 
+    cars: Tuple[Point]      # A tuple of points where cars[i] is the initial position of car 'i'.
     slots: Dict[Point, int] # A dictionary which indicate the index of the parking slot (if it is 'i' then it is the lot of car 'i') for every position.
                             # if a position does not contain a parking slot, it will not be in this dictionary.
     width: int              # The width of the parking lot.
     height: int             # The height of the parking lot.
+    topology: GridTopology  # The cell ids and the neighbor table of the passages (computed once when the problem is read).
+    cell_bits: int          # The number of bits used to store the cell id of a car in the state.
+    goal: Optional[ParkingState] # The state where every car is in its slot (or None if some car has no slot).
+    integer_costs = True    # The action costs are integers from 1 to 26.
+    reversible = True       # Every move can be undone by moving the same car back.
 
     # This function should return the initial state
     def get_initial_state(self) -> ParkingState:
         #TODO: ADD YOUR CODE HERE
-        return self.cars
+        return self.pack_positions(self.cars)
     
     # This function should return True if the given state is a goal. Otherwise, it should return False.
     def is_goal(self, state: ParkingState) -> bool:
         #TODO: ADD YOUR CODE HERE
-        # check for every car if it's in its didcated slot
-        for i, pos in enumerate(state):
-            # if the car isn't in any slot -> not a goal
-            # if the car not in its own slot -> not a goal
-            if pos not in self.slots or self.slots[pos] != i: return False
-        return True
+        # every car is in its dedicated slot in exactly one state
+        return state == self.goal
     
     # This function returns a list of all the possible actions that can be applied to the given state
     def get_actions(self, state: ParkingState) -> List[ParkingAction]:
         #TODO: ADD YOUR CODE HERE
         actions = []
-        # set of all points occupied by the cars
-        occupied = set(state)
+        cells = self.unpack_cells(state)
+        # set of all cells occupied by the cars
+        occupied = set(cells)
         # for every car, you can move up, down, left, right if there's no car already in this slot or no wall
-        for i, pos in enumerate(state):
+        # the moves are done on the cell ids of the grid topology (-1 means a wall)
+        neighbors = self.topology.neighbors
+        for i, cell in enumerate(cells):
+            cell_neighbors = neighbors[cell]
             for d in Direction:
-                new_pos = pos + d.to_vector()
-                if new_pos not in occupied and new_pos in self.passages:
+                new_cell = cell_neighbors[d]
+                if new_cell >= 0 and new_cell not in occupied:
                     actions.append((i, d))
         return actions
     
@@ -51,9 +60,14 @@ class ParkingProblem(Problem[ParkingState, ParkingAction]):
     def get_successor(self, state: ParkingState, action: ParkingAction) -> ParkingState:
         #TODO: ADD YOUR CODE HERE
         i, d = action
-        new_state = list(state)
-        new_state[i] += d.to_vector()
-        return tuple(new_state)
+        shift = i * self.cell_bits
+        cell = (state >> shift) & ((1 << self.cell_bits) - 1)
+        new_cell = self.topology.neighbors[cell][d]
+        if new_cell < 0:
+            # If we try to move the car into a wall, then this action is wrong
+            raise Exception(f"Invalid action {action} in state: {self.unpack_positions(state)}")
+        # replace the cell id of the car by adding the difference
+        return state + ((new_cell - cell) << shift)
     
     # This function returns the cost of applying the given action to the given state
     def get_cost(self, state: ParkingState, action: ParkingAction) -> float:
@@ -62,6 +76,31 @@ class ParkingProblem(Problem[ParkingState, ParkingAction]):
         # where car A of index 0 is of cost 26, Z of index 25 is of cost 1
         i, _ = action
         return 26 - i
+
+    # The state is encoded as its big-endian bytes with a fixed length, so the encodings are sorted like the states
+    def encode_state(self, state: ParkingState) -> bytes:
+        return state.to_bytes((self.cell_bits * len(self.cars) + 7) // 8, 'big')
+
+    def decode_state(self, data: bytes) -> ParkingState:
+        return int.from_bytes(data, 'big')
+
+    # Returns the cell ids of the cars in the given state
+    def unpack_cells(self, state: ParkingState) -> List[int]:
+        bits = self.cell_bits
+        mask = (1 << bits) - 1
+        return [(state >> (i * bits)) & mask for i in range(len(self.cars))]
+
+    # Returns the positions of the cars in the given state
+    def unpack_positions(self, state: ParkingState) -> Tuple[Point]:
+        cells = self.topology.cells
+        return tuple(cells[cell] for cell in self.unpack_cells(state))
+
+    # Returns the state where the cars are at the given positions
+    def pack_positions(self, positions: Tuple[Point]) -> ParkingState:
+        state = 0
+        for i, position in enumerate(positions):
+            state |= self.topology.cell_ids[position] << (i * self.cell_bits)
+        return state
         
     
      # Read a parking problem from text containing a grid of tiles
@@ -87,6 +126,9 @@ class ParkingProblem(Problem[ParkingState, ParkingAction]):
         problem.slots = {position:index for index, position in slots.items()}
         problem.width = width
         problem.height = height
+        problem.topology = GridTopology(passages)
+        problem.cell_bits = max(1, (len(problem.topology.cells) - 1).bit_length())
+        problem.goal = problem.pack_positions(tuple(slots[i] for i in range(len(cars)))) if all(i in slots for i in range(len(cars))) else None
         return problem
 
     # Read a parking problem from file containing a grid of tiles
@@ -0,0 +1,162 @@
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+import heapq, json, os
+
+from parking import ParkingProblem, ParkingState
+
+# This file contains heuristics for the parking problem
+# Moving car i costs (26 - i) and every action moves exactly one car by one cell, so:
+#   - each car needs at least as many moves as its shortest distance to its slot (ignoring the other cars)
+#   - the cost of a group of cars can be computed exactly while ignoring all the cars outside the group (a pattern database)
+#     and the costs of disjoint groups can be added since no action moves cars from two groups
+
+INF = float("inf")
+
+# Returns the distances from every cell to the slot of every car where distances[i][cell] is the distance of car i
+# (the cells are identified by their ids in the problem topology)
+# The distances are computed by a BFS from each slot which ignores the cars, and they are stored in the problem cache
+def get_slot_distances(problem: ParkingProblem) -> List[array]:
+    distances = problem.cache().get("slot_distances")
+    if distances is None:
+        topology = problem.topology
+        slots = {index: position for position, index in problem.slots.items()}
+        distances = []
+        for car in range(len(problem.cars)):
+            table = array('d', [INF]) * len(topology.cells)
+            slot = slots.get(car)
+            if slot is not None:
+                start = topology.cell_ids[slot]
+                table[start] = 0
+                frontier = deque([start])
+                while frontier:
+                    cell = frontier.popleft()
+                    for neighbor in topology.neighbors[cell]:
+                        if neighbor >= 0 and table[neighbor] == INF:
+                            table[neighbor] = table[cell] + 1
+                            frontier.append(neighbor)
+            distances.append(table)
+        problem.cache()["slot_distances"] = distances
+    return distances
+
+# This heuristic is the sum of the distance of every car to its slot weighted by the cost of moving this car
+# It is consistent since an action moves one car by one cell, so it decreases the heuristic by at most the action cost
+def weighted_distance_heuristic(problem: ParkingProblem, state: ParkingState) -> float:
+    distances = get_slot_distances(problem)
+    return sum((26 - car) * distances[car][cell] for car, cell in enumerate(problem.unpack_cells(state)))
+
+# The pattern database stores, for some pairs of cars, the least cost to park both cars of the pair
+# from every pair of positions while ignoring the other cars
+# tables[k][a * len(cells) + b] is the cost where the first car of pairs[k] is at cells[a] and the second car is at cells[b]
+# The cells and the slots (the slot position of every car) are stored to check that a loaded database matches the park layout
+@dataclass
+class PatternDatabase:
+    cells: List[Tuple[int, int]]
+    slots: List[Optional[Tuple[int, int]]]
+    pairs: List[Tuple[int, int]]
+    tables: List[array]
+
+    # Returns the sum of the costs of the pairs (an admissible estimate of the cost of the parked cars in the pairs)
+    def cost(self, cell_ids: List[int]) -> float:
+        size = len(self.cells)
+        return sum(table[cell_ids[first] * size + cell_ids[second]] for (first, second), table in zip(self.pairs, self.tables))
+
+    # Write the database to a json file (infinite costs are written as null)
+    def save(self, path: str) -> None:
+        encode = lambda table: [None if cost == INF else cost for cost in table]
+        with open(path, 'w') as f:
+            json.dump({
+                "cells": self.cells,
+                "slots": self.slots,
+                "pairs": self.pairs,
+                "tables": [encode(table) for table in self.tables],
+            }, f)
+
+    # Read the database from a json file written by "save"
+    @staticmethod
+    def load(path: str) -> 'PatternDatabase':
+        decode = lambda table: array('d', (INF if cost is None else cost for cost in table))
+        with open(path, 'r') as f:
+            data = json.load(f)
+        return PatternDatabase(
+            [tuple(cell) for cell in data["cells"]],
+            [None if slot is None else tuple(slot) for slot in data["slots"]],
+            [tuple(pair) for pair in data["pairs"]],
+            [decode(table) for table in data["tables"]],
+        )
+
+# Returns the path where the pattern database of a park file is stored (next to the park file)
+def pattern_database_path(park_path: str) -> str:
+    return os.path.splitext(park_path)[0] + ".pdb.json"
+
+# Precompute the pattern database of the given pairs of cars (by default, the cars are paired in order: (0, 1), (2, 3), ...)
+# Each table is computed by a backward Dijkstra search from the parked positions of the pair
+# where the two cars move over the passages and can never be in the same cell
+def build_pattern_database(problem: ParkingProblem, pairs: Optional[List[Tuple[int, int]]] = None) -> PatternDatabase:
+    topology = problem.topology
+    size = len(topology.cells)
+    slots = {index: position for position, index in problem.slots.items()}
+    if pairs is None:
+        pairs = [(car, car + 1) for car in range(0, len(problem.cars) - 1, 2)]
+    tables = []
+    for first, second in pairs:
+        table = array('d', [INF]) * (size * size)
+        tables.append(table)
+        if first not in slots or second not in slots:
+            continue
+        start = topology.cell_ids[slots[first]] * size + topology.cell_ids[slots[second]]
+        table[start] = 0
+        frontier = [(0, start)]
+        while frontier:
+            cost, index = heapq.heappop(frontier)
+            if cost > table[index]:
+                continue
+            a, b = divmod(index, size)
+            # The moves are reversible, so the predecessors of a pair of positions are its successors
+            for car, cell, other, weight in ((first, a, b, 26 - first), (second, b, a, 26 - second)):
+                for neighbor in topology.neighbors[cell]:
+                    if neighbor < 0 or neighbor == other:
+                        continue
+                    next_index = neighbor * size + b if car == first else a * size + neighbor
+                    if cost + weight < table[next_index]:
+                        table[next_index] = cost + weight
+                        heapq.heappush(frontier, (cost + weight, next_index))
+    return PatternDatabase(_layout_cells(problem), _layout_slots(problem), [tuple(pair) for pair in pairs], tables)
+
+# Returns the positions of the cells of the problem topology as (x, y) tuples
+def _layout_cells(problem: ParkingProblem) -> List[Tuple[int, int]]:
+    return [(cell.x, cell.y) for cell in problem.topology.cells]
+
+# Returns the slot position of every car as an (x, y) tuple (or None if the car has no slot)
+def _layout_slots(problem: ParkingProblem) -> List[Optional[Tuple[int, int]]]:
+    slots = {index: (position.x, position.y) for position, index in problem.slots.items()}
+    return [slots.get(car) for car in range(len(problem.cars))]
+
+# Returns the pattern database of the problem, it is stored in the problem cache so it is computed only once
+# If a path is given, the database is loaded from it if it exists and matches the layout, otherwise it is computed and saved to it
+def get_pattern_database(problem: ParkingProblem, path: Optional[str] = None) -> PatternDatabase:
+    database = problem.cache().get("pattern_database")
+    if database is None:
+        if path is not None and os.path.exists(path):
+            database = PatternDatabase.load(path)
+            if database.cells != _layout_cells(problem) or database.slots != _layout_slots(problem):
+                database = None
+        if database is None:
+            database = build_pattern_database(problem)
+            if path is not None:
+                database.save(path)
+        problem.cache()["pattern_database"] = database
+    return database
+
+# This heuristic adds the costs of the pattern database pairs and the weighted distances of the cars outside the pairs
+# It uses the pattern database in the problem cache (or builds it with the default pairs)
+# Since the pair costs are never less than the weighted distances of their cars, it is never weaker than "weighted_distance_heuristic"
+def pattern_database_heuristic(problem: ParkingProblem, state: ParkingState) -> float:
+    database = get_pattern_database(problem)
+    distances = get_slot_distances(problem)
+    cell_ids = problem.unpack_cells(state)
+    paired = {car for pair in database.pairs for car in pair}
+    return database.cost(cell_ids) + sum(
+        (26 - car) * distances[car][cell] for car, cell in enumerate(cell_ids) if car not in paired
+    )
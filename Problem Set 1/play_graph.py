@@ -41,6 +41,19 @@ def create_agent(args: argparse.Namespace):
     if agent_type == "gbfs":
         from search import BestFirstSearch
         return InformedSearchAgent(BestFirstSearch, graphrouting_heuristic)
+    if agent_type == "ids":
+        from search import IterativeDeepeningSearch
+        return UninformedSearchAgent(IterativeDeepeningSearch)
+    if agent_type == "idastar":
+        from search import IDAStarSearch
+        return InformedSearchAgent(IDAStarSearch, graphrouting_heuristic)
+    if agent_type == "bidirectional":
+        from search import BidirectionalSearch
+        return UninformedSearchAgent(BidirectionalSearch)
+    if agent_type == "dstarlite":
+        from agents import DStarLiteAgent
+        from graph import graphrouting_distance
+        return DStarLiteAgent(graphrouting_distance)
     print(f"Requested Agent '{agent_type}' is invalid")
     exit(-1)
 
@@ -100,7 +113,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Play Graph as Human or AI")
     parser.add_argument("graph", help="path to the graph to play")
     parser.add_argument("--agent", "-a", default="human",
-                        choices=['human', 'bfs', 'dfs', 'ucs', 'astar', 'gbfs'],
+                        choices=['human', 'bfs', 'dfs', 'ucs', 'astar', 'gbfs', 'ids', 'idastar', 'bidirectional', 'dstarlite'],
                         help="the agent that will play the game")
 
     args = parser.parse_args()
@@ -3,7 +3,7 @@ from sokoban import SokobanProblem, Direction, SokobanState, SokobanTile
 from agents import HumanAgent, UninformedSearchAgent, InformedSearchAgent
 from helpers.utils import fetch_tracked_call_count
 from helpers.heuristic_checks import test_heuristic_consistency
-from functools import lru_cache
+from functools import lru_cache, partial
 import argparse, time
 
 def colored_sokoban(level: str):
@@ -53,6 +53,14 @@ def create_agent(args: argparse.Namespace):
     if agent_type == "bfs":
         from search import BreadthFirstSearch
         return UninformedSearchAgent(BreadthFirstSearch)
+    if agent_type == "ebfs":
+        from search import BreadthFirstSearch
+        # The BFS layers are stored on disk instead of memory
+        return UninformedSearchAgent(lambda problem, state: BreadthFirstSearch(problem, state, external=True))
+    if agent_type == "pbfs":
+        from parallel_search import ParallelBreadthFirstSearch
+        # Every BFS layer is expanded by a pool of worker processes
+        return UninformedSearchAgent(ParallelBreadthFirstSearch)
     if agent_type == "dfs":
         from search import DepthFirstSearch
         return UninformedSearchAgent(DepthFirstSearch)
@@ -75,6 +83,51 @@ def create_agent(args: argparse.Namespace):
         if args.checks:
             SokobanProblem.get_successor = test_heuristic_consistency(heuristic)(SokobanProblem.get_successor)
         return InformedSearchAgent(BestFirstSearch, heuristic)
+    if agent_type == "ids":
+        from search import IterativeDeepeningSearch
+        return UninformedSearchAgent(IterativeDeepeningSearch)
+    if agent_type == "idastar":
+        from search import IDAStarSearch
+        # We cache the heuristic calls since IDA* evaluates the heuristic of the same states in every iteration
+        heuristic = lru_cache(2**16)(get_heuristic(args.heuristic))
+        # If desired by the user, we track every transition and check for the heuristic consistency for each transition
+        if args.checks:
+            SokobanProblem.get_successor = test_heuristic_consistency(heuristic)(SokobanProblem.get_successor)
+        return InformedSearchAgent(IDAStarSearch, heuristic)
+    if agent_type == "hdastar":
+        from parallel_search import ParallelAStarSearch, START_METHOD
+        # The heuristic is cached in every worker process separately
+        # (a cached heuristic can not be pickled, so it is only cached if the workers are forked)
+        heuristic = get_heuristic(args.heuristic)
+        if START_METHOD == "fork":
+            heuristic = lru_cache(2**16)(heuristic)
+        return InformedSearchAgent(ParallelAStarSearch, heuristic)
+    if agent_type == "wastar":
+        from search import WeightedAStarSearch
+        heuristic = lru_cache(2**16)(get_heuristic(args.heuristic))
+        search_fn = lambda problem, state, heuristic: WeightedAStarSearch(problem, state, heuristic, args.weight)
+        return InformedSearchAgent(search_fn, heuristic)
+    if agent_type == "arastar":
+        from search import AnytimeRepairingAStarSearch
+        heuristic = lru_cache(2**16)(get_heuristic(args.heuristic))
+        # Print every solution as soon as it is found with its suboptimality bound
+        report = lambda solution, bound: print(f"Found a solution with {len(solution)} steps (at most {bound:.3f} times the optimal cost)")
+        search_fn = lambda problem, state, heuristic: AnytimeRepairingAStarSearch(
+            problem, state, heuristic, args.weight, deadline=args.deadline, on_solution=report
+        )
+        return InformedSearchAgent(search_fn, heuristic)
+    if agent_type == "portfolio":
+        from search import AStarSearch, BestFirstSearch, WeightedAStarSearch
+        from parallel_search import START_METHOD
+        from portfolio_search import portfolio_search
+        # A*, Weighted A* and Greedy Best First Search race in separate processes
+        # and the first solution found (or the best one found before the deadline) is used
+        # The strategies and the heuristic are picklable (no lambdas and no cache) unless the processes are forked
+        heuristic = get_heuristic(args.heuristic)
+        if START_METHOD == "fork":
+            heuristic = lru_cache(2**16)(heuristic)
+        weighted_astar = partial(WeightedAStarSearch, weight=args.weight)
+        return InformedSearchAgent(portfolio_search([AStarSearch, weighted_astar, BestFirstSearch], args.deadline), heuristic)
     print(f"Requested Agent '{agent_type}' is invalid")
     exit(-1)
 
@@ -83,10 +136,21 @@ def main(args: argparse.Namespace):
     if args.ansicolors: state_printer = lambda state: print(colored_sokoban(str(state)))
     start = time.time() # Track run time
     problem = SokobanProblem.from_file(args.level) # create the problem
+    # If desired by the user, the pushes that lead to a deadlock are pruned
+    if args.deadlocks:
+        from sokoban_deadlocks import enable_deadlock_pruning
+        enable_deadlock_pruning(problem)
+    # If desired by the user, the searches store fingerprints of the explored states instead of the states
+    if args.fingerprints is not None:
+        problem.fingerprint_bits = args.fingerprints
     state = problem.get_initial_state() # Get the initial state
     print("Initial State:")
     state_printer(state)
     agent = create_agent(args)
+    # If desired by the user, the search agents search the push-level problem (where every action is a push)
+    if args.pushes and not isinstance(agent, HumanAgent):
+        from sokoban import push_level_search
+        agent.search_fn = push_level_search(agent.search_fn)
     step = 0 # This will store the current step
     total_explored_nodes = 0 # This will store the number of traversed nodes during search
     unsolvable = False # This will store whether the problem is unsolvable or not
@@ -126,13 +190,23 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Play Sokoban as Human or AI")
     parser.add_argument("level", help="path to the sokoban level to play")
     parser.add_argument("--agent", "-a", default="human",
-                        choices=['human', 'bfs', 'dfs', 'ucs', 'astar', 'gbfs'],
+                        choices=['human', 'bfs', 'ebfs', 'pbfs', 'dfs', 'ucs', 'astar', 'gbfs', 'ids', 'idastar', 'hdastar', 'wastar', 'arastar', 'portfolio'],
                         help="the agent that will play the game")
     parser.add_argument("--heuristic", '-hf', default="zero",
                         choices=["zero", "weak", "strong"],
                         help="choose the heuristic to use with A* or Greedy Best First Search")
+    parser.add_argument("--fingerprints", "-fp", type=int, default=None,
+                        help="store fingerprints with this number of bits of the explored states instead of the states (saves memory)")
+    parser.add_argument("--weight", "-w", type=float, default=2,
+                        help="the heuristic weight of Weighted A* (and the initial weight of ARA*)")
+    parser.add_argument("--deadline", "-dt", type=float, default=None,
+                        help="the time limit in seconds of ARA* and of the portfolio (the best solution found in time is used)")
     parser.add_argument("--checks", "-c", action='store_true', default=False,
                         help="Enable consistency checks for the heuristic")
+    parser.add_argument("--deadlocks", "-dl", action='store_true', default=False,
+                        help="Prune the pushes that lead to a deadlock")
+    parser.add_argument("--pushes", "-p", action='store_true', default=False,
+                        help="Search over pushes instead of single steps (minimizes the number of pushes)")
     parser.add_argument("--ansicolors", "-ac", action="store_true",
                         help="Print the level on the console with ANSI colors (only works on some terminals)")
 
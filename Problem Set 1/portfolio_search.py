@@ -0,0 +1,114 @@
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+import pickle, queue, time, traceback
+
+from parallel_search import check_picklable, get_context
+from problem import Problem, S, A, Solution
+
+# This file implements a portfolio solver which runs several search strategies on the same problem at the same time
+# Every strategy is a search function that runs in its own process and receives the problem, the initial state
+# and the extra arguments given to the portfolio (e.g. the heuristic of an informed search agent)
+# so the strategies of an informed portfolio have the same signature as "AStarSearch" and "BestFirstSearch"
+# (a strategy with a fixed heuristic can be written as: lambda problem, state, _: AStarSearch(problem, state, strong_heuristic))
+#
+# Without a deadline, the first solution found is returned
+# With a deadline (in seconds), the least cost solution found before the deadline is returned
+# (if no strategy finished before the deadline, the first solution found after it is returned)
+# Once the result is decided, the strategies that are still running are terminated
+# If a strategy raises an exception, the exception is raised again by the portfolio (with the traceback of the strategy as a note),
+# and a strategy whose process dies without a result (e.g. it was killed) counts as a strategy that found no solution
+#
+# The solutions must be picklable, and the processes are forked where it is possible so the problem, the strategies
+# and the arguments are not pickled (where they are spawned, e.g. on Windows, they must be picklable too, see "START_METHOD")
+
+# A search strategy receives the problem, the initial state and the arguments of the portfolio
+Strategy = Callable[..., Solution]
+
+# The number of seconds to wait for a result before checking whether the strategy processes are still alive
+POLL_INTERVAL = 0.5
+
+def PortfolioSearch(
+    problem: Problem[S, A],
+    initial_state: S,
+    strategies: Sequence[Strategy],
+    args: Tuple = (),
+    deadline: Optional[float] = None,
+) -> Solution:
+    context = get_context()
+    check_picklable(context, "problem, the strategies and their arguments", problem, initial_state, strategies, args)
+    results = context.Queue()
+    processes = [
+        context.Process(target=_run_strategy, args=(index, strategy, problem, initial_state, args, results), daemon=True)
+        for index, strategy in enumerate(strategies)
+    ]
+    end_time = None if deadline is None else time.time() + deadline
+    for process in processes:
+        process.start()
+    try:
+        best_cost, best_solution = float("inf"), None
+        # The indices of the strategies that returned or died
+        finished = set()
+        while len(finished) < len(processes):
+            # After the deadline (or without a deadline), stop waiting once a solution is found
+            if best_solution is not None and (end_time is None or time.time() >= end_time):
+                break
+            timeout = POLL_INTERVAL
+            if best_solution is not None and end_time is not None:
+                timeout = min(timeout, max(0, end_time - time.time()))
+            try:
+                index, solution, error = results.get(timeout=timeout)
+            except queue.Empty:
+                # A process that exited has already sent its result (if it has one), so the dead processes (found before
+                # checking the queue) can only be counted as finished if their results are not waiting in the queue
+                dead = [index for index, process in enumerate(processes) if not process.is_alive()]
+                if results.empty():
+                    finished.update(dead)
+                continue
+            finished.add(index)
+            if error is not None:
+                error, strategy_traceback = error
+                error.add_note(f"Raised by the portfolio strategy {index}:\n{strategy_traceback}")
+                raise error
+            # A strategy that found no solution does not decide the result (another strategy may be incomplete)
+            if solution is None:
+                continue
+            cost = solution_cost(problem, initial_state, solution)
+            if cost < best_cost:
+                best_cost, best_solution = cost, solution
+        return best_solution
+    finally:
+        # Terminate the strategies that are still running
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+
+# Create a search function that runs the portfolio of strategies, so it can be used as the "search_fn" of a search agent
+# The arguments after the initial state (e.g. the heuristic) are passed to every strategy
+def portfolio_search(strategies: Sequence[Strategy], deadline: Optional[float] = None) -> Strategy:
+    def search(problem: Problem[S, A], initial_state: S, *args: Any) -> Solution:
+        return PortfolioSearch(problem, initial_state, strategies, args, deadline)
+    return search
+
+# Returns the path cost of a solution that starts from the initial state
+def solution_cost(problem: Problem[S, A], initial_state: S, solution: List[A]) -> float:
+    state, cost = initial_state, 0
+    for action in solution:
+        cost += problem.get_cost(state, action)
+        state = problem.get_successor(state, action)
+    return cost
+
+# Run a strategy in a worker process and send (index, solution, error) to the main process
+# where error is None if the strategy returned, otherwise it is the exception and the traceback of the strategy
+# (an exception that can not be pickled is replaced by a RuntimeError with the same message)
+def _run_strategy(index: int, strategy: Strategy, problem: Problem, initial_state: Any, args: Tuple, results: Any) -> None:
+    try:
+        solution = strategy(problem, initial_state, *args)
+    except Exception as error:
+        try:
+            pickle.dumps(error)
+        except Exception:
+            error = RuntimeError(repr(error))
+        results.put((index, None, (error, traceback.format_exc())))
+        return
+    results.put((index, solution, None))
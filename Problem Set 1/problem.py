@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import Callable, Generic, Iterable, List, TypeVar, Union
+from typing import Callable, Generic, Iterable, List, Optional, Tuple, TypeVar, Union
 from helpers.utils import CacheContainer, with_cache
 
 # S and A are used for generic typing where S represents the state type and A represents the action type
@@ -10,6 +10,16 @@ A = TypeVar("A")
 # It also implements 'CacheContainer' which allows you to call the "cache" method
 # which returns a dictionary in which you can store any data you want to cache
 class Problem(ABC, Generic[S, A], CacheContainer):
+    # Problems whose action costs are always small integers should set this to True
+    # so that the search functions can use a bucket queue instead of a binary heap as their frontier
+    integer_costs: bool = False
+    # Problems with too many states to keep them all in the explored sets can set this to a fingerprint width (in bits)
+    # so that the graph searches store a fingerprint of every explored state instead (see "FingerprintSet" in "search_utils.py")
+    fingerprint_bits: Optional[int] = None
+    # Problems where every action can be undone by another action (so the state space is an undirected graph) should set this to True
+    # so that the layered searches only need to compare the new states with the last two layers to detect duplicates
+    reversible: bool = False
+
     # This function returns the initial state
     @abstractmethod
     def get_initial_state(self) -> S:
@@ -34,6 +44,27 @@ class Problem(ABC, Generic[S, A], CacheContainer):
     def get_cost(self, state: S, action: A) -> float:
         return 1.0
 
+    # These functions convert a state to bytes and back, they are needed by the searches that store the states on disk
+    # The encoding must be canonical: equal states must be encoded to equal bytes
+    def encode_state(self, state: S) -> bytes:
+        raise NotImplementedError(f"{type(self).__name__} does not support encoding its states")
+
+    def decode_state(self, data: bytes) -> S:
+        raise NotImplementedError(f"{type(self).__name__} does not support decoding its states")
+
+# BidirectionalProblem is an abstract class for search problems with a single explicit goal state
+# whose transitions can be traversed backwards, which allows searching from both the initial state and the goal
+class BidirectionalProblem(Problem[S, A]):
+    # This function returns the goal state
+    @abstractmethod
+    def get_goal_state(self) -> S:
+        pass
+
+    # This function returns the pairs (previous state, action) where applying the action to the previous state leads to the given state
+    @abstractmethod
+    def get_predecessors(self, state: S) -> Iterable[Tuple[S, A]]:
+        pass
+
 # These are type aliases for:
 # A solution which is a list of actions (or None if no solution is found)
 Solution = Union[List[A], None]
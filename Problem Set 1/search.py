@@ -1,10 +1,12 @@
-from problem import HeuristicFunction, Problem, S, A, Solution
+from problem import BidirectionalProblem, HeuristicFunction, Problem, S, A, Solution
+from typing import Callable, Iterator, List, Optional, Tuple
 from collections import deque
+import itertools, time
 from helpers.utils import NotImplemented
+from search_utils import SearchTree, make_explored_set, make_priority_queue
+from external_search import ExternalBreadthFirstSearch
 
 # TODO: Import any modules you want to use
-import heapq
-import itertools
 
 # All search functions take a problem and a state
 # If it is an informed search function, it will also receive a heuristic function
@@ -15,20 +17,26 @@ import itertools
 # 2. None if there is no solution
 
 
-def BreadthFirstSearch(problem: Problem[S, A], initial_state: S) -> Solution:
+def BreadthFirstSearch(problem: Problem[S, A], initial_state: S, external: bool = False) -> Solution:
     # TODO: ADD YOUR CODE HERE
+    # In the external-memory mode, the frontier and the explored states are stored on disk (see "external_search.py")
+    if external:
+        return ExternalBreadthFirstSearch(problem, initial_state)
+
     # BFS checks whether a node is goal BEFORE inserting it into the frontier
     if problem.is_goal(initial_state):
         return []
 
-    # FIFO queue storing tuples of (state, path)
-    frontier = deque([(initial_state, [])])
+    # the search tree stores the parent and the action of every generated node
+    tree = SearchTree()
+    # FIFO queue storing tuples of (state, node index in the search tree)
+    frontier = deque([(initial_state, SearchTree.ROOT)])
     # set of nodes in frontier for faster search for a specific node
     frontier_states = {initial_state}
-    explored = set()
+    explored = make_explored_set(problem)
 
     while frontier:
-        state, path = frontier.popleft()
+        state, node = frontier.popleft()
         explored.add(state)
 
         for action in problem.get_actions(state):
@@ -38,13 +46,13 @@ def BreadthFirstSearch(problem: Problem[S, A], initial_state: S) -> Solution:
             if next_state in explored or next_state in frontier_states:
                 continue
 
-            new_path = path + [action]
+            next_node = tree.add(node, action)
             # check if the state is goal state before adding it to the frontier
             if problem.is_goal(next_state):
-                return new_path
+                return tree.path(next_node)
 
             # add it to the frontier
-            frontier.append((next_state, new_path))
+            frontier.append((next_state, next_node))
             frontier_states.add(next_state)
 
     # frontier is empty and no goal is found
@@ -82,16 +90,17 @@ def BreadthFirstSearch(problem: Problem[S, A], initial_state: S) -> Solution:
 def DepthFirstSearch(problem: Problem[S, A], initial_state: S) -> Solution:
     # TODO: ADD YOUR CODE HERE
 
-    frontier = deque([(initial_state, [])])
+    tree = SearchTree()
+    frontier = deque([(initial_state, SearchTree.ROOT)])
     # set of nodes in frontier for faster search for a specific node
     frontier_states = {initial_state}
-    explored = set()
+    explored = make_explored_set(problem)
 
     while frontier:
-        state, path = frontier.pop()
+        state, node = frontier.pop()
 
         if problem.is_goal(state):
-            return path
+            return tree.path(node)
 
         explored.add(state)
 
@@ -103,10 +112,8 @@ def DepthFirstSearch(problem: Problem[S, A], initial_state: S) -> Solution:
             if next_state in explored or next_state in frontier_states:
                 continue
 
-            new_path = path + [action]
-
             # add it to the frontier
-            frontier.append((next_state, new_path))
+            frontier.append((next_state, tree.add(node, action)))
             frontier_states.add(next_state)
 
     # frontier is empty and no goal is found
@@ -116,47 +123,39 @@ def DepthFirstSearch(problem: Problem[S, A], initial_state: S) -> Solution:
 def UniformCostSearch(problem: Problem[S, A], initial_state: S) -> Solution:
     # TODO: ADD YOUR CODE HERE
 
-    # for FIFO behavior on a cost tie
-    counter = itertools.count()
-    # frontier is a priority queue of action costs
-    frontier = []
-    # frontier is a heap of tubles (cost, tie_resolver, state, path)
-    # sorted with the cost, if there's a tie sort with the counter which follows FIFO behavior
-    heapq.heappush(frontier, (0, next(counter), initial_state, []))
-
-    # dictionary of path costs from initial state to any node --> updated when the node is inserted to the frontier AKA if the state exists as a key then it's already in the frontier
-    cost_so_far = {initial_state: 0}
-    explored = set()
+    # frontier is a priority queue of path costs which maps every state to (cost, node)
+    # (a bucket queue if the problem has integer costs, otherwise an indexed binary heap)
+    # sorted with the cost, if there's a tie it follows FIFO behavior
+    # every state has at most one entry, so a cheaper route to a state replaces the old one (decrease-key)
+    frontier = make_priority_queue(problem)
+    # the search tree stores the parent, the action and the path cost of every generated node
+    tree = SearchTree()
+    frontier.push(initial_state, 0, SearchTree.ROOT)
+    explored = make_explored_set(problem)
 
     # goal-test is done when the node is expanded
     while frontier:
-        cost, _, state, path = heapq.heappop(frontier)
-
-        # skip if a newer version with less cost was found -> avoid deletion from the heap
-        if cost > cost_so_far[state]:
-            continue
+        state, cost, node = frontier.pop()
 
         # if it's the goal, return the path to this node
         if problem.is_goal(state):
-            return path
+            return tree.path(node)
 
         explored.add(state)
 
         # expand the node
         for action in problem.get_actions(state):
             next_state = problem.get_successor(state, action)
-            new_cost = cost + problem.get_cost(state, action)
 
             # if the node is already explored -> neglect it
             if next_state in explored:
                 continue
+            new_cost = cost + problem.get_cost(state, action)
             # if the node was already in the frontier, replace it with the new node if its cost < old node
             # Only push if it's new or cheaper than before
-            if next_state not in cost_so_far or new_cost < cost_so_far[next_state]:
-                cost_so_far[next_state] = new_cost
-                heapq.heappush(
-                    frontier, (new_cost, next(counter), next_state, path + [action])
-                )
+            if next_state not in frontier or new_cost < frontier.priority(next_state):
+                next_node = tree.add(node, action, new_cost)
+                frontier.push(next_state, new_cost, next_node)
 
     # frontier is empty and no solution is found
     return None
@@ -166,25 +165,23 @@ def AStarSearch(
     problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction
 ) -> Solution:
     # TODO: ADD YOUR CODE HERE
-    # for FIFO behavior on a cost tie
-    counter = itertools.count()
     # maintian a priority queue based on total cost = total backward cost + node's heuristic
-    frontier = []
-    explored = set()
-    total_costs = {initial_state: heuristic(problem, initial_state)}
+    # ties are resolved in FIFO order and every state has at most one entry in the frontier
+    frontier = make_priority_queue(problem)
+    explored = make_explored_set(problem)
+    # the search tree stores the parent, the action and the total backward cost of every generated node
+    tree = SearchTree()
     # insert initial state goal into the frontier
-    # heap_item = (total_cost, counter, total_backward_cost, state, path)
-    heapq.heappush(
-        frontier,
-        (heuristic(problem, initial_state), next(counter), 0, initial_state, []),
-    )
+    # frontier item = state -> (total_cost, node)
+    frontier.push(initial_state, heuristic(problem, initial_state), SearchTree.ROOT)
     # loop until the frontier is empty
     while frontier:
         # pop from the frontier
-        _, _, total_backward_cost, state, path = heapq.heappop(frontier)
+        state, _, node = frontier.pop()
+        total_backward_cost = tree.cost(node)
         # if the node is goal, return the solution
         if problem.is_goal(state):
-            return path
+            return tree.path(node)
         # add it to explored set
         explored.add(state)
         # expand it
@@ -195,27 +192,20 @@ def AStarSearch(
             # if the node is already explored, neglect it
             if next_state in explored:
                 continue
+            # if the heuristic is infinite, the goal can never be reached from the node (e.g. a deadlock), so neglect it
+            next_state_heuristic = heuristic(problem, next_state)
+            if next_state_heuristic == float("inf"):
+                continue
             # compute the node's total cost
-            next_state_total_cost = (
-                total_backward_cost + new_cost + heuristic(problem, next_state)
-            )
+            next_state_total_cost = total_backward_cost + new_cost + next_state_heuristic
             # if the node is already in the frontier with higher cost, replace it with the the new one
             if (
-                next_state not in total_costs
-                or total_costs[next_state] > next_state_total_cost
+                next_state not in frontier
+                or frontier.priority(next_state) > next_state_total_cost
             ):
-                total_costs[next_state] = next_state_total_cost
                 # add it to the frontier
-                heapq.heappush(
-                    frontier,
-                    (
-                        next_state_total_cost,
-                        next(counter),
-                        total_backward_cost + new_cost,
-                        next_state,
-                        path + [action],
-                    ),
-                )
+                next_node = tree.add(node, action, total_backward_cost + new_cost)
+                frontier.push(next_state, next_state_total_cost, next_node)
     # frontier is empty and no solution is found
     return None
 
@@ -224,52 +214,421 @@ def BestFirstSearch(
     problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction
 ) -> Solution:
     # TODO: ADD YOUR CODE HERE
-    # for FIFO behavior on a cost tie
-    counter = itertools.count()
     # maintian a priority queue based on node's heuristic
-    frontier = []
-    explored = set()
-    heuristics = {initial_state: heuristic(problem, initial_state)}
+    # ties are resolved in FIFO order and every state has at most one entry in the frontier
+    frontier = make_priority_queue(problem)
+    explored = make_explored_set(problem)
+    # the search tree stores the parent and the action of every generated node
+    tree = SearchTree()
     # insert initial state goal into the frontier
-    # heap_item = (heuristic, counter, state, path)
-    heapq.heappush(
-        frontier,
-        (heuristic(problem, initial_state), next(counter), initial_state, []),
-    )
+    # frontier item = state -> (heuristic, node)
+    frontier.push(initial_state, heuristic(problem, initial_state), SearchTree.ROOT)
     # loop until the frontier is empty
     while frontier:
         # pop from the frontier
-        _, _, state, path = heapq.heappop(frontier)
+        state, _, node = frontier.pop()
         # if the node is goal, return the solution
         if problem.is_goal(state):
-            return path
+            return tree.path(node)
         # add it to explored set
         explored.add(state)
         # expand it
         for action in problem.get_actions(state):
             next_state = problem.get_successor(state, action)
-            new_cost = problem.get_cost(state, action)
 
             # if the node is already explored, neglect it
             if next_state in explored:
                 continue
-            # compute the node's total cost
+            # compute the node's heuristic
             next_state_heuristic = heuristic(problem, next_state)
-            # if the node is already in the frontier with higher cost, replace it with the the new one
+            # if the heuristic is infinite, the goal can never be reached from the node (e.g. a deadlock), so neglect it
+            if next_state_heuristic == float("inf"):
+                continue
+            # if the node is already in the frontier with higher heuristic, replace it with the the new one
             if (
-                next_state not in heuristics
-                or heuristics[next_state] > next_state_heuristic
+                next_state not in frontier
+                or frontier.priority(next_state) > next_state_heuristic
             ):
-                heuristics[next_state] = next_state_heuristic
                 # add it to the frontier
-                heapq.heappush(
-                    frontier,
-                    (
-                        next_state_heuristic,
-                        next(counter),
-                        next_state,
-                        path + [action],
-                    ),
-                )
+                frontier.push(next_state, next_state_heuristic, tree.add(node, action))
     # frontier is empty and no solution is found
     return None
+
+# Weighted A* orders the frontier by the backward cost + weight * heuristic
+# With an admissible heuristic, the returned path costs at most "weight" times the optimal cost
+# (a larger weight trusts the heuristic more, so it usually expands fewer nodes and finds a worse path)
+def WeightedAStarSearch(
+    problem: Problem[S, A], initial_state: S, heuristic: HeuristicFunction, weight: float = 2
+) -> Solution:
+    # the frontier maps every state to (weighted total cost, node) and ties are resolved in FIFO order
+    frontier = make_priority_queue(problem)
+    explored = make_explored_set(problem)
+    # the search tree stores the parent, the action and the total backward cost of every generated node
+    tree = SearchTree()
+    frontier.push(initial_state, weight * heuristic(problem, initial_state), SearchTree.ROOT)
+    while frontier:
+        state, _, node = frontier.pop()
+        total_backward_cost = tree.cost(node)
+        if problem.is_goal(state):
+            return tree.path(node)
+        explored.add(state)
+        for action in problem.get_actions(state):
+            next_state = problem.get_successor(state, action)
+            # if the node is already explored, neglect it (the explored nodes are never reopened)
+            if next_state in explored:
+                continue
+            # if the heuristic is infinite, the goal can never be reached from the node (e.g. a deadlock), so neglect it
+            next_state_heuristic = heuristic(problem, next_state)
+            if next_state_heuristic == float("inf"):
+                continue
+            next_state_cost = total_backward_cost + problem.get_cost(state, action)
+            next_state_total_cost = next_state_cost + weight * next_state_heuristic
+            # if the node is already in the frontier with higher cost, replace it with the the new one
+            if next_state not in frontier or frontier.priority(next_state) > next_state_total_cost:
+                frontier.push(next_state, next_state_total_cost, tree.add(node, action, next_state_cost))
+    # frontier is empty and no solution is found
+    return None
+
+
+# Anytime Repairing A* (ARA*) runs a series of weighted A* searches with a decreasing weight
+# Every search reuses the costs found by the previous ones: it only reopens the nodes whose cost improved (the inconsistent nodes)
+# After every search, it yields the best solution found so far and its suboptimality bound
+# (the solution costs at most "bound" times the optimal cost), so the caller can stop whenever the solution is good enough
+# The last search has a weight of 1, so once the generator is exhausted, the last yielded solution is optimal
+# (if the heuristic is admissible). If a deadline (in seconds) is given, the generator stops when it is reached
+def AnytimeRepairingAStar(
+    problem: Problem[S, A],
+    initial_state: S,
+    heuristic: HeuristicFunction,
+    weight: float = 3,
+    decrement: float = 0.5,
+    deadline: Optional[float] = None,
+) -> Iterator[Tuple[List[A], float]]:
+    end_time = None if deadline is None else time.time() + deadline
+    tree = SearchTree()
+    # the best known backward cost, the search tree node and the heuristic of every generated state
+    costs = {initial_state: 0}
+    nodes = {initial_state: SearchTree.ROOT}
+    heuristics = {initial_state: heuristic(problem, initial_state)}
+    if heuristics[initial_state] == float("inf"):
+        return
+    # the cost and the tree node of the best goal found so far
+    best_cost, best_node = float("inf"), None
+    if problem.is_goal(initial_state):
+        best_cost, best_node = 0, SearchTree.ROOT
+    frontier = make_priority_queue(problem)
+    frontier.push(initial_state, weight * heuristics[initial_state], SearchTree.ROOT)
+    # the inconsistent nodes are the explored nodes whose cost improved during the current search
+    inconsistent = set()
+    published_cost, published_bound = float("inf"), float("inf")
+
+    while True:
+        # improve the path: run weighted A* until no node in the frontier can lead to a better solution (for this weight)
+        explored = set()
+        while frontier and frontier.peek()[1] < best_cost:
+            if end_time is not None and time.time() >= end_time:
+                return
+            state, _, node = frontier.pop()
+            explored.add(state)
+            cost = costs[state]
+            for action in problem.get_actions(state):
+                next_state = problem.get_successor(state, action)
+                next_cost = cost + problem.get_cost(state, action)
+                if next_cost >= costs.get(next_state, float("inf")):
+                    continue
+                next_state_heuristic = heuristics.get(next_state)
+                if next_state_heuristic is None:
+                    next_state_heuristic = heuristics[next_state] = heuristic(problem, next_state)
+                # if the heuristic is infinite, the goal can never be reached from the node (e.g. a deadlock), so neglect it
+                if next_state_heuristic == float("inf"):
+                    continue
+                costs[next_state] = next_cost
+                next_node = nodes[next_state] = tree.add(node, action, next_cost)
+                if problem.is_goal(next_state) and next_cost < best_cost:
+                    best_cost, best_node = next_cost, next_node
+                # an explored node is not reopened in the current search, it will be reopened by the next one
+                if next_state in explored:
+                    inconsistent.add(next_state)
+                else:
+                    frontier.push(next_state, next_cost + weight * next_state_heuristic, next_node)
+
+        if best_node is None:
+            # the frontier is empty and no solution is found
+            return
+        # the optimal cost is at least the least unweighted total cost among the frontier and the inconsistent nodes
+        lower_bound = min(
+            (costs[state] + heuristics[state] for state in itertools.chain(frontier, inconsistent)),
+            default=best_cost,
+        )
+        if best_cost <= lower_bound:
+            bound = 1
+        else:
+            bound = min(weight, best_cost / lower_bound) if lower_bound > 0 else weight
+        if best_cost < published_cost or bound < published_bound:
+            published_cost, published_bound = best_cost, bound
+            yield tree.path(best_node), bound
+        if weight <= 1 or bound <= 1:
+            return
+
+        # decrease the weight and rebuild the frontier from the frontier and the inconsistent nodes with the new weight
+        weight = max(1, weight - decrement)
+        states = itertools.chain(list(frontier), inconsistent)
+        frontier = make_priority_queue(problem)
+        for state in states:
+            frontier.push(state, costs[state] + weight * heuristics[state], nodes[state])
+        inconsistent = set()
+
+
+# Run ARA* and return the best solution found (the optimal one if it finished before the deadline)
+# If on_solution is given, it is called with every solution and its suboptimality bound as soon as they are found
+def AnytimeRepairingAStarSearch(
+    problem: Problem[S, A],
+    initial_state: S,
+    heuristic: HeuristicFunction,
+    weight: float = 3,
+    decrement: float = 0.5,
+    deadline: Optional[float] = None,
+    on_solution: Optional[Callable[[List[A], float], None]] = None,
+) -> Solution:
+    solution = None
+    for solution, bound in AnytimeRepairingAStar(problem, initial_state, heuristic, weight, decrement, deadline):
+        if on_solution is not None:
+            on_solution(solution, bound)
+    return solution
+
+
+# The following searches are memory-bounded: they only store the current path (and the untried actions along it)
+# so they run in O(depth) memory instead of keeping the explored set and the frontier of the whole search
+# If prune_cycles is True, a successor that is already on the current path is skipped (transposition pruning along the path)
+
+
+def IterativeDeepeningSearch(
+    problem: Problem[S, A], initial_state: S, prune_cycles: bool = True
+) -> Solution:
+    # run a depth-limited DFS with an increasing depth limit until a goal is found
+    # if no node was cut off by the depth limit, the whole reachable space was searched and there is no solution
+    limit = 0
+    while True:
+        solution, cutoff = _bounded_depth_first_search(
+            problem, initial_state, lambda depth, state, cost: depth > limit, prune_cycles
+        )
+        if solution is not None:
+            return solution
+        if not cutoff:
+            return None
+        limit += 1
+
+
+def IDAStarSearch(
+    problem: Problem[S, A],
+    initial_state: S,
+    heuristic: HeuristicFunction,
+    prune_cycles: bool = True,
+) -> Solution:
+    # run a depth-first search where a node is cut off if its total cost (backward cost + heuristic) exceeds the bound
+    # the next bound is the least total cost among the nodes that were cut off
+    # with an admissible heuristic, the first solution found is optimal
+    bound = heuristic(problem, initial_state)
+    while bound != float("inf"):
+        next_bound = float("inf")
+
+        def is_cutoff(depth: int, state: S, cost: float) -> bool:
+            nonlocal next_bound
+            total_cost = cost + heuristic(problem, state)
+            if total_cost > bound:
+                next_bound = min(next_bound, total_cost)
+                return True
+            return False
+
+        solution, _ = _bounded_depth_first_search(
+            problem, initial_state, is_cutoff, prune_cycles
+        )
+        if solution is not None:
+            return solution
+        bound = next_bound
+    # every node was cut off with an infinite total cost so no goal is reachable
+    return None
+
+
+# A depth-first search which does not expand the nodes for which is_cutoff(depth, state, backward cost) is True
+# The goal test is done when the node is generated, after the cutoff test (so a goal beyond the bound is cut off, not returned)
+# except for the initial state which is tested before it
+# It returns the solution (or None) and whether any node was cut off
+def _bounded_depth_first_search(
+    problem: Problem[S, A],
+    initial_state: S,
+    is_cutoff: Callable[[int, S, float], bool],
+    prune_cycles: bool,
+) -> Tuple[Solution, bool]:
+    if problem.is_goal(initial_state):
+        return [], False
+    if is_cutoff(0, initial_state, 0):
+        return None, True
+    cutoff = False
+    # the current path is stored as parallel stacks of states, backward costs, actions and the iterators over the untried actions
+    states, costs, path = [initial_state], [0], []
+    untried = [iter(problem.get_actions(initial_state))]
+    on_path = {initial_state}
+    while untried:
+        action = next(untried[-1], None)
+        # all the actions of the deepest node were tried, so we backtrack
+        if action is None:
+            untried.pop()
+            costs.pop()
+            on_path.discard(states.pop())
+            if path:
+                path.pop()
+            continue
+        state = states[-1]
+        next_state = problem.get_successor(state, action)
+        # if the node is already on the current path --> neglect it
+        if prune_cycles and next_state in on_path:
+            continue
+        next_cost = costs[-1] + problem.get_cost(state, action)
+        if is_cutoff(len(path) + 1, next_state, next_cost):
+            cutoff = True
+            continue
+        if problem.is_goal(next_state):
+            return path + [action], cutoff
+        # go deeper
+        path.append(action)
+        states.append(next_state)
+        costs.append(next_cost)
+        if prune_cycles:
+            on_path.add(next_state)
+        untried.append(iter(problem.get_actions(next_state)))
+    return None, cutoff
+
+
+# Frontier breadth first search keeps only three layers of states: the previous, the current and the next layer
+# If every action can be undone (problem.reversible), a successor of the current layer can only be in one of these layers,
+# so they are enough to detect all the duplicates and the older layers are released
+# Since the search tree is not kept, the path is reconstructed by divide and conquer: once the goal is found at depth d,
+# the search is repeated while every state carries its ancestor at depth d/2 (the relay state), which splits the problem into
+# finding the path from the initial state to the relay state and the path from the relay state to the goal
+# If the problem is not reversible, the states may be visited again at a later depth, so a max_depth must be given to bound the search
+def FrontierBreadthFirstSearch(
+    problem: Problem[S, A], initial_state: S, max_depth: Optional[int] = None
+) -> Solution:
+    if not problem.reversible and max_depth is None:
+        raise ValueError("Frontier BFS needs a reversible problem or a max_depth")
+    # BFS checks whether a node is goal BEFORE inserting it into the frontier
+    if problem.is_goal(initial_state):
+        return []
+    found = _layered_search(problem, initial_state, problem.is_goal, max_depth)
+    if found is None:
+        return None
+    goal_state, _, depth = found
+    return _reconstruct_path(problem, initial_state, goal_state, depth)
+
+
+# Returns the actions of a shortest path from the start to the target, where depth is the length of the shortest path
+def _reconstruct_path(problem: Problem[S, A], start: S, target: S, depth: int) -> List[A]:
+    if depth == 0:
+        return []
+    if depth == 1:
+        return [next(action for action in problem.get_actions(start) if problem.get_successor(start, action) == target)]
+    # the relay state is on a shortest path, so it is at distance (depth - relay_depth) from the target
+    relay_depth = depth // 2
+    _, relay_state, _ = _layered_search(problem, start, lambda state: state == target, depth, relay_depth)
+    return _reconstruct_path(problem, start, relay_state, relay_depth) + _reconstruct_path(
+        problem, relay_state, target, depth - relay_depth
+    )
+
+
+# A breadth first search which keeps the previous, the current and the next layers only
+# Every layer maps its states to their ancestors at the relay depth (or None if the state is not deeper than the relay depth)
+# It returns the first generated state that satisfies is_target, its relay state and its depth (or None if none is found)
+def _layered_search(
+    problem: Problem[S, A],
+    start: S,
+    is_target: Callable[[S], bool],
+    max_depth: Optional[int],
+    relay_depth: Optional[int] = None,
+) -> Optional[Tuple[S, Optional[S], int]]:
+    previous_layer, current_layer = {}, {start: None}
+    depth = 0
+    while current_layer and (max_depth is None or depth < max_depth):
+        next_layer = {}
+        for state, relay_state in current_layer.items():
+            for action in problem.get_actions(state):
+                next_state = problem.get_successor(state, action)
+                # if the node is already in one of the layers --> neglect it
+                if next_state in previous_layer or next_state in current_layer or next_state in next_layer:
+                    continue
+                next_relay_state = next_state if depth + 1 == relay_depth else relay_state
+                if is_target(next_state):
+                    return next_state, next_relay_state, depth + 1
+                next_layer[next_state] = next_relay_state
+        # the previous layer is released and the layers move forward
+        previous_layer, current_layer = current_layer, next_layer
+        depth += 1
+    return None
+
+
+# Bidirectional uniform cost search (bidirectional Dijkstra) runs a forward search from the initial state
+# and a backward search from the goal state (using the predecessors of each state) until they meet in the middle
+# It stops once the sum of the least costs in both frontiers is not less than the cost of the best path found so far,
+# so the returned path is optimal
+def BidirectionalSearch(problem: BidirectionalProblem[S, A], initial_state: S) -> Solution:
+    goal_state = problem.get_goal_state()
+    if problem.is_goal(initial_state):
+        return []
+
+    # For each direction, we maintain a frontier, a search tree, the best known cost and the tree node of every reached state
+    # and the set of explored states
+    # The backward tree stores for each state the action that leads from it towards the goal
+    frontiers = (make_priority_queue(problem), make_priority_queue(problem))
+    trees = (SearchTree(), SearchTree())
+    costs = ({initial_state: 0}, {goal_state: 0})
+    nodes = ({initial_state: SearchTree.ROOT}, {goal_state: SearchTree.ROOT})
+    explored = (make_explored_set(problem), make_explored_set(problem))
+    frontiers[0].push(initial_state, 0, SearchTree.ROOT)
+    frontiers[1].push(goal_state, 0, SearchTree.ROOT)
+
+    # the cost of the best path found so far and the state where the two searches meet on it
+    best_cost, meeting_state = float("inf"), None
+
+    while frontiers[0] and frontiers[1]:
+        # stopping rule: no path through the unexplored states can be cheaper than the best one
+        if frontiers[0].peek()[1] + frontiers[1].peek()[1] >= best_cost:
+            break
+        # expand the direction with the smaller frontier
+        direction = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+        frontier, tree = frontiers[direction], trees[direction]
+        cost_so_far, tree_nodes = costs[direction], nodes[direction]
+        other_costs = costs[1 - direction]
+        state, cost, node = frontier.pop()
+        explored[direction].add(state)
+
+        if direction == 0:
+            transitions = (
+                (action, problem.get_successor(state, action), problem.get_cost(state, action))
+                for action in problem.get_actions(state)
+            )
+        else:
+            transitions = (
+                (action, previous, problem.get_cost(previous, action))
+                for previous, action in problem.get_predecessors(state)
+            )
+
+        for action, next_state, action_cost in transitions:
+            if next_state in explored[direction]:
+                continue
+            new_cost = cost + action_cost
+            if next_state not in frontier or new_cost < frontier.priority(next_state):
+                next_node = tree.add(node, action, new_cost)
+                frontier.push(next_state, new_cost, next_node)
+                cost_so_far[next_state] = new_cost
+                tree_nodes[next_state] = next_node
+                # check if this creates a cheaper path from the initial state to the goal
+                if next_state in other_costs and new_cost + other_costs[next_state] < best_cost:
+                    best_cost, meeting_state = new_cost + other_costs[next_state], next_state
+
+    if meeting_state is None:
+        return None
+    # join the forward path to the meeting state with the reversed backward path from it
+    forward_path = trees[0].path(nodes[0][meeting_state])
+    backward_path = trees[1].path(nodes[1][meeting_state])
+    backward_path.reverse()
+    return forward_path + backward_path
@@ -0,0 +1,664 @@
+from contextlib import contextmanager
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import argparse, glob, itertools, math, os, tempfile, time
+
+from mathutils import Direction, Point
+from problem import Problem, Solution
+from agents import DStarLiteAgent
+from external_search import ExternalBreadthFirstSearch
+from parallel_search import ParallelAStarSearch, ParallelBreadthFirstSearch
+from portfolio_search import PortfolioSearch
+import parallel_search
+from graph import GraphNode, GraphRoutingProblem, graph_fingerprint, graph_nodes, graphrouting_distance, graphrouting_heuristic
+from csr_graph import CSRGraph, CSRGraphProblem, csr_graph_heuristic
+from contraction_hierarchy import ContractionHierarchySearch, get_contraction_hierarchy
+from graph_landmarks import get_landmark_tables, landmark_heuristic, make_landmark_heuristic
+from graph_routing import RoutingGraph
+from parking import ParkingProblem
+from parking_heuristic import build_pattern_database, get_pattern_database, pattern_database_heuristic, weighted_distance_heuristic
+from sokoban import SokobanProblem, SokobanPushProblem, push_level_search
+from sokoban_bitboard import BitboardSokobanProblem, BitboardState, bitboard_heuristic
+from sokoban_deadlocks import deadlock_aware, enable_deadlock_pruning, get_deadlock_detector
+from sokoban_heuristic import UNREACHABLE, get_push_distance_table, strong_heuristic
+from search import (
+    BreadthFirstSearch, UniformCostSearch, AStarSearch, IterativeDeepeningSearch, IDAStarSearch,
+    FrontierBreadthFirstSearch, BidirectionalSearch, BestFirstSearch, WeightedAStarSearch, AnytimeRepairingAStar,
+)
+
+# This file contains quick repeatable checks for the search algorithms that are not covered by the autograder
+# Every check runs an algorithm on the inputs shipped with the problem set (graphs/, parks/ and levels/)
+# and compares its solutions with the solutions of UniformCostSearch (the least path cost)
+# or BreadthFirstSearch (the least number of actions), and a check fails with an AssertionError if they do not match
+# The inputs on which an algorithm is too slow (e.g. the iterative deepening searches on the larger levels) are skipped
+#
+# To run all the checks: python search_checks.py
+# To run some of them:   python search_checks.py ids idastar
+# The speedup of the level-parallel breadth first search is measured by: python parallel_search.py levels/level3.txt -w 1 4
+
+# The checks by name (in the order they were registered)
+CHECKS: Dict[str, Callable[[], None]] = {}
+
+# A decorator which registers a check under the given name
+def register(name: str) -> Callable[[Callable[[], None]], Callable[[], None]]:
+    def decorate(check: Callable[[], None]) -> Callable[[], None]:
+        CHECKS[name] = check
+        return check
+    return decorate
+
+# Returns the (path, problem) of every input file that matches the pattern,
+# where names (if given) selects the files by their name without the extension (e.g. "level1")
+def load_problems(pattern: str, from_file: Callable[[str], Problem], names: Optional[Iterable[str]] = None) -> List[Tuple[str, Problem]]:
+    paths = sorted(glob.glob(pattern))
+    if names is not None:
+        names = set(names)
+        paths = [path for path in paths if os.path.splitext(os.path.basename(path))[0] in names]
+    return [(path, from_file(path)) for path in paths]
+
+def graph_problems() -> List[Tuple[str, GraphRoutingProblem]]:
+    return load_problems(os.path.join("graphs", "*.json"), GraphRoutingProblem.from_file)
+
+# Since the graphs are small, every pair of nodes (start, goal) of every graph (or of the given graphs) is a problem
+def graph_pair_problems(graphs: Optional[List[Tuple[str, GraphRoutingProblem]]] = None) -> List[Tuple[str, GraphRoutingProblem]]:
+    problems = []
+    for path, problem in graphs or graph_problems():
+        nodes = graph_nodes(problem)
+        for start in nodes:
+            for goal in nodes:
+                problems.append((f"{path} ({start} -> {goal})", GraphRoutingProblem(start, goal, problem.adjacency)))
+    return problems
+
+def parking_problems(names: Optional[Iterable[str]] = None) -> List[Tuple[str, ParkingProblem]]:
+    return load_problems(os.path.join("parks", "*.txt"), ParkingProblem.from_file, names)
+
+def sokoban_problems(names: Optional[Iterable[str]] = None) -> List[Tuple[str, SokobanProblem]]:
+    return load_problems(os.path.join("levels", "*.txt"), SokobanProblem.from_file, names)
+
+# Follow the solution from the initial state and return its path cost
+# It fails if an action is not available in its state or if the solution does not end at a goal
+def solution_path_cost(label: str, problem: Problem, initial_state: Any, solution: List[Any]) -> float:
+    state, cost = initial_state, 0
+    for step, action in enumerate(solution):
+        assert action in list(problem.get_actions(state)), f"{label}: the action {action} (step {step}) is not available"
+        cost += problem.get_cost(state, action)
+        state = problem.get_successor(state, action)
+    assert problem.is_goal(state), f"{label}: the solution does not end at a goal"
+    return cost
+
+# Check that the solution is valid and as good as the expected solution (or that both are None)
+# The solutions are compared by their path costs, or by their lengths if by_length is True
+def check_solution(label: str, problem: Problem, initial_state: Any, solution: Solution, expected: Solution, by_length: bool = False) -> None:
+    if expected is None:
+        assert solution is None, f"{label}: expected no solution, got {len(solution)} actions"
+        return
+    assert solution is not None, f"{label}: expected a solution, got None"
+    cost = solution_path_cost(label, problem, initial_state, solution)
+    if by_length:
+        assert len(solution) == len(expected), f"{label}: expected {len(expected)} actions, got {len(solution)}"
+    else:
+        expected_cost = solution_path_cost(label, problem, initial_state, expected)
+        assert math.isclose(cost, expected_cost), f"{label}: expected the path cost {expected_cost}, got {cost}"
+
+# Compare the search function with the reference search (UniformCostSearch or BreadthFirstSearch) on every problem
+# The search function receives the problem and the initial state
+def compare_with(
+    reference: Callable[[Problem, Any], Solution],
+    search_fn: Callable[[Problem, Any], Solution],
+    problems: List[Tuple[str, Problem]],
+) -> None:
+    by_length = reference is BreadthFirstSearch
+    for path, problem in problems:
+        initial_state = problem.get_initial_state()
+        expected = reference(problem, initial_state)
+        check_solution(path, problem, initial_state, search_fn(problem, initial_state), expected, by_length)
+
+@register("ids")
+def check_iterative_deepening() -> None:
+    search_fn = IterativeDeepeningSearch
+    compare_with(BreadthFirstSearch, search_fn, graph_problems())
+    compare_with(BreadthFirstSearch, search_fn, parking_problems(["park1", "park2", "park3", "park4"]))
+    compare_with(BreadthFirstSearch, search_fn, sokoban_problems(["level1"]))
+
+@register("idastar")
+def check_ida_star() -> None:
+    compare_with(UniformCostSearch, lambda problem, state: IDAStarSearch(problem, state, graphrouting_heuristic), graph_problems())
+    compare_with(UniformCostSearch, lambda problem, state: IDAStarSearch(problem, state, weighted_distance_heuristic), parking_problems())
+    compare_with(UniformCostSearch, lambda problem, state: IDAStarSearch(problem, state, strong_heuristic), sokoban_problems(["level1"]))
+
+@register("bidirectional")
+def check_bidirectional() -> None:
+    compare_with(UniformCostSearch, BidirectionalSearch, graph_pair_problems())
+
+@register("alt")
+def check_landmark_astar() -> None:
+    compare_with(UniformCostSearch, lambda problem, state: AStarSearch(problem, state, landmark_heuristic), graph_pair_problems())
+    # The tables saved to a file must give the same results when they are loaded, and must not be reused for another graph
+    with tempfile.TemporaryDirectory() as directory:
+        tables_path = os.path.join(directory, "graph.landmarks.json")
+        for path, problem in graph_problems():
+            for count in (1, 2):
+                saved = get_landmark_tables(problem, count, tables_path)
+                loaded = get_landmark_tables(GraphRoutingProblem.from_file(path), count, tables_path)
+                assert loaded.nodes == saved.nodes and loaded.landmarks == saved.landmarks, f"{path}: the loaded tables differ"
+        # The file now holds the tables of the last graph, so the other graphs must rebuild their tables instead of loading them
+        heuristic = make_landmark_heuristic(2, tables_path)
+        for path, problem in graph_problems():
+            tables = get_landmark_tables(problem, 2, tables_path)
+            assert tables.matches(problem, 2), f"{path}: the landmark tables of another graph were loaded"
+            compare_with(UniformCostSearch, lambda problem, state: AStarSearch(problem, state, heuristic), [(path, problem)])
+    # The heuristic of each count must use the tables of its count, whatever tables were built later for the same problem
+    for path, problem in graph_pair_problems():
+        heuristics = {1: [make_landmark_heuristic(1)], 2: [make_landmark_heuristic(2)], 4: [make_landmark_heuristic(4), landmark_heuristic]}
+        tables = {count: get_landmark_tables(problem, count) for count in heuristics}
+        for count, count_heuristics in heuristics.items():
+            expected = max(graphrouting_heuristic(problem, problem.start), tables[count].lower_bound(problem.start.name, problem.goal.name))
+            for heuristic in count_heuristics:
+                value = heuristic(problem, problem.start)
+                assert value == expected, f"{path}: the heuristic with {count} landmarks returned {value} instead of {expected}"
+
+@register("routing")
+def check_routing_graph() -> None:
+    for path, _ in graph_problems():
+        graph = RoutingGraph.from_file(path)
+        queries = [(start, goal) for start in sorted(graph.nodes) for goal in sorted(graph.nodes)]
+        # the routes must follow the changed edge costs (the cached trees are dropped after a change)
+        for changed in (False, True):
+            if changed:
+                problem = graph.problem(queries[0][0], queries[0][1])
+                for node, adjacent in graph.adjacency.items():
+                    for next_node in adjacent[:1]:
+                        problem.set_cost(node, next_node, 3 * problem.get_cost(node, next_node))
+            for processes in (None, 2):
+                for start, goal, solution in graph.route_many(queries, processes):
+                    problem = graph.problem(start, goal)
+                    label = f"{path} ({start} -> {goal}, changed costs: {changed}, processes: {processes})"
+                    check_solution(label, problem, start, solution, UniformCostSearch(problem, start))
+        # an edge removed through one problem must be seen by the other problems over the graph
+        # (by their reversibility and by their searches which use the cached reverse adjacency)
+        node = next(node for node in sorted(graph.adjacency, key=lambda node: node.name) if graph.adjacency[node])
+        problems = [graph.problem(start, goal) for start, goal in queries]
+        for problem in problems:
+            problem.get_reverse_adjacency()
+        problems[-1].remove_edge(node, graph.adjacency[node][0])
+        # a new problem which does not share the cache scans the changed graph
+        reversible = GraphRoutingProblem(node, node, graph.adjacency).reversible
+        for problem in problems:
+            label = f"{path} ({problem.start} -> {problem.goal}, removed edge)"
+            assert problem.reversible == reversible, f"{label}: the problem did not see the removed edge"
+            check_solution(label, problem, problem.start, BidirectionalSearch(problem, problem.start), UniformCostSearch(problem, problem.start))
+
+@register("ch")
+def check_contraction_hierarchy() -> None:
+    compare_with(UniformCostSearch, ContractionHierarchySearch, graph_pair_problems())
+    # The hierarchy saved to a file must give the same results when it is loaded, and must not be reused for another graph
+    with tempfile.TemporaryDirectory() as directory:
+        hierarchy_path = os.path.join(directory, "graph.ch.json")
+        for path, problem in graph_problems():
+            saved = get_contraction_hierarchy(problem, hierarchy_path)
+            other = GraphRoutingProblem.from_file(path)
+            loaded = get_contraction_hierarchy(other, hierarchy_path)
+            assert loaded.ranks == saved.ranks and loaded.edges == saved.edges, f"{path}: the loaded hierarchy differs"
+            compare_with(UniformCostSearch, ContractionHierarchySearch, [(path, other)])
+        # The file now holds the hierarchy of the last graph, so the other graphs must rebuild their hierarchies
+        for path, problem in graph_problems():
+            hierarchy = get_contraction_hierarchy(problem, hierarchy_path)
+            assert hierarchy.fingerprint == graph_fingerprint(problem), f"{path}: the hierarchy of another graph was loaded"
+            compare_with(UniformCostSearch, ContractionHierarchySearch, [(path, problem)])
+
+# The CSR graph saved to binary files must give the same routes as the graph routing problem,
+# both when it is read into memory and when it is memory mapped
+@register("csr")
+def check_csr_graph() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        for path, _ in graph_problems():
+            graph_directory = os.path.join(directory, os.path.splitext(os.path.basename(path))[0])
+            CSRGraph.from_json(path).save(graph_directory)
+            for use_mmap in (False, True):
+                graph = CSRGraph.load(graph_directory, use_mmap)
+                for label, problem in graph_pair_problems([(path, GraphRoutingProblem.from_file(path))]):
+                    label = f"{label} (memory mapped: {use_mmap})"
+                    expected = UniformCostSearch(problem, problem.start)
+                    csr_problem = CSRGraphProblem.from_graph(graph, problem.start.name, problem.goal.name)
+                    solution = UniformCostSearch(csr_problem, csr_problem.start)
+                    names = csr_problem.path_to_names(solution)
+                    expected_names = None if expected is None else [node.name for node in expected]
+                    assert names == expected_names, f"{label}: expected the route {expected_names}, got {names}"
+                    astar_solution = AStarSearch(csr_problem, csr_problem.start, csr_graph_heuristic)
+                    check_solution(label, csr_problem, csr_problem.start, astar_solution, solution)
+
+# Returns up to "limit" states reachable from the initial state in breadth first order
+# (every state after the first is a successor of an earlier state, so the incremental computations see their parents first)
+def sample_states(problem: Problem, limit: int) -> List[Any]:
+    initial_state = problem.get_initial_state()
+    states, reached = [initial_state], {initial_state}
+    for state in states:
+        for action in problem.get_actions(state):
+            next_state = problem.get_successor(state, action)
+            if next_state not in reached and len(states) < limit:
+                reached.add(next_state)
+                states.append(next_state)
+        if len(states) >= limit:
+            break
+    return states
+
+# The strong heuristic solves the crate-goal assignment with the Hungarian algorithm, starting from the assignment of
+# the parent state when it was evaluated, so its value must equal the least cost over every assignment (found by brute force)
+# The problem is read again for every level, so its assignment cache is empty when the states are evaluated
+# The states are sampled from the push-level problem, so every state has different crates than its parent
+@register("hungarian")
+def check_hungarian_assignment() -> None:
+    for path, problem in sokoban_problems():
+        table = get_push_distance_table(problem)
+        goal_ids = range(len(table.goals))
+        for state in sample_states(SokobanPushProblem.from_problem(problem), 400):
+            rows = [table.row(crate) for crate in state.crates]
+            expected = min(sum(row[goal] for row, goal in zip(rows, goals)) for goals in itertools.permutations(goal_ids))
+            value = strong_heuristic(problem, state)
+            assert value == expected, f"{path}: the assignment cost is {value} instead of {expected} for the state\n{state}"
+
+# The push distance table is built by pulling the crates from the goals over the topology neighbor table,
+# so it is compared with a forward breadth first search of a single crate over the points of the layout
+# The strong heuristic must also be admissible and consistent: it never exceeds the cost of a sampled transition plus the heuristic
+# of its successor, and it never exceeds the remaining cost along the least cost solutions
+@register("pushdistances")
+def check_push_distance_table() -> None:
+    for path, problem in sokoban_problems():
+        layout = problem.layout
+        table = get_push_distance_table(problem)
+        for crate in layout.walkable:
+            distances, frontier = {crate: 0}, [crate]
+            for cell in frontier:
+                for direction in Direction:
+                    vector = direction.to_vector()
+                    if cell + vector in layout.walkable and cell - vector in layout.walkable and cell + vector not in distances:
+                        distances[cell + vector] = distances[cell] + 1
+                        frontier.append(cell + vector)
+            expected = [distances.get(goal, UNREACHABLE) for goal in table.goals]
+            row = list(table.row(crate))
+            assert row == expected, f"{path}: the push distances of {crate} are {row} instead of {expected}"
+        for state in sample_states(problem, 400):
+            value = strong_heuristic(problem, state)
+            for action in problem.get_actions(state):
+                next_state = problem.get_successor(state, action)
+                next_value = strong_heuristic(problem, next_state)
+                assert value <= problem.get_cost(state, action) + next_value, f"{path}: the strong heuristic is not consistent"
+    for path, problem in sokoban_problems(["level1", "level2", "level3"]):
+        state = problem.get_initial_state()
+        solution = UniformCostSearch(problem, state)
+        for step, action in enumerate(solution):
+            assert strong_heuristic(problem, state) <= len(solution) - step, f"{path}: the strong heuristic is not admissible"
+            state = problem.get_successor(state, action)
+
+# The deadlock detection must be sound: a sampled state reported as a deadlock has no solution
+# (checked by a search of the push-level problem from it, which is smaller than the sokoban problem)
+# and no state along a least cost solution is a deadlock, so pruning the deadlocks keeps the least cost solutions
+@register("deadlocks")
+def check_deadlock_pruning() -> None:
+    for path, problem in sokoban_problems(["level1", "level2"]):
+        detector = get_deadlock_detector(problem.layout)
+        for state in sample_states(problem, 300):
+            if detector.is_deadlock(state):
+                push_problem = SokobanPushProblem.from_problem(problem, state)
+                solution = BreadthFirstSearch(push_problem, push_problem.get_initial_state())
+                assert solution is None, f"{path}: a solvable state is reported as a deadlock\n{state}"
+    for path, problem in sokoban_problems(["level1", "level2", "level3"]):
+        initial_state = problem.get_initial_state()
+        expected = UniformCostSearch(problem, initial_state)
+        detector, state = get_deadlock_detector(problem.layout), initial_state
+        for action in expected:
+            assert not detector.is_deadlock(state), f"{path}: a state on a least cost solution is reported as a deadlock\n{state}"
+            state = problem.get_successor(state, action)
+        enable_deadlock_pruning(problem)
+        label = f"{path} (deadlock pruning)"
+        check_solution(label, problem, initial_state, BreadthFirstSearch(problem, initial_state), expected, by_length=True)
+        check_solution(label, problem, initial_state, AStarSearch(problem, initial_state, deadlock_aware(strong_heuristic)), expected)
+        solution = push_level_search(BreadthFirstSearch)(problem, initial_state)
+        assert solution is not None, f"{label}: the push-level search found no solution"
+        solution_path_cost(label, problem, initial_state, solution)
+        enable_deadlock_pruning(problem, False)
+
+# Returns the number of pushes (the actions that move a crate) in a valid sokoban solution
+def count_pushes(problem: SokobanProblem, initial_state: Any, solution: List[Any]) -> int:
+    state, pushes = initial_state, 0
+    for action in solution:
+        next_state = problem.get_successor(state, action)
+        pushes += next_state.crates != state.crates
+        state = next_state
+    return pushes
+
+@register("pushes")
+def check_push_level_search() -> None:
+    for path, problem in sokoban_problems(["level1", "level2", "level3"]):
+        initial_state = problem.get_initial_state()
+        # the expanded solution is a valid sokoban solution (which may take more steps) with the least number of pushes
+        solution = push_level_search(BreadthFirstSearch)(problem, initial_state)
+        assert solution is not None, f"{path}: expected a solution, got None"
+        solution_path_cost(path, problem, initial_state, solution)
+        push_problem = SokobanPushProblem.from_problem(problem, initial_state)
+        least_pushes = len(UniformCostSearch(push_problem, push_problem.get_initial_state()))
+        pushes = count_pushes(problem, initial_state, solution)
+        assert pushes == least_pushes, f"{path}: expected {least_pushes} pushes, got {pushes}"
+        # the shortest solution (in steps) can not have fewer pushes
+        step_pushes = count_pushes(problem, initial_state, BreadthFirstSearch(problem, initial_state))
+        assert step_pushes >= pushes, f"{path}: the breadth first search solution has fewer pushes ({step_pushes} < {pushes})"
+
+# The bitboard problem has the same actions in the same order as the sokoban problem, so the searches must return the same solutions
+# Its states must convert to the same sokoban states and back, and the incremental Zobrist hash must equal the hash from scratch
+@register("bitboard")
+def check_bitboard_sokoban() -> None:
+    for path, problem in sokoban_problems():
+        bitboard_problem = BitboardSokobanProblem.from_problem(problem)
+        layout = bitboard_problem.bitboard_layout
+        for state in sample_states(bitboard_problem, 1000):
+            sokoban_state = state.to_sokoban_state()
+            assert BitboardState.from_sokoban_state(layout, sokoban_state) == state, f"{path}: the state conversion is not reversible"
+            assert state.hash == layout.zobrist_hash(state.player, state.crates), f"{path}: the incremental hash differs"
+            actions = list(bitboard_problem.get_actions(state))
+            assert actions == list(problem.get_actions(sokoban_state)), f"{path}: the actions differ\n{sokoban_state}"
+            for action in actions:
+                next_state = bitboard_problem.get_successor(state, action).to_sokoban_state()
+                assert next_state == problem.get_successor(sokoban_state, action), f"{path}: the successors differ\n{sokoban_state}"
+    for path, problem in sokoban_problems(["level1", "level2", "level3"]):
+        bitboard_problem = BitboardSokobanProblem.from_problem(problem)
+        searches = [
+            ("BreadthFirstSearch", BreadthFirstSearch, BreadthFirstSearch),
+            ("AStarSearch", lambda problem, state: AStarSearch(problem, state, strong_heuristic),
+                lambda problem, state: AStarSearch(problem, state, bitboard_heuristic(strong_heuristic))),
+        ]
+        for name, search_fn, bitboard_search_fn in searches:
+            expected = search_fn(problem, problem.get_initial_state())
+            solution = bitboard_search_fn(bitboard_problem, bitboard_problem.get_initial_state())
+            assert solution == expected, f"{path} ({name}): the bitboard solution {solution} differs from {expected}"
+
+# Both parking heuristics must be consistent on the transitions of the sampled states and admissible along the least cost solutions,
+# the pattern database heuristic must never be weaker than the weighted distance heuristic, and A* must find the least cost with both
+# The pattern database saved to a file must be loaded with the same tables, and must not be reused for another park
+@register("parking")
+def check_parking_heuristics() -> None:
+    heuristics = [("weighted distance", weighted_distance_heuristic), ("pattern database", pattern_database_heuristic)]
+    for path, problem in parking_problems():
+        for state in sample_states(problem, 1000):
+            weighted, pattern = weighted_distance_heuristic(problem, state), pattern_database_heuristic(problem, state)
+            assert pattern >= weighted, f"{path}: the pattern database heuristic {pattern} is weaker than {weighted}"
+            for action in problem.get_actions(state):
+                next_state, cost = problem.get_successor(state, action), problem.get_cost(state, action)
+                for name, heuristic in heuristics:
+                    assert heuristic(problem, state) <= cost + heuristic(problem, next_state), f"{path}: the {name} heuristic is not consistent"
+        initial_state = problem.get_initial_state()
+        expected = UniformCostSearch(problem, initial_state)
+        for name, heuristic in heuristics:
+            check_solution(f"{path} ({name})", problem, initial_state, AStarSearch(problem, initial_state, heuristic), expected)
+        if expected is None:
+            continue
+        state, remaining = initial_state, solution_path_cost(path, problem, initial_state, expected)
+        for action in expected:
+            for name, heuristic in heuristics:
+                assert heuristic(problem, state) <= remaining, f"{path}: the {name} heuristic is not admissible"
+            remaining -= problem.get_cost(state, action)
+            state = problem.get_successor(state, action)
+    with tempfile.TemporaryDirectory() as directory:
+        database_path = os.path.join(directory, "park.pdb.json")
+        for path, problem in parking_problems():
+            saved = get_pattern_database(problem, database_path)
+            loaded = get_pattern_database(ParkingProblem.from_file(path), database_path)
+            assert loaded.pairs == saved.pairs and loaded.tables == saved.tables, f"{path}: the loaded pattern database differs"
+        # the file now holds the database of the last park, so the other parks must rebuild their databases
+        for path, problem in parking_problems():
+            database = get_pattern_database(problem, database_path)
+            assert database.tables == build_pattern_database(problem).tables, f"{path}: the pattern database of another park was loaded"
+
+# The packed parking state must unpack to the positions it was packed from, and its moves must be the moves of the cars
+# computed on the points: a car moves to the neighbor point in the direction if it is a passage without a car
+# The encoded states must decode to the same states and keep their order (the encodings are compared by the external search)
+@register("parkingstate")
+def check_parking_state() -> None:
+    for path, problem in parking_problems():
+        states = sample_states(problem, 1000)
+        for state in states:
+            positions = problem.unpack_positions(state)
+            assert problem.pack_positions(positions) == state, f"{path}: packing the positions {positions} does not give the state"
+            assert problem.decode_state(problem.encode_state(state)) == state, f"{path}: the encoding of {positions} is not reversible"
+            expected_actions = [
+                (car, direction) for car, position in enumerate(positions) for direction in Direction
+                if position + direction.to_vector() in problem.passages and position + direction.to_vector() not in positions
+            ]
+            actions = list(problem.get_actions(state))
+            assert actions == expected_actions, f"{path}: the actions of {positions} are {actions} instead of {expected_actions}"
+            for car, direction in actions:
+                expected = positions[:car] + (positions[car] + direction.to_vector(),) + positions[car + 1:]
+                next_positions = problem.unpack_positions(problem.get_successor(state, (car, direction)))
+                assert next_positions == expected, f"{path}: moving the car {car} {direction} gives {next_positions} instead of {expected}"
+            is_goal = all(problem.slots.get(position) == car for car, position in enumerate(positions))
+            assert problem.is_goal(state) == is_goal, f"{path}: the goal test of {positions} is wrong"
+        encodings = sorted(problem.encode_state(state) for state in states)
+        assert [problem.decode_state(data) for data in encodings] == sorted(states), f"{path}: the encodings are not sorted like the states"
+
+# Run the parallel searches with the spawn start method (the start method where fork is not available, e.g. on Windows)
+@contextmanager
+def spawned_workers() -> Iterator[None]:
+    start_method = parallel_search.START_METHOD
+    parallel_search.START_METHOD = "spawn"
+    try:
+        yield
+    finally:
+        parallel_search.START_METHOD = start_method
+
+@register("hdastar")
+def check_parallel_astar() -> None:
+    search = lambda heuristic: lambda problem, state: ParallelAStarSearch(problem, state, heuristic, workers=2)
+    compare_with(UniformCostSearch, search(graphrouting_heuristic), graph_problems())
+    compare_with(UniformCostSearch, search(weighted_distance_heuristic), parking_problems())
+    compare_with(UniformCostSearch, search(strong_heuristic), sokoban_problems(["level1", "level2", "level3"]))
+    # the spawned workers select the owners by the encoded states, so the graph routing problem (which can not encode them) is refused
+    with spawned_workers():
+        compare_with(UniformCostSearch, search(weighted_distance_heuristic), parking_problems(["park1", "park2"]))
+        compare_with(UniformCostSearch, search(strong_heuristic), sokoban_problems(["level1"]))
+        path, problem = graph_problems()[0]
+        try:
+            search(graphrouting_heuristic)(problem, problem.get_initial_state())
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"{path}: the spawned workers accepted a problem that can not encode its states")
+
+# In the first result mode, the portfolio must return a valid solution (which may not be optimal)
+# and with a deadline that every strategy meets, it must return the least cost solution (A* is one of the strategies)
+@register("portfolio")
+def check_portfolio() -> None:
+    strategies = [AStarSearch, partial(WeightedAStarSearch, weight=3), BestFirstSearch]
+    problems = [
+        (graph_problems(), graphrouting_heuristic),
+        (parking_problems(), weighted_distance_heuristic),
+        (sokoban_problems(["level1", "level2"]), strong_heuristic),
+    ]
+    for inputs, heuristic in problems:
+        for path, problem in inputs:
+            initial_state = problem.get_initial_state()
+            expected = UniformCostSearch(problem, initial_state)
+            solution = PortfolioSearch(problem, initial_state, strategies, (heuristic,))
+            if expected is None:
+                assert solution is None, f"{path}: expected no solution, got {len(solution)} actions"
+            else:
+                assert solution is not None, f"{path}: expected a solution, got None"
+                solution_path_cost(path, problem, initial_state, solution)
+            solution = PortfolioSearch(problem, initial_state, strategies, (heuristic,), deadline=60)
+            check_solution(f"{path} (deadline)", problem, initial_state, solution, expected)
+    # the spawned processes receive the pickled problem, strategies and heuristic
+    with spawned_workers():
+        for path, problem in parking_problems(["park1", "park2"]):
+            initial_state = problem.get_initial_state()
+            solution = PortfolioSearch(problem, initial_state, strategies, (weighted_distance_heuristic,), deadline=60)
+            check_solution(f"{path} (spawned)", problem, initial_state, solution, UniformCostSearch(problem, initial_state))
+
+# Every solution of ARA* must cost at most its bound times the least cost, the bounds must not increase,
+# and the last solution must have the least cost (ARA* yields nothing if there is no solution, e.g. park3)
+# Weighted A* is also checked against the bound given by its weight
+@register("arastar")
+def check_anytime_astar() -> None:
+    problems = [
+        (graph_pair_problems(), graphrouting_heuristic),
+        (parking_problems(), weighted_distance_heuristic),
+        (sokoban_problems(["level1", "level2", "level3"]), strong_heuristic),
+    ]
+    for inputs, heuristic in problems:
+        for path, problem in inputs:
+            initial_state = problem.get_initial_state()
+            expected = UniformCostSearch(problem, initial_state)
+            results = list(AnytimeRepairingAStar(problem, initial_state, heuristic))
+            if expected is None:
+                assert not results, f"{path}: expected no solution, got {len(results)} solutions"
+                assert WeightedAStarSearch(problem, initial_state, heuristic, 3) is None, f"{path}: weighted A* found a solution"
+                continue
+            least_cost = solution_path_cost(path, problem, initial_state, expected)
+            previous_bound = float("inf")
+            for solution, bound in results:
+                cost = solution_path_cost(path, problem, initial_state, solution)
+                assert cost <= bound * least_cost + 1e-9, f"{path}: the cost {cost} exceeds the bound {bound} of the least cost {least_cost}"
+                assert bound <= previous_bound, f"{path}: the bound increased from {previous_bound} to {bound}"
+                previous_bound = bound
+            assert results, f"{path}: expected a solution, got none"
+            check_solution(path, problem, initial_state, results[-1][0], expected)
+            cost = solution_path_cost(path, problem, initial_state, WeightedAStarSearch(problem, initial_state, heuristic, 3))
+            assert cost <= 3 * least_cost + 1e-9, f"{path}: weighted A* found the cost {cost} which exceeds 3 times {least_cost}"
+
+# With 64-bit fingerprints, a collision among the states of these inputs is very unlikely, so the searches with a fingerprint
+# explored set must return the same solutions as the searches with a set of the states
+# (the graph states are fingerprinted by their hash and the parking and sokoban states by their encoding)
+@register("fingerprints")
+def check_fingerprint_set() -> None:
+    problems = [
+        (graph_pair_problems(), graphrouting_heuristic),
+        (parking_problems(), weighted_distance_heuristic),
+        (sokoban_problems(["level1", "level2"]), strong_heuristic),
+    ]
+    for inputs, heuristic in problems:
+        for path, problem in inputs:
+            initial_state = problem.get_initial_state()
+            searches = [
+                ("UniformCostSearch", lambda: UniformCostSearch(problem, initial_state)),
+                ("BreadthFirstSearch", lambda: BreadthFirstSearch(problem, initial_state)),
+                ("AStarSearch", lambda: AStarSearch(problem, initial_state, heuristic)),
+            ]
+            for name, search_fn in searches:
+                problem.fingerprint_bits = None
+                expected = search_fn()
+                problem.fingerprint_bits = 64
+                solution = search_fn()
+                problem.fingerprint_bits = None
+                assert solution == expected, f"{path} ({name}): the fingerprint search returned {solution} instead of {expected}"
+
+# The graph routing problem does not encode its states, so only the parking and sokoban problems are checked
+@register("ebfs")
+def check_external_bfs() -> None:
+    # a small buffer makes the search write several run files per layer
+    search_fn = lambda problem, state: ExternalBreadthFirstSearch(problem, state, buffer_size=64)
+    compare_with(BreadthFirstSearch, search_fn, parking_problems())
+    compare_with(BreadthFirstSearch, search_fn, sokoban_problems(["level1", "level2", "level3"]))
+
+# The problems that are not reversible need a depth bound: the graphs are bounded by their number of nodes
+# and the sokoban levels by a depth which is larger than their shortest solutions
+@register("fbfs")
+def check_frontier_bfs() -> None:
+    for path, problem in graph_pair_problems():
+        max_depth = None if problem.reversible else len(problem.adjacency)
+        compare_with(BreadthFirstSearch, lambda problem, state: FrontierBreadthFirstSearch(problem, state, max_depth), [(path, problem)])
+    compare_with(BreadthFirstSearch, FrontierBreadthFirstSearch, parking_problems())
+    compare_with(
+        BreadthFirstSearch, lambda problem, state: FrontierBreadthFirstSearch(problem, state, 60), sokoban_problems(["level1", "level2"])
+    )
+
+# The level-parallel search merges the successors in the order of "BreadthFirstSearch", so it must return the same solutions
+# (with 1 or 2 workers, and with spawned workers which receive a pickled problem)
+@register("pbfs")
+def check_parallel_bfs() -> None:
+    for workers in (1, 2):
+        search_fn = lambda problem, state: ParallelBreadthFirstSearch(problem, state, workers)
+        for path, problem in graph_pair_problems() + parking_problems() + sokoban_problems(["level1", "level2", "level3"]):
+            initial_state = problem.get_initial_state()
+            solution, expected = search_fn(problem, initial_state), BreadthFirstSearch(problem, initial_state)
+            assert solution == expected, f"{path} ({workers} workers): expected the solution {expected}, got {solution}"
+    with spawned_workers():
+        search_fn = lambda problem, state: ParallelBreadthFirstSearch(problem, state, 2)
+        compare_with(BreadthFirstSearch, search_fn, graph_problems() + parking_problems(["park1", "park2"]) + sokoban_problems(["level1"]))
+
+# Let the agent act until it reaches a goal and return its actions (or None if it finds no path)
+# It fails if the agent takes more actions than the given limit (e.g. if it moves in a cycle)
+def walk(label: str, agent: DStarLiteAgent, problem: Problem, state: Any, limit: int) -> Solution:
+    actions = []
+    while not problem.is_goal(state):
+        action = agent.act(problem, state)
+        if action is None:
+            return None
+        assert len(actions) < limit, f"{label}: the agent did not reach the goal in {limit} actions"
+        actions.append(action)
+        state = problem.get_successor(state, action)
+    return actions
+
+# The agent must follow a least cost path on the graph (and return no action at the goal), and after some edges change (before it moves or after its first move),
+# the rest of its path must be a least cost path from its current state on the changed graph
+# The changes triple the cost of the first edge of every node and remove the first edge of the current least cost path
+@register("dstarlite")
+def check_dstar_lite() -> None:
+    for path, shared_problem in graph_pair_problems():
+        for moves in (None, 0, 1):
+            label = f"{path} ({'no changes' if moves is None else f'changes after {moves} moves'})"
+            adjacency = {node: list(adjacent) for node, adjacent in shared_problem.adjacency.items()}
+            problem = GraphRoutingProblem(shared_problem.start, shared_problem.goal, adjacency)
+            agent, state, limit = DStarLiteAgent(graphrouting_distance), problem.get_initial_state(), 2 * len(adjacency)
+            if moves is None:
+                check_solution(label, problem, state, walk(label, agent, problem, state, limit), UniformCostSearch(problem, state))
+                # without changes, the agent follows its first search (the keys are never corrected) and it stays at the goal
+                assert getattr(agent, "key_modifier", 0) == 0, f"{label}: the agent corrected its keys although no edge changed"
+                assert agent.act(problem, problem.goal) is None, f"{label}: the agent moved away from the goal"
+                continue
+            if problem.is_goal(state) or agent.act(problem, state) is None:
+                continue
+            for _ in range(moves):
+                action = agent.act(problem, state)
+                state = problem.get_successor(state, action)
+                if problem.is_goal(state):
+                    break
+            for node, adjacent in adjacency.items():
+                for next_node in adjacent[:1]:
+                    problem.set_cost(node, next_node, 3 * problem.get_cost(node, next_node))
+            shortest = UniformCostSearch(problem, state)
+            if shortest:
+                problem.remove_edge(state, shortest[0])
+            check_solution(label, problem, state, walk(label, agent, problem, state, limit), UniformCostSearch(problem, state))
+    # Zero cost edges make several actions tie, so the agent must neither follow a self loop
+    # nor bounce between two nodes at the same position (the zero cost edge comes first in the action order)
+    # (the agent starts one edge before these nodes, so the search computes the cost of both of them)
+    start, node, twin, goal = (GraphNode(name, Point(x, 0)) for name, x in (("s", -3), ("a", 0), ("a2", 0), ("z", 3)))
+    for label, adjacency in (
+        ("self loop", {start: [node], node: [node, goal], goal: []}),
+        ("same position", {start: [node], node: [twin, goal], twin: [node, goal], goal: []}),
+    ):
+        problem = GraphRoutingProblem(start, goal, adjacency)
+        check_solution(label, problem, start, walk(label, DStarLiteAgent(graphrouting_distance), problem, start, 6), UniformCostSearch(problem, start))
+
+# Run the checks with the given names (or all of them) and return the names of the checks that failed
+def run_checks(names: Optional[List[str]] = None) -> List[str]:
+    failed = []
+    for name in names or CHECKS:
+        start = time.time()
+        try:
+            CHECKS[name]()
+        except AssertionError as error:
+            print(f"{name}: FAILED ({error})")
+            failed.append(name)
+            continue
+        print(f"{name}: passed in {time.time() - start:.2f} seconds")
+    return failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the search algorithms with uniform cost search and breadth first search")
+    parser.add_argument("checks", nargs="*", help=f"the checks to run (all of them by default): {', '.join(CHECKS)}")
+    args = parser.parse_args()
+    unknown = [name for name in args.checks if name not in CHECKS]
+    if unknown:
+        parser.error(f"unknown checks: {', '.join(unknown)}")
+    failed = run_checks(args.checks)
+    if failed:
+        print(f"{len(failed)} of {len(args.checks or CHECKS)} checks failed: {', '.join(failed)}")
+        exit(1)
+    print("All checks passed")
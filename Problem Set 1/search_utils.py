@@ -0,0 +1,347 @@
+from array import array
+from typing import Callable, Dict, Generic, Hashable, Iterator, List, Optional, Tuple, TypeVar, Union
+from problem import A, Problem
+import hashlib, heapq, itertools, math
+
+# K and V are used for generic typing where K represents the key type and V represents the value type of a priority queue
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+# This file contains data structures shared by the search functions in "search.py"
+
+# The search tree stores every generated node as a record of (parent index, action, path cost)
+# The records are kept in parallel arrays so a node is identified by its index in these arrays
+# This way, a frontier entry only holds an integer instead of the whole path from the root,
+# and the path is rebuilt once (by following the parent indices) when a goal is found
+class SearchTree(Generic[A]):
+    # The index of the root node and the parent index stored for the root
+    ROOT = 0
+    NO_PARENT = -1
+
+    def __init__(self) -> None:
+        self.parents = array('q', [SearchTree.NO_PARENT])
+        self.actions: List[Optional[A]] = [None]
+        self.costs: List[float] = [0]
+
+    def __len__(self) -> int:
+        return len(self.parents)
+
+    # Add a node which was generated by applying the action to the parent node and return its index
+    def add(self, parent: int, action: A, cost: float = 0) -> int:
+        self.parents.append(parent)
+        self.actions.append(action)
+        self.costs.append(cost)
+        return len(self.parents) - 1
+
+    # Returns the path cost from the root to the given node
+    def cost(self, node: int) -> float:
+        return self.costs[node]
+
+    # Returns the list of actions from the root to the given node
+    def path(self, node: int) -> List[A]:
+        path = []
+        parents, actions = self.parents, self.actions
+        while node != SearchTree.ROOT:
+            path.append(actions[node])
+            node = parents[node]
+        path.reverse()
+        return path
+
+# The indexed priority queue is a binary heap which keeps a position map from every key to its index in the heap
+# Every key can have at most one entry in the queue so, instead of pushing a duplicate entry when a cheaper route
+# to a state is found, the existing entry is updated in place (decrease-key)
+# Entries are ordered by their priority then by a counter which is incremented on every push or update,
+# so ties are resolved in FIFO order
+class IndexedPriorityQueue(Generic[K, V]):
+    def __init__(self) -> None:
+        # Each heap entry is a list [priority, tie_resolver, key, value]
+        self.heap: List[list] = []
+        # A map from each key to the index of its entry in the heap
+        self.positions: Dict[K, int] = {}
+        self.counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self.heap)
+
+    def __bool__(self) -> bool:
+        return bool(self.heap)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self.positions
+
+    # Iterate over the keys in the queue (in no particular order)
+    def __iter__(self) -> Iterator[K]:
+        return iter(self.positions)
+
+    # Returns the priority of the given key (the key must be in the queue)
+    def priority(self, key: K) -> float:
+        return self.heap[self.positions[key]][0]
+
+    # Insert the key if it is not in the queue, otherwise replace its priority and value
+    def push(self, key: K, priority: float, value: V = None) -> None:
+        index = self.positions.get(key)
+        if index is None:
+            self.heap.append([priority, next(self.counter), key, value])
+            self.positions[key] = len(self.heap) - 1
+            self._sift_up(len(self.heap) - 1)
+            return
+        entry = self.heap[index]
+        old_priority = entry[0]
+        entry[0], entry[1], entry[3] = priority, next(self.counter), value
+        # The new tie resolver is the largest so far, so an entry with an equal priority can only move down
+        if priority < old_priority:
+            self._sift_up(index)
+        else:
+            self._sift_down(index)
+
+    # Remove and return the (key, priority, value) with the least priority
+    def pop(self) -> Tuple[K, float, V]:
+        heap = self.heap
+        last = heap.pop()
+        if heap:
+            entry, heap[0] = heap[0], last
+            self.positions[last[2]] = 0
+            self._sift_down(0)
+        else:
+            entry = last
+        del self.positions[entry[2]]
+        return entry[2], entry[0], entry[3]
+
+    # Returns the (key, priority, value) with the least priority without removing it
+    def peek(self) -> Tuple[K, float, V]:
+        entry = self.heap[0]
+        return entry[2], entry[0], entry[3]
+
+    # Remove the key from the queue (the key must be in the queue)
+    def remove(self, key: K) -> None:
+        heap = self.heap
+        index = self.positions.pop(key)
+        last = heap.pop()
+        if index < len(heap):
+            # move the last entry to the removed position then restore the heap order
+            heap[index] = last
+            self.positions[last[2]] = index
+            self._sift_up(index)
+            self._sift_down(self.positions[last[2]])
+
+    def _sift_up(self, index: int) -> None:
+        heap, positions = self.heap, self.positions
+        entry = heap[index]
+        order = entry[:2]
+        while index > 0:
+            parent = (index - 1) >> 1
+            parent_entry = heap[parent]
+            if order >= parent_entry[:2]:
+                break
+            heap[index] = parent_entry
+            positions[parent_entry[2]] = index
+            index = parent
+        heap[index] = entry
+        positions[entry[2]] = index
+
+    def _sift_down(self, index: int) -> None:
+        heap, positions = self.heap, self.positions
+        size = len(heap)
+        entry = heap[index]
+        order = entry[:2]
+        while True:
+            child = 2 * index + 1
+            if child >= size:
+                break
+            right = child + 1
+            if right < size and heap[right][:2] < heap[child][:2]:
+                child = right
+            child_entry = heap[child]
+            if order <= child_entry[:2]:
+                break
+            heap[index] = child_entry
+            positions[child_entry[2]] = index
+            index = child
+        heap[index] = entry
+        positions[entry[2]] = index
+
+# The bucket queue groups the keys by their priority where each bucket is an insertion-ordered dictionary
+# It has the same interface as the IndexedPriorityQueue but it is meant for problems where the priorities take few distinct values
+# (e.g. small integer action costs) so pushing to an existing bucket is O(1) and no tuple comparisons are needed
+# An update removes the key from its bucket and appends it to the end of the new bucket, so ties are resolved in FIFO order
+class BucketQueue(Generic[K, V]):
+    def __init__(self) -> None:
+        # A map from each priority to its bucket which maps each key to its value
+        self.buckets: Dict[float, Dict[K, V]] = {}
+        # A map from each key to its priority
+        self.priorities: Dict[K, float] = {}
+        # A min-heap of the priorities which have a bucket (emptied buckets are removed lazily)
+        self.bucket_heap: List[float] = []
+
+    def __len__(self) -> int:
+        return len(self.priorities)
+
+    def __bool__(self) -> bool:
+        return bool(self.priorities)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self.priorities
+
+    # Iterate over the keys in the queue (in no particular order)
+    def __iter__(self) -> Iterator[K]:
+        return iter(self.priorities)
+
+    # Returns the priority of the given key (the key must be in the queue)
+    def priority(self, key: K) -> float:
+        return self.priorities[key]
+
+    # Insert the key if it is not in the queue, otherwise replace its priority and value
+    def push(self, key: K, priority: float, value: V = None) -> None:
+        old_priority = self.priorities.get(key)
+        if old_priority is not None:
+            del self.buckets[old_priority][key]
+        self.priorities[key] = priority
+        bucket = self.buckets.get(priority)
+        if bucket is None:
+            bucket = self.buckets[priority] = {}
+            heapq.heappush(self.bucket_heap, priority)
+        bucket[key] = value
+
+    # Remove and return the (key, priority, value) with the least priority
+    def pop(self) -> Tuple[K, float, V]:
+        priority = self._least_priority()
+        bucket = self.buckets[priority]
+        key = next(iter(bucket))
+        value = bucket.pop(key)
+        del self.priorities[key]
+        return key, priority, value
+
+    # Returns the (key, priority, value) with the least priority without removing it
+    def peek(self) -> Tuple[K, float, V]:
+        priority = self._least_priority()
+        bucket = self.buckets[priority]
+        key = next(iter(bucket))
+        return key, priority, bucket[key]
+
+    def _least_priority(self) -> float:
+        buckets, bucket_heap = self.buckets, self.bucket_heap
+        while True:
+            priority = bucket_heap[0]
+            if buckets.get(priority):
+                return priority
+            # The bucket is empty, so it is removed (if another copy of this priority is in the heap, it will be dropped later)
+            buckets.pop(priority, None)
+            heapq.heappop(bucket_heap)
+
+# Returns the open list that fits the problem:
+# a bucket queue if the problem declares that its action costs are small integers, otherwise an indexed binary heap
+def make_priority_queue(problem: Problem) -> Union[IndexedPriorityQueue, BucketQueue]:
+    if problem.integer_costs:
+        return BucketQueue()
+    return IndexedPriorityQueue()
+
+# The fingerprint set is a compact replacement for the explored set of the graph searches
+# Instead of the states, it stores a fingerprint of every state: a digest of its encoding (if an "encode" function is given,
+# e.g. "problem.encode_state") or otherwise its hash mixed into "bits" bits
+# The fingerprints are stored in an open-addressing hash table (with linear probing) backed by an array of unsigned integers
+# (the narrowest array type that fits the fingerprints), so a state takes a few bytes and the explored states can be freed
+# Two different states may have the same fingerprint, in which case the second state is wrongly reported as explored
+# and the search may miss some paths (see "collision_probability" to choose a width that makes this unlikely)
+class FingerprintSet(Generic[K]):
+    # The empty slots hold 0 so a fingerprint is never 0
+    EMPTY = 0
+    # The table grows once more than this fraction of its slots are used
+    MAX_LOAD = 0.5
+
+    def __init__(self, bits: int = 64, capacity: int = 1024, encode: Optional[Callable[[K], bytes]] = None) -> None:
+        if not 8 <= bits <= 64:
+            raise ValueError(f"The fingerprint width must be between 8 and 64 bits, got {bits}")
+        self.bits = bits
+        self.encode = encode
+        self.fingerprint_mask = (1 << bits) - 1
+        self.typecode = next(code for code in ('B', 'H', 'I', 'Q') if array(code).itemsize * 8 >= bits)
+        # the capacity is a power of 2 so the slot index is the low bits of the fingerprint
+        self.capacity = 1 << max(capacity - 1, 1).bit_length()
+        self.table = array(self.typecode, [FingerprintSet.EMPTY]) * self.capacity
+        self.size = 0
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    def __contains__(self, key: K) -> bool:
+        fingerprint = self.fingerprint(key)
+        table, mask = self.table, self.capacity - 1
+        index = fingerprint & mask
+        while True:
+            slot = table[index]
+            if slot == fingerprint:
+                return True
+            if slot == FingerprintSet.EMPTY:
+                return False
+            index = (index + 1) & mask
+
+    # Add the fingerprint of the key to the set
+    def add(self, key: K) -> None:
+        if self._insert(self.fingerprint(key)):
+            self.size += 1
+            if self.size > self.capacity * FingerprintSet.MAX_LOAD:
+                self._grow()
+
+    # Returns the fingerprint of the key truncated to the fingerprint width:
+    #   - with an encode function, it is the 64-bit BLAKE2b digest of the encoded key (which is uniformly distributed)
+    #   - otherwise, it is the hash of the key mixed by the finalizer of SplitMix64 (so every bit depends on the whole hash)
+    # The second case assumes that "hash" spreads the keys over 64 bits, which is not true for every key type:
+    # the hash of an int is reduced modulo 2^61 - 1, so the ints that differ by a multiple of 2^61 - 1
+    # (e.g. states packed into large ints) always collide whatever the fingerprint width is
+    def fingerprint(self, key: K) -> int:
+        if self.encode is not None:
+            digest = hashlib.blake2b(self.encode(key), digest_size=8).digest()
+            return (int.from_bytes(digest, 'little') & self.fingerprint_mask) or 1
+        value = hash(key) & 0xFFFFFFFFFFFFFFFF
+        value = ((value ^ (value >> 30)) * 0xBF58476D1CE4E5B9) & 0xFFFFFFFFFFFFFFFF
+        value = ((value ^ (value >> 27)) * 0x94D049BB133111EB) & 0xFFFFFFFFFFFFFFFF
+        value = (value ^ (value >> 31)) & self.fingerprint_mask
+        return value or 1
+
+    # Returns the probability that at least two of the stored states have the same fingerprint
+    # (assuming that the fingerprints are uniformly distributed), i.e. that the search may have skipped a state by mistake
+    # Without an encode function, this is a lower bound since the hash collisions (see "fingerprint") are not counted
+    # If count is given, it returns the probability for that number of states instead
+    def collision_probability(self, count: Optional[int] = None) -> float:
+        count = self.size if count is None else count
+        # the fingerprint 0 is reserved so there are 2^bits - 1 possible fingerprints
+        pairs = count * (count - 1) / 2
+        return -math.expm1(-pairs / ((1 << self.bits) - 1))
+
+    # Returns the number of bytes used by the table
+    def memory_usage(self) -> int:
+        return self.capacity * self.table.itemsize
+
+    # Insert a fingerprint and return True if it was not in the table
+    def _insert(self, fingerprint: int) -> bool:
+        table, mask = self.table, self.capacity - 1
+        index = fingerprint & mask
+        while True:
+            slot = table[index]
+            if slot == fingerprint:
+                return False
+            if slot == FingerprintSet.EMPTY:
+                table[index] = fingerprint
+                return True
+            index = (index + 1) & mask
+
+    # Double the capacity and reinsert the fingerprints
+    def _grow(self) -> None:
+        old_table = self.table
+        self.capacity *= 2
+        self.table = array(self.typecode, [FingerprintSet.EMPTY]) * self.capacity
+        for fingerprint in old_table:
+            if fingerprint != FingerprintSet.EMPTY:
+                self._insert(fingerprint)
+
+# Returns the explored set that fits the problem:
+# a fingerprint set if the problem sets its fingerprint width ("fingerprint_bits"), otherwise a python set of the states
+# If the problem implements "encode_state", the fingerprints are computed from the encoded states
+def make_explored_set(problem: Problem) -> Union[set, FingerprintSet]:
+    if problem.fingerprint_bits is not None:
+        encode = problem.encode_state if type(problem).encode_state is not Problem.encode_state else None
+        return FingerprintSet(problem.fingerprint_bits, encode=encode)
+    return set()
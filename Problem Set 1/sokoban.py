@@ -1,9 +1,12 @@
+from array import array
 from dataclasses import dataclass
-from typing import FrozenSet, Iterable
+from collections import deque
+from typing import Callable, Dict, FrozenSet, Iterable, List, Set, Tuple
 from enum import Enum
+import weakref
 
-from mathutils import Direction, Point
-from problem import Problem
+from mathutils import Direction, GridTopology, Point
+from problem import Problem, Solution
 from helpers.utils import track_call_count
 
 # This file contains the definition for the Sokoban problem
@@ -26,14 +29,38 @@ class SokobanTile(str, Enum):
 # we only need the default equality which compares objects by pointers.
 # The layout contains the problem details that are unchangeable across states such as:
 #   The walkable area (locations without walls) and the locations of the goals
+# It also contains the grid topology of the walkable area which is computed once when the layout is created
 @dataclass(eq=False, frozen=True)
 class SokobanLayout:
-    __slots__ = ("width", "height", "walkable", "goals")
+    __slots__ = ("width", "height", "walkable", "goals", "topology", "__weakref__")
     width: int
     height: int
     walkable: FrozenSet[Point]
     goals: FrozenSet[Point]
 
+    def __post_init__(self) -> None:
+        # The topology is not a dataclass field since it is computed from the walkable area
+        # and, since the dataclass is frozen, we use object.__setattr__ to set it
+        object.__setattr__(self, "topology", GridTopology(self.walkable))
+
+    # Since layouts are compared by pointers, unpickling a layout (e.g. when a state is sent to another process)
+    # returns the shared layout with the same fields instead of creating a new one
+    def __reduce__(self):
+        return (shared_layout, (self.width, self.height, self.walkable, self.goals))
+
+# The shared layouts (one for each distinct set of fields)
+# The references are weak, so a layout is dropped once no problem or state uses it
+_shared_layouts: 'weakref.WeakValueDictionary[Tuple, SokobanLayout]' = weakref.WeakValueDictionary()
+
+# Returns the shared layout with the given fields, creating it if it does not exist
+# Every problem with the same level has the same layout, so its states are equal to the states of the other problems
+def shared_layout(width: int, height: int, walkable: FrozenSet[Point], goals: FrozenSet[Point]) -> SokobanLayout:
+    key = (width, height, walkable, goals)
+    layout = _shared_layouts.get(key)
+    if layout is None:
+        layout = _shared_layouts[key] = SokobanLayout(width, height, walkable, goals)
+    return layout
+
 # For the sokoban state, we use dataclass with frozen=True to automatically implement:
 #   the constructor, the == operator, the hash function and to make the class immutable
 # Now it can be added to sets and used as keys in dictionaries
@@ -46,6 +73,10 @@ class SokobanState:
     player: Point
     crates: FrozenSet[Point]
 
+    # The frozen dataclass cannot be unpickled field by field, so it is unpickled by calling the constructor
+    def __reduce__(self):
+        return (SokobanState, (self.layout, self.player, self.crates))
+
     # This operator will convert the state to a string containing the grid representation of the level at the current state
     def __str__(self) -> str:
         def position_to_str(position):
@@ -60,6 +91,19 @@ class SokobanState:
             return SokobanTile.EMPTY
         return '\n'.join(''.join(position_to_str(Point(x, y)) for x in range(self.layout.width)) for y in range(self.layout.height))
 
+# Encode a state as the cell ids of the player then the crates (sorted) where every id is stored in 2 bytes
+# The crates are sorted so equal states have equal encodings
+def encode_sokoban_state(state: SokobanState) -> bytes:
+    cell_ids = state.layout.topology.cell_ids
+    return array('H', [cell_ids[state.player], *sorted(cell_ids[crate] for crate in state.crates)]).tobytes()
+
+# Decode a state encoded by "encode_sokoban_state"
+def decode_sokoban_state(layout: SokobanLayout, data: bytes) -> SokobanState:
+    cells = layout.topology.cells
+    ids = array('H')
+    ids.frombytes(data)
+    return SokobanState(layout, cells[ids[0]], frozenset(cells[cell] for cell in ids[1:]))
+
 # This is a list of all the possible actions for the sokoban agent
 AllSokobanActions = [
     Direction.RIGHT,
@@ -73,6 +117,10 @@ class SokobanProblem(Problem[SokobanState, Direction]):
     # The problem will contain the sokoban layout and the inital state
     layout: SokobanLayout
     initial_state: SokobanState
+    # Every action costs 1
+    integer_costs = True
+    # If a deadlock detector is set (see "sokoban_deadlocks.py"), the pushes that lead to a deadlock are not returned as actions
+    deadlock_detector = None
 
     def get_initial_state(self) -> SokobanState:
         return self.initial_state
@@ -83,39 +131,54 @@ class SokobanProblem(Problem[SokobanState, Direction]):
     # We use @track_call_count to track the number of times this function was called to count the number of explored nodes
     @track_call_count
     def get_actions(self, state: SokobanState) -> Iterable[Direction]:
+        # The moves are done on the cell ids of the grid topology (-1 means a wall)
+        topology = self.layout.topology
+        cells, neighbors = topology.cells, topology.neighbors
+        player_neighbors = neighbors[topology.cell_ids[state.player]]
         actions = []
         for direction in Direction:
-            position = state.player + direction.to_vector()
+            position = player_neighbors[direction]
             # Disallow walking into walls
-            if position not in self.layout.walkable: continue
+            if position < 0: continue
             # Check if walking into a crate
-            if position in state.crates:
+            if cells[position] in state.crates:
                 # make sure that the crate is not pushed into a wall or another crate
-                crate_position = position + direction.to_vector()
-                if crate_position not in self.layout.walkable or crate_position in state.crates:
+                crate_position = neighbors[position][direction]
+                if crate_position < 0 or cells[crate_position] in state.crates:
+                    continue
+                # skip the push if it can never lead to a goal
+                if self.deadlock_detector is not None and self.deadlock_detector.is_deadlock_after_push(state, cells[position], cells[crate_position]):
                     continue
             actions.append(direction)
         return actions
 
     def get_successor(self, state: SokobanState, action: Direction) -> SokobanState:
-        player = state.player + action.to_vector()
+        topology = self.layout.topology
+        player_id = topology.neighbors[topology.cell_ids[state.player]][action]
         crates = state.crates
-        if player not in self.layout.walkable:
+        if player_id < 0:
             # If we try to walk into a wall, then this action is wrong
             raise Exception(f"Invalid action {action} in state:" + "\n" + str(state))
+        player = topology.cells[player_id]
         if player in crates:
-            crate_position = player + action.to_vector()
-            if crate_position not in self.layout.walkable or crate_position in crates:
+            crate_id = topology.neighbors[player_id][action]
+            if crate_id < 0 or topology.cells[crate_id] in crates:
                 # If we try to push a crate into a wall or another crate, then this action is wrong
                 raise Exception(f"Invalid action {action} in state:" + "\n" + str(state))
             # If we walk to a crate, we push it
-            crates = crates.symmetric_difference({player,crate_position})
+            crates = crates.symmetric_difference({player,topology.cells[crate_id]})
         return SokobanState(state.layout, player, crates)
 
     def get_cost(self, state: SokobanState, action: Direction) -> float:
         # All actions have the same cost
         return 1
 
+    def encode_state(self, state: SokobanState) -> bytes:
+        return encode_sokoban_state(state)
+
+    def decode_state(self, data: bytes) -> SokobanState:
+        return decode_sokoban_state(self.layout, data)
+
     # Read a sokoban problem from text containing a grid of tiles
     @staticmethod
     def from_text(text: str) -> 'SokobanProblem':
@@ -140,7 +203,7 @@ class SokobanProblem(Problem[SokobanState, Direction]):
                         crates.add(Point(x, y))
                         goals.add(Point(x, y))
         problem = SokobanProblem()
-        problem.layout = SokobanLayout(width, height, frozenset(walkable), frozenset(goals))
+        problem.layout = shared_layout(width, height, frozenset(walkable), frozenset(goals))
         problem.initial_state = SokobanState(problem.layout, player, frozenset(crates))
         return problem
 
@@ -148,4 +211,162 @@ class SokobanProblem(Problem[SokobanState, Direction]):
     @staticmethod
     def from_file(path: str) -> 'SokobanProblem':
         with open(path, 'r') as f:
-            return SokobanProblem.from_text(f.read())
\ No newline at end of file
+            return SokobanProblem.from_text(f.read())
+
+# This is a push action: the player walks (without pushing any crate) to the cell behind the crate then pushes it one step
+@dataclass(frozen=True)
+class SokobanPush:
+    __slots__ = ("crate", "direction")
+    crate: Point
+    direction: Direction
+
+    # The frozen dataclass cannot be unpickled field by field, so it is unpickled by calling the constructor
+    def __reduce__(self):
+        return (SokobanPush, (self.crate, self.direction))
+
+    def __str__(self) -> str:
+        return f'{self.crate}{self.direction}'
+
+# This is the push-level (macro-move) variant of the sokoban problem where every action is a push
+# Since the player can walk freely inside the area it can reach without pushing, where it stands inside this area does not matter
+# So the player position is normalized to the least reachable cell (by y then x) and the states that differ only
+# by the player position inside the same area become one state
+# Every push costs 1, so the searches minimize the number of pushes (not the number of player steps)
+# Use "expand" to convert a solution into a list of directions which the original problem can replay
+class SokobanPushProblem(Problem[SokobanState, SokobanPush]):
+    layout: SokobanLayout
+    initial_state: SokobanState
+    # Every action costs 1
+    integer_costs = True
+    # If a deadlock detector is set (see "sokoban_deadlocks.py"), the pushes that lead to a deadlock are not returned as actions
+    deadlock_detector = None
+
+    def get_initial_state(self) -> SokobanState:
+        return self.initial_state
+
+    def is_goal(self, state: SokobanState) -> bool:
+        return self.layout.goals == state.crates
+
+    # We use @track_call_count to track the number of times this function was called to count the number of explored nodes
+    @track_call_count
+    def get_actions(self, state: SokobanState) -> Iterable[SokobanPush]:
+        topology = self.layout.topology
+        cells, neighbors = topology.cells, topology.neighbors
+        reachable = self._reachable_ids(state.player, state.crates)
+        actions = []
+        # the cell ids are sorted by y then x, so the crates are sorted by their ids
+        for crate in sorted(topology.cell_ids[crate] for crate in state.crates):
+            for direction in Direction:
+                # the player must be able to reach the cell behind the crate
+                if neighbors[crate][direction.rotate(2)] not in reachable: continue
+                # make sure that the crate is not pushed into a wall or another crate
+                crate_position = neighbors[crate][direction]
+                if crate_position < 0 or cells[crate_position] in state.crates:
+                    continue
+                # skip the push if it can never lead to a goal
+                if self.deadlock_detector is not None and self.deadlock_detector.is_deadlock_after_push(state, cells[crate], cells[crate_position]):
+                    continue
+                actions.append(SokobanPush(cells[crate], direction))
+        return actions
+
+    def get_successor(self, state: SokobanState, action: SokobanPush) -> SokobanState:
+        vector = action.direction.to_vector()
+        crate_position = action.crate + vector
+        if action.crate not in state.crates or crate_position not in self.layout.walkable or crate_position in state.crates:
+            # If the crate cannot be pushed in this direction, then this action is wrong
+            raise Exception(f"Invalid action {action} in state:" + "\n" + str(state))
+        crates = state.crates.symmetric_difference((action.crate, crate_position))
+        return self.normalize(action.crate, crates)
+
+    def get_cost(self, state: SokobanState, action: SokobanPush) -> float:
+        return 1
+
+    def encode_state(self, state: SokobanState) -> bytes:
+        return encode_sokoban_state(state)
+
+    def decode_state(self, data: bytes) -> SokobanState:
+        return decode_sokoban_state(self.layout, data)
+
+    # Returns the cells that the player can walk to from the given position without pushing any crate
+    def get_reachable(self, player: Point, crates: FrozenSet[Point]) -> Set[Point]:
+        cells = self.layout.topology.cells
+        return {cells[cell] for cell in self._reachable_ids(player, crates)}
+
+    # Returns the ids (in the grid topology) of the cells that the player can walk to without pushing any crate
+    def _reachable_ids(self, player: Point, crates: FrozenSet[Point]) -> Set[int]:
+        topology = self.layout.topology
+        cells, neighbors = topology.cells, topology.neighbors
+        start = topology.cell_ids[player]
+        reachable = {start}
+        frontier = [start]
+        while frontier:
+            for next_cell in neighbors[frontier.pop()]:
+                if next_cell >= 0 and next_cell not in reachable and cells[next_cell] not in crates:
+                    reachable.add(next_cell)
+                    frontier.append(next_cell)
+        return reachable
+
+    # Returns the state where the player is moved to the least cell (by y then x) that it can reach
+    def normalize(self, player: Point, crates: FrozenSet[Point]) -> SokobanState:
+        # the cell ids are sorted by y then x, so the least cell has the least id
+        player = self.layout.topology.cells[min(self._reachable_ids(player, crates))]
+        return SokobanState(self.layout, player, crates)
+
+    # Convert a push-level solution into the directions that the player takes starting from the given state
+    # The state is a state of the original problem (the player position is not normalized)
+    # Between the pushes, the player takes the shortest walk to the cell behind the next crate to push
+    def expand(self, state: SokobanState, solution: List[SokobanPush]) -> List[Direction]:
+        directions = []
+        player, crates = state.player, state.crates
+        for push in solution:
+            vector = push.direction.to_vector()
+            directions.extend(self._walk(player, push.crate - vector, crates))
+            directions.append(push.direction)
+            player = push.crate
+            crates = crates.symmetric_difference((push.crate, push.crate + vector))
+        return directions
+
+    # Returns the directions of the shortest walk from start to goal that does not push any crate
+    def _walk(self, start: Point, goal: Point, crates: FrozenSet[Point]) -> List[Direction]:
+        parents: Dict[Point, Direction] = {start: None}
+        frontier = deque([start])
+        while frontier:
+            position = frontier.popleft()
+            if position == goal:
+                break
+            for direction in Direction:
+                next_position = position + direction.to_vector()
+                if next_position in self.layout.walkable and next_position not in crates and next_position not in parents:
+                    parents[next_position] = direction
+                    frontier.append(next_position)
+        if goal not in parents:
+            raise Exception(f"Cannot walk from {start} to {goal}")
+        directions = []
+        while goal != start:
+            direction = parents[goal]
+            directions.append(direction)
+            goal = goal - direction.to_vector()
+        directions.reverse()
+        return directions
+
+    # Create the push-level problem of the given sokoban problem where the search starts from the given state
+    @staticmethod
+    def from_problem(problem: SokobanProblem, state: SokobanState = None) -> 'SokobanPushProblem':
+        state = state or problem.get_initial_state()
+        push_problem = SokobanPushProblem()
+        push_problem.layout = problem.layout
+        push_problem.initial_state = push_problem.normalize(state.player, state.crates)
+        push_problem.deadlock_detector = problem.deadlock_detector
+        return push_problem
+
+# Convert a search function so that it searches the push-level problem and returns the directions for the sokoban problem
+# The returned function has the same signature as the given one, so it can be used with the search agents
+# For example: UninformedSearchAgent(push_level_search(BreadthFirstSearch))
+def push_level_search(search_fn: Callable[..., Solution]) -> Callable[..., Solution]:
+    def search(problem: SokobanProblem, state: SokobanState, *args) -> Solution:
+        push_problem = SokobanPushProblem.from_problem(problem, state)
+        solution = search_fn(push_problem, push_problem.get_initial_state(), *args)
+        if solution is None:
+            return None
+        return push_problem.expand(state, solution)
+    return search
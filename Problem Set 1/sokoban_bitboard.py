@@ -0,0 +1,162 @@
+from typing import Dict, Iterable, List, Tuple
+import random
+
+from mathutils import Direction, Point
+from problem import HeuristicFunction, Problem
+from sokoban import SokobanLayout, SokobanProblem, SokobanState
+from helpers.utils import track_call_count
+
+# This file contains a compact variant of the sokoban problem
+# The walkable cells are numbered (by y then x) and a state is stored as:
+#   the player cell index and the crates as a bitboard (a python int where bit i is set if cell i has a crate)
+# Every state also carries a 64-bit Zobrist hash which is updated incrementally by xoring the keys of the cells that changed,
+# so hashing a state and comparing two states are integer operations instead of hashing and comparing frozensets of points
+
+# The seed of the Zobrist keys (fixed so the hashes are the same across runs)
+ZOBRIST_SEED = 0x5B0BA7
+
+# The bitboard layout holds the precomputed tables of a sokoban layout
+class BitboardLayout:
+    def __init__(self, layout: SokobanLayout) -> None:
+        self.layout = layout
+        # The cells are numbered by the grid topology of the layout
+        self.cells: Tuple[Point, ...] = layout.topology.cells
+        self.cell_ids: Dict[Point, int] = layout.topology.cell_ids
+        # moves[cell][direction] is the index of the neighbor cell in this direction or -1 if it is a wall
+        self.moves: List[Tuple[int, ...]] = layout.topology.neighbors
+        self.goals = self.to_bitboard(layout.goals)
+        generator = random.Random(ZOBRIST_SEED)
+        self.player_keys = [generator.getrandbits(64) for _ in self.cells]
+        self.crate_keys = [generator.getrandbits(64) for _ in self.cells]
+
+    # Convert a collection of points to a bitboard
+    def to_bitboard(self, points: Iterable[Point]) -> int:
+        bitboard = 0
+        for point in points:
+            bitboard |= 1 << self.cell_ids[point]
+        return bitboard
+
+    # Convert a bitboard to a frozenset of points
+    def to_points(self, bitboard: int) -> frozenset:
+        points = []
+        while bitboard:
+            lowest = bitboard & -bitboard
+            points.append(self.cells[lowest.bit_length() - 1])
+            bitboard ^= lowest
+        return frozenset(points)
+
+    # Compute the Zobrist hash of a state from scratch (used for the initial state and to verify the incremental updates)
+    def zobrist_hash(self, player: int, crates: int) -> int:
+        value = self.player_keys[player]
+        while crates:
+            lowest = crates & -crates
+            value ^= self.crate_keys[lowest.bit_length() - 1]
+            crates ^= lowest
+        return value
+
+# The bitboard state is not a dataclass since the hash is stored (not computed from the fields)
+# and the equality compares the hashes first so unequal states are usually rejected by one integer comparison
+class BitboardState:
+    __slots__ = ("layout", "player", "crates", "hash")
+
+    def __init__(self, layout: BitboardLayout, player: int, crates: int, hash: int) -> None:
+        self.layout = layout
+        self.player = player
+        self.crates = crates
+        self.hash = hash
+
+    def __hash__(self) -> int:
+        return self.hash
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, BitboardState):
+            return NotImplemented
+        return self.hash == other.hash and self.player == other.player and self.crates == other.crates
+
+    # Convert the state to a sokoban state (with points)
+    def to_sokoban_state(self) -> SokobanState:
+        return SokobanState(self.layout.layout, self.layout.cells[self.player], self.layout.to_points(self.crates))
+
+    # Create a bitboard state from a sokoban state
+    @staticmethod
+    def from_sokoban_state(layout: BitboardLayout, state: SokobanState) -> 'BitboardState':
+        player, crates = layout.cell_ids[state.player], layout.to_bitboard(state.crates)
+        return BitboardState(layout, player, crates, layout.zobrist_hash(player, crates))
+
+    def __str__(self) -> str:
+        return str(self.to_sokoban_state())
+
+# This is the sokoban problem over bitboard states
+# It has the same actions in the same order as "SokobanProblem" so the searches explore the same nodes
+class BitboardSokobanProblem(Problem[BitboardState, Direction]):
+    # Every action costs 1
+    integer_costs = True
+
+    def __init__(self, layout: SokobanLayout, initial_state: SokobanState) -> None:
+        super().__init__()
+        # The layout is kept so the problem can be used with the heuristics of "SokobanProblem" (see "bitboard_heuristic")
+        self.layout = layout
+        self.bitboard_layout = BitboardLayout(layout)
+        self.initial_state = BitboardState.from_sokoban_state(self.bitboard_layout, initial_state)
+
+    def get_initial_state(self) -> BitboardState:
+        return self.initial_state
+
+    def is_goal(self, state: BitboardState) -> bool:
+        return state.crates == self.bitboard_layout.goals
+
+    # We use @track_call_count to track the number of times this function was called to count the number of explored nodes
+    @track_call_count
+    def get_actions(self, state: BitboardState) -> Iterable[Direction]:
+        moves = self.bitboard_layout.moves
+        crates = state.crates
+        actions = []
+        for direction in Direction:
+            position = moves[state.player][direction]
+            # Disallow walking into walls
+            if position < 0: continue
+            # Check if walking into a crate
+            if crates >> position & 1:
+                # make sure that the crate is not pushed into a wall or another crate
+                crate_position = moves[position][direction]
+                if crate_position < 0 or crates >> crate_position & 1:
+                    continue
+            actions.append(direction)
+        return actions
+
+    def get_successor(self, state: BitboardState, action: Direction) -> BitboardState:
+        layout = self.bitboard_layout
+        player = layout.moves[state.player][action]
+        crates, zobrist = state.crates, state.hash
+        if player < 0:
+            # If we try to walk into a wall, then this action is wrong
+            raise Exception(f"Invalid action {action} in state:" + "\n" + str(state))
+        if crates >> player & 1:
+            crate_position = layout.moves[player][action]
+            if crate_position < 0 or crates >> crate_position & 1:
+                # If we try to push a crate into a wall or another crate, then this action is wrong
+                raise Exception(f"Invalid action {action} in state:" + "\n" + str(state))
+            crates ^= (1 << player) | (1 << crate_position)
+            zobrist ^= layout.crate_keys[player] ^ layout.crate_keys[crate_position]
+        zobrist ^= layout.player_keys[state.player] ^ layout.player_keys[player]
+        return BitboardState(layout, player, crates, zobrist)
+
+    def get_cost(self, state: BitboardState, action: Direction) -> float:
+        return 1
+
+    # Create the bitboard problem of a sokoban problem
+    @staticmethod
+    def from_problem(problem: SokobanProblem) -> 'BitboardSokobanProblem':
+        return BitboardSokobanProblem(problem.layout, problem.get_initial_state())
+
+    # Read a bitboard sokoban problem from file containing a grid of tiles
+    @staticmethod
+    def from_file(path: str) -> 'BitboardSokobanProblem':
+        return BitboardSokobanProblem.from_problem(SokobanProblem.from_file(path))
+
+# Adapt a heuristic of "SokobanProblem" to "BitboardSokobanProblem" by converting the state
+# (the heuristics only use the problem layout and cache, which the bitboard problem also has)
+def bitboard_heuristic(heuristic: HeuristicFunction) -> HeuristicFunction:
+    def adapted_heuristic(problem: BitboardSokobanProblem, state: BitboardState) -> float:
+        return heuristic(problem, state.to_sokoban_state())
+    return adapted_heuristic
@@ -0,0 +1,177 @@
+from collections import deque
+from typing import Dict, FrozenSet, Optional, Set, Tuple
+import weakref
+
+from mathutils import Direction, Point
+from problem import HeuristicFunction
+from sokoban import SokobanLayout, SokobanProblem, SokobanState
+
+# This file detects Sokoban deadlocks: states from which the crates can never be all pushed to the goals
+# Every check is sound (it never reports a solvable state as a deadlock), so it can be used to prune the search
+# It detects three kinds of deadlocks:
+#   1- Dead squares: cells from which a crate can never reach any goal even if there were no other crates (e.g. corners)
+#   2- Freeze deadlocks: crates that can never move again (blocked by walls, dead squares or other frozen crates) while one of them is not on a goal
+#   3- Corral deadlocks: an area that the player cannot reach and whose bordering crates can never be pushed,
+#      so the crates on its border and the goals inside it will never change
+
+# The vectors of the two axes (horizontal and vertical)
+AXES = (Direction.RIGHT.to_vector(), Direction.DOWN.to_vector())
+
+class DeadlockDetector:
+    def __init__(self, layout: SokobanLayout) -> None:
+        # the detector keeps the walkable cells and the goals instead of the layout,
+        # since the layout is a weak key of the detector cache (see "get_deadlock_detector")
+        self.walkable = layout.walkable
+        self.goals = layout.goals
+        # the walkable neighbors of every walkable cell (precomputed since the flood fills visit them many times)
+        self.neighbors: Dict[Point, Tuple[Point, ...]] = {
+            cell: tuple(
+                neighbor for direction in Direction
+                for neighbor in (cell + direction.to_vector(),)
+                if neighbor in layout.walkable
+            )
+            for cell in layout.walkable
+        }
+        self.dead_squares = self._compute_dead_squares()
+
+    # A cell is alive if a crate can be pushed from it to some goal
+    # We find them by pulling a crate from the goals: a crate at "previous" can be pushed to "cell"
+    # if "previous" and the cell behind it (where the player stands) are walkable
+    def _compute_dead_squares(self) -> FrozenSet[Point]:
+        walkable = self.walkable
+        alive = set(self.goals)
+        frontier = deque(self.goals)
+        while frontier:
+            cell = frontier.popleft()
+            for direction in Direction:
+                vector = direction.to_vector()
+                previous = cell - vector
+                if previous in walkable and previous - vector in walkable and previous not in alive:
+                    alive.add(previous)
+                    frontier.append(previous)
+        return frozenset(walkable - alive)
+
+    # Returns True if the state is a deadlock
+    def is_deadlock(self, state: SokobanState) -> bool:
+        crates = state.crates
+        if any(crate in self.dead_squares for crate in crates):
+            return True
+        if any(self._is_freeze_deadlock(crate, crates) for crate in crates if crate not in self.goals):
+            return True
+        return self._is_corral_deadlock(state.player, crates)
+
+    # Returns True if pushing the crate at "crate" to "target" (with the player moving to "crate") leads to a deadlock
+    # Only the checks that can be affected by the push are done
+    def is_deadlock_after_push(self, state: SokobanState, crate: Point, target: Point) -> bool:
+        if target in self.dead_squares:
+            return True
+        crates = state.crates.symmetric_difference((crate, target))
+        if self._is_freeze_deadlock(target, crates):
+            return True
+        return self._is_corral_deadlock(crate, crates)
+
+    # A freeze deadlock happens when the crate is frozen and it or any crate that freezes it is not on a goal
+    def _is_freeze_deadlock(self, crate: Point, crates: FrozenSet[Point]) -> bool:
+        frozen: Set[Point] = set()
+        if not self._is_frozen(crate, crates, set(), frozen):
+            return False
+        return any(frozen_crate not in self.goals for frozen_crate in frozen)
+
+    # A crate is frozen if it is blocked along both axes
+    # The crates in "checking" are treated as walls to avoid infinite recursion
+    # (if a crate is frozen, it is as good as a wall for the crates next to it)
+    # The crates found to be frozen are added to "frozen"
+    def _is_frozen(self, crate: Point, crates: FrozenSet[Point], checking: Set[Point], frozen: Set[Point]) -> bool:
+        checking.add(crate)
+        result = all(self._is_blocked(crate, axis, crates, checking, frozen) for axis in AXES)
+        checking.discard(crate)
+        if result:
+            frozen.add(crate)
+        return result
+
+    # A crate is blocked along an axis if either side is a wall (or a crate being checked), both sides are dead squares,
+    # or either side is a frozen crate
+    def _is_blocked(self, crate: Point, axis: Point, crates: FrozenSet[Point], checking: Set[Point], frozen: Set[Point]) -> bool:
+        walkable = self.walkable
+        sides = (crate + axis, crate - axis)
+        if any(side not in walkable or side in checking for side in sides):
+            return True
+        if all(side in self.dead_squares for side in sides):
+            return True
+        return any(side in crates and self._is_frozen(side, crates, checking, frozen) for side in sides)
+
+    # A corral is a connected area of empty cells that the player cannot reach, so its border is made of walls and crates
+    # If no crate on its border can ever be pushed (assuming that the player stays outside the corral), then the corral is sealed forever
+    # A sealed corral is a deadlock if it contains an empty goal or any of its border crates is not on a goal
+    def _is_corral_deadlock(self, player: Point, crates: FrozenSet[Point]) -> bool:
+        visited = self._flood_fill(player, crates)
+        for cell in self.neighbors:
+            if cell in visited or cell in crates:
+                continue
+            corral = self._flood_fill(cell, crates)
+            visited.update(corral)
+            border = {
+                neighbor
+                for corral_cell in corral for neighbor in self.neighbors[corral_cell]
+                if neighbor in crates
+            }
+            if not border or self._can_push_any(border, corral):
+                continue
+            if any(goal in corral for goal in self.goals):
+                return True
+            if any(crate not in self.goals for crate in border):
+                return True
+        return False
+
+    # Returns True if some crate in the border may be pushed at some point in the future while the corral is sealed
+    # The other crates may move away, so they do not block any push, but the border crates are assumed to never move
+    def _can_push_any(self, border: Set[Point], corral: Set[Point]) -> bool:
+        walkable = self.walkable
+        for crate in border:
+            for direction in Direction:
+                vector = direction.to_vector()
+                player, target = crate - vector, crate + vector
+                if player not in walkable or player in corral or player in border:
+                    continue
+                if target not in walkable or target in border or target in self.dead_squares:
+                    continue
+                return True
+        return False
+
+    # Returns the set of cells reachable from the start without passing through walls or crates
+    def _flood_fill(self, start: Point, crates: FrozenSet[Point]) -> Set[Point]:
+        neighbors = self.neighbors
+        reached = {start}
+        frontier = [start]
+        while frontier:
+            for neighbor in neighbors[frontier.pop()]:
+                if neighbor not in crates and neighbor not in reached:
+                    reached.add(neighbor)
+                    frontier.append(neighbor)
+        return reached
+
+# The deadlock detectors are shared between all the problems with the same layout (the layouts are shared, see "shared_layout")
+# The layouts are weak keys, so a detector is dropped once no problem or state uses its layout
+_deadlock_detectors: 'weakref.WeakKeyDictionary[SokobanLayout, DeadlockDetector]' = weakref.WeakKeyDictionary()
+
+# Returns the deadlock detector of the layout
+def get_deadlock_detector(layout: SokobanLayout) -> DeadlockDetector:
+    detector = _deadlock_detectors.get(layout)
+    if detector is None:
+        detector = _deadlock_detectors[layout] = DeadlockDetector(layout)
+    return detector
+
+# Make "get_actions" of the problem skip the pushes that lead to a deadlock (or stop skipping them if enabled is False)
+def enable_deadlock_pruning(problem: SokobanProblem, enabled: bool = True) -> None:
+    problem.deadlock_detector = get_deadlock_detector(problem.layout) if enabled else None
+
+# Wrap a heuristic such that it returns infinity for deadlocked states (which can never reach a goal)
+def deadlock_aware(heuristic: HeuristicFunction) -> HeuristicFunction:
+    def deadlock_aware_heuristic(problem: SokobanProblem, state: SokobanState) -> float:
+        detector: Optional[DeadlockDetector] = problem.cache().get("deadlock_detector")
+        if detector is None:
+            detector = problem.cache()["deadlock_detector"] = get_deadlock_detector(problem.layout)
+        if detector.is_deadlock(state):
+            return float("inf")
+        return heuristic(problem, state)
+    return deadlock_aware_heuristic
@@ -1,7 +1,6 @@
-from sokoban import SokobanProblem, SokobanState
+from sokoban import SokobanLayout, SokobanProblem, SokobanState
 from mathutils import Direction, Point, manhattan_distance
 from helpers.utils import NotImplemented
-import itertools
 
 
 # This heuristic returns the distance between the player and the nearest crate as an estimate for the path cost
@@ -12,69 +11,169 @@ def weak_heuristic(problem: SokobanProblem, state: SokobanState):
 #TODO: Import any modules and write any functions you want to use
 
 
+from array import array
 from collections import deque
-
-def bfs(start: Point, goal: Point, state) -> float:
-        
-    if start == goal:
-        return 0
-    
-    frontier = deque([(start, 0)])
-    explored = set([start])
-    
-    while len(frontier) != 0:
-        current, dist = frontier.popleft()
-
-        for dir in [Direction.LEFT, Direction.RIGHT, Direction.UP, Direction.DOWN]:
-            
-            neighbor = current + dir.to_vector()
-            push = current - dir.to_vector()
-
-            # To push the crate, the player must be in the opposite direction of the push
-            # so the tile in the reverse direction must be walkable
-            # don't check if it a crate becausse it makes the heuristic incosnsistent 
-            if push not in state.layout.walkable:
-                continue
-
-            if neighbor == goal:
-                return dist + 1
-            
-            if neighbor in state.layout.walkable and neighbor not in explored:
-                explored.add(neighbor)
-                frontier.append((neighbor, dist + 1))    
-
-    # Large number to denote that the goal is unreachable
-    return 1000
-
+from typing import Dict
+import weakref
+
+# Large number to denote that the goal is unreachable
+UNREACHABLE = 1000
+
+# The push distance table stores the minimum number of pushes needed to move a crate from every cell to every goal
+# (ignoring the other crates), where the cells are the walkable positions of the layout numbered by the layout topology
+# The distances of the crate at cell c are the row distances[c * len(goals) : (c + 1) * len(goals)] (one entry per goal in "goals")
+class PushDistanceTable:
+    def __init__(self, layout: SokobanLayout) -> None:
+        topology = layout.topology
+        self.cell_ids: Dict[Point, int] = topology.cell_ids
+        self.goals = tuple(sorted(layout.goals, key=lambda point: (point.y, point.x)))
+        goal_count = len(self.goals)
+        neighbors = topology.neighbors
+        self.distances = array('i', [UNREACHABLE]) * (len(topology.cells) * goal_count)
+        # We run one reverse BFS from each goal where the crate is pulled instead of pushed:
+        # a crate at "previous" can be pushed (in some direction) to "cell" if "previous" and the cell behind it are walkable
+        # so "previous" is one push further from the goal than "cell"
+        # The other crates are ignored, since a crate that blocks a push now may move away later
+        # (counting them would overestimate the distance and make the heuristic inadmissible)
+        for goal_index, goal in enumerate(self.goals):
+            start = self.cell_ids[goal]
+            self.distances[start * goal_count + goal_index] = 0
+            frontier = deque([start])
+            while frontier:
+                cell = frontier.popleft()
+                distance = self.distances[cell * goal_count + goal_index] + 1
+                for direction in Direction:
+                    # To push the crate in this direction, the player stands behind it (in the opposite direction)
+                    # so both the previous cell of the crate and the cell behind it must be walkable
+                    backward = direction.rotate(2)
+                    previous = neighbors[cell][backward]
+                    if previous < 0 or neighbors[previous][backward] < 0:
+                        continue
+                    index = previous * goal_count + goal_index
+                    if self.distances[index] == UNREACHABLE:
+                        self.distances[index] = distance
+                        frontier.append(previous)
+
+    # Returns the distances from a crate at the given position to every goal (in the order of "goals")
+    def row(self, crate: Point) -> array:
+        goal_count = len(self.goals)
+        start = self.cell_ids[crate] * goal_count
+        return self.distances[start:start + goal_count]
+
+# The push distance tables are shared between all the problems with the same layout (the layouts are shared, see "shared_layout")
+# The layouts are weak keys, so a table is dropped once no problem or state uses its layout
+_push_distance_tables: 'weakref.WeakKeyDictionary[SokobanLayout, PushDistanceTable]' = weakref.WeakKeyDictionary()
+
+# Returns the push distance table of the problem layout, it is stored in the problem cache to skip the layout lookup
+def get_push_distance_table(problem: SokobanProblem) -> PushDistanceTable:
+    table = problem.cache().get("push_distance_table")
+    if table is None:
+        layout = problem.layout
+        table = _push_distance_tables.get(layout)
+        if table is None:
+            table = _push_distance_tables[layout] = PushDistanceTable(layout)
+        problem.cache()["push_distance_table"] = table
+    return table
+
+
+# The minimum cost assignment of crates to goals is computed by the Hungarian (Kuhn-Munkres) algorithm in O(n^3)
+# We keep the potentials (u for rows, v for columns) and the matching (the row assigned to each column)
+# so that they can be reused to solve a similar assignment problem
+# The arrays are 1-indexed where index 0 is used by the algorithm as a dummy column, and row/column 0 means "none"
+# costs[i][j] is the cost of assigning row i+1 to column j+1
+def _augment(costs, u, v, column_rows, row) -> None:
+    # Assign the given row while keeping the matching optimal (one phase of the Hungarian algorithm)
+    n = len(v) - 1
+    inf = float('inf')
+    column_rows[0] = row
+    column = 0
+    min_slack = [inf] * (n + 1)
+    used = [False] * (n + 1)
+    way = [0] * (n + 1)
+    while True:
+        used[column] = True
+        current_row = column_rows[column]
+        row_costs = costs[current_row - 1]
+        row_potential = u[current_row]
+        delta, next_column = inf, 0
+        for j in range(1, n + 1):
+            if not used[j]:
+                slack = row_costs[j - 1] - row_potential - v[j]
+                if slack < min_slack[j]:
+                    min_slack[j], way[j] = slack, column
+                if min_slack[j] < delta:
+                    delta, next_column = min_slack[j], j
+        for j in range(n + 1):
+            if used[j]:
+                u[column_rows[j]] += delta
+                v[j] -= delta
+            else:
+                min_slack[j] -= delta
+        column = next_column
+        if column_rows[column] == 0:
+            break
+    # Flip the augmenting path
+    while column != 0:
+        previous_column = way[column]
+        column_rows[column] = column_rows[previous_column]
+        column = previous_column
+    column_rows[0] = 0
+
+def _assignment_cost(costs, column_rows) -> float:
+    return sum(costs[column_rows[j] - 1][j - 1] for j in range(1, len(column_rows)))
+
+# This is the number of crate configurations for which we keep the assignment to reuse it for their successors
+ASSIGNMENT_CACHE_SIZE = 2**16
 
 def strong_heuristic(problem: SokobanProblem, state: SokobanState) -> float:
 
-
-    n = len(state.crates)
-
-    # distances[i][j] have the distance from crate i to goal j
-    distances = [[0 for _ in range(n)] for _ in range(n)]
-    
-    for i, crate in enumerate(state.crates):
-        for j, goal in enumerate(state.layout.goals):
-    
-            key = (crate, goal)
-    
-            if key in problem.cache():
-                distance = problem.cache()[key]
-            else:
-                # Manhattan distance underestimated the cost to move a crate to a goal
-                # So we use BFS to find a better estimate with taking the walls into account
-                # We cache the bfs results to avoid recomputing them multiple times
-                distance = bfs(crate, goal, state)
-                problem.cache()[key] = distance
-    
-            distances[i][j] = distance
-
-    # We go over all the permuations of cratesxgoals to find the optimal assignment
-    best_h = float('inf')
-    for perm in itertools.permutations(range(n), n):  
-        total_cost = sum(distances[i][perm[i]] for i in range(n))
-        best_h = min(best_h, total_cost)
-
+    # The heuristic only depends on the crates, so states that only differ by the player position share the same value
+    assignments = problem.cache().setdefault("assignments", {})
+    record = assignments.get(state.crates)
+    if record is not None:
+        return record[0]
+
+    # The distances from every cell to every goal are precomputed once per layout, so each row is a table lookup
+    table = get_push_distance_table(problem)
+
+    # If the parent state (where only one crate was one step behind) was evaluated, we reuse its optimal assignment
+    # and only reassign the row of the moved crate, which costs O(n^2) instead of O(n^3)
+    parent = None
+    for crate in state.crates:
+        for direction in Direction:
+            previous = crate - direction.to_vector()
+            if previous in state.crates or previous not in state.layout.walkable:
+                continue
+            parent = assignments.get(state.crates.symmetric_difference((crate, previous)))
+            if parent is not None:
+                moved_crate, previous_crate = crate, previous
+                break
+        if parent is not None:
+            break
+
+    if parent is not None:
+        _, crates, parent_costs, u, v, column_rows = parent
+        row = crates.index(previous_crate)
+        crates = crates[:row] + (moved_crate,) + crates[row + 1:]
+        # distances[i][j] have the distance from crate i to goal j
+        distances = list(parent_costs)
+        distances[row] = table.row(moved_crate)
+        u, v, column_rows = list(u), list(v), list(column_rows)
+        # Unassign the moved crate and restore the feasibility of the potentials for its new row
+        column_rows[column_rows.index(row + 1, 1)] = 0
+        u[row + 1] = min(distances[row][j - 1] - v[j] for j in range(1, len(v)))
+        _augment(distances, u, v, column_rows, row + 1)
+    else:
+        crates = tuple(state.crates)
+        n = len(crates)
+        # distances[i][j] have the distance from crate i to goal j
+        distances = [table.row(crate) for crate in crates]
+        u, v, column_rows = [0] * (n + 1), [0] * (n + 1), [0] * (n + 1)
+        for row in range(1, n + 1):
+            _augment(distances, u, v, column_rows, row)
+
+    best_h = _assignment_cost(distances, column_rows)
+    if len(assignments) >= ASSIGNMENT_CACHE_SIZE:
+        del assignments[next(iter(assignments))]
+    assignments[state.crates] = (best_h, crates, distances, u, v, column_rows)
     return best_h
@@ -1,9 +1,9 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from copy import deepcopy
 from typing import Iterable, List, Optional, Set, Tuple
 from enum import Enum
 
-from mathutils import Direction, Point
+from mathutils import Direction, GridTopology, Point
 from game import Game
 from helpers.utils import track_call_count
 from helpers.mt19937 import RandomGenerator
@@ -25,12 +25,17 @@ class DungeonTile(str, Enum):
     KEY = "K"
 
 # Dungeon layout specifies the walkable locations and the exit location
+# It also contains the grid topology of the walkable locations which is computed once when the layout is created
 @dataclass
 class DungeonLayout:
     width: int
     height: int
     walkable: Set[Point]
     exit: Point
+    topology: GridTopology = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self.topology = GridTopology(self.walkable)
 
     def __deepcopy__(self, memo):
         return self
@@ -136,28 +141,34 @@ class DungeonGame(Game[DungeonState, Direction]):
         return state.turn
 
     def get_actions(self, state: DungeonState) -> Iterable[Direction]:
+        # The moves are done on the cell ids of the grid topology (-1 means a wall)
+        topology = state.layout.topology
         if state.turn == 0:
             # Find an return actions to be done by the player
-            position_position = state.player.position
-            positions = ((direction, position_position + direction.to_vector()) for direction in Direction)
+            neighbors = topology.neighbors[topology.cell_ids[state.player.position]]
             # prevent the player from getting into a wall
-            return [direction for direction, position in positions if position in state.layout.walkable]
+            return [direction for direction in Direction if neighbors[direction] >= 0]
         else:
             # Find an return actions to be done by a monster
             index = state.turn - 1
             if not state.monsters[index].alive: return []
             monster_locations = {monster.position for i, monster in enumerate(state.monsters) if i != index and monster.alive} 
-            monster_position = state.monsters[index].position
-            positions = ((direction, monster_position + direction.to_vector()) for direction in Direction)
+            neighbors = topology.neighbors[topology.cell_ids[state.monsters[index].position]]
             # prevent the monster from getting into a wall or another monster
-            return [direction for direction, position in positions if position in state.layout.walkable and position not in monster_locations]
+            return [
+                direction for direction in Direction
+                if neighbors[direction] >= 0 and topology.cells[neighbors[direction]] not in monster_locations
+            ]
 
     def get_successor(self, state: DungeonState, action: Direction) -> DungeonState:
         state = deepcopy(state)
         current_turn = state.turn
         if current_turn == 0:
             # This action is done by the player
-            new_position = state.player.position + action.to_vector()
+            new_position = state.layout.topology.neighbor(state.player.position, action)
+            if new_position is None:
+                # If we try to walk into a wall, then this action is wrong
+                raise Exception(f"Invalid action {action} in state:" + "\n" + str(state))
             state.player.position = new_position
             if new_position in state.coins:
                 # If we walk over a coin, we take it
@@ -186,7 +197,10 @@ class DungeonGame(Game[DungeonState, Direction]):
         else:
             # This action is done by a monster
             monster = state.monsters[current_turn - 1]
-            new_position = monster.position + action.to_vector()
+            new_position = state.layout.topology.neighbor(monster.position, action)
+            if new_position is None:
+                # If we try to walk into a wall, then this action is wrong
+                raise Exception(f"Invalid action {action} in state:" + "\n" + str(state))
             monster.position = new_position
             if new_position == state.player.position:
                 if state.player.inventory.daggers != 0:
@@ -286,17 +300,23 @@ def compute_path(game: DungeonGame, p1: Point, p2: Point) -> List[Point]:
     cache = game.cache()
     if p1 not in cache:
         from collections import deque
-        path_map = {p1: [p1]}
-        queue = deque([p1])
+        # The search runs on the cell ids of the grid topology and the paths are converted to points at the end
+        topology = game.layout.topology
+        start = topology.cell_ids[p1]
+        parents = {start: -1}
+        queue = deque([start])
         while queue:
             parent = queue.popleft()
-            path = path_map[parent]
-            for direction in Direction:
-                child = parent + direction.to_vector()
-                if child in path_map or child not in game.layout.walkable:
+            for child in topology.neighbors[parent]:
+                if child < 0 or child in parents:
                     continue
-                path_map[child] = path + [child]
+                parents[child] = parent
                 queue.append(child)
+        path_map = {}
+        for cell in parents:
+            # the parent of a cell is found before the cell, so its path is already computed
+            parent = parents[cell]
+            path_map[topology.cells[cell]] = [p1] if parent < 0 else path_map[topology.cells[parent]] + [topology.cells[cell]]
         cache[p1] = path_map
     return cache[p1].get(p2, None)
 